@@ -0,0 +1,59 @@
+"""
+Benchmark loading a Debian main sized 'Packages' index and computing a dependency closure.
+
+usage: python benchmarks/bench_aptindex.py [n_packages]
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+
+from deborg.aptindex import PackageIndex
+
+
+def write_packages_file(file: Path, n: int):
+    rnd = random.Random(42)
+    with file.open(mode='w') as _file:
+        for i in range(n):
+            deps: list[str] = []
+            for _ in range(rnd.randint(0, 8)):
+                dep: str = f"pkg{rnd.randrange(n)} (>= 1.{i % 7})"
+                if rnd.random() < 0.1:
+                    dep += f" | pkg{rnd.randrange(n)}"
+                deps.append(dep)
+            _file.write(f"Package: pkg{i}\nVersion: 1.{i}\nArchitecture: amd64\n")
+            if deps:
+                _file.write(f"Depends: {', '.join(deps)}\n")
+            if i % 50 == 0:
+                _file.write(f"Provides: virtual{i}\n")
+            _file.write("Description: synthetic package\n long description line\n\n")
+
+
+def timed(label: str, func):
+    start: float = time.perf_counter()
+    result = func()
+    print(f"{label:<30} {(time.perf_counter() - start) * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    with tempfile.TemporaryDirectory() as tmp:
+        packages: Path = Path(tmp).joinpath("Packages")
+        cache: Path = Path(tmp).joinpath("index.marshal")
+        write_packages_file(packages, n)
+        print(f"{n} packages, {packages.stat().st_size / 1e6:.1f} MB")
+        timed("parse + write cache", lambda: PackageIndex.load([packages], cache))
+        index: PackageIndex = timed("load from cache", lambda: PackageIndex.load([packages], cache))
+        roots: list[str] = [f"pkg{i}" for i in range(0, n, n // 500)]
+        closure = timed("closure of 500 packages", lambda: index.closure(roots))
+        print(f"closure size: {len(closure.packages)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark extracting packages from a large file, plain and compressed with gzip, xz and bzip2.
+
+Besides the end-to-end time, the number of bytes read from disk is printed, which is what matters for
+files on network storage.
+
+usage: python benchmarks/bench_compressed.py [n_lines]
+"""
+
+from __future__ import annotations
+
+import bz2
+import gzip
+import lzma
+import sys
+import tempfile
+import timeit
+
+from pathlib import Path
+
+from deborg.orgparser import OrgParser
+
+
+def org_text(n: int) -> str:
+    distros: list[str] = ["Debian", "Ubuntu", "Mint"]
+    lines: list[str] = []
+    for i in range(n):
+        if i % 50 == 0:
+            lines.append(f"* Section {i // 50}\n")
+        lines.append(f"- package-{i}, package-{i}-{distros[i % 3].lower()} {{{distros[i % 3]}:{20 + i % 5}}}\n")
+    return "".join(lines)
+
+
+def main():
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    text: bytes = org_text(n).encode()
+    parser: OrgParser = OrgParser("Debian", "22", includes=False)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files: dict[str, Path] = dict()
+        for label, compress, suffix in [("plain", None, ""), ("gzip", gzip.compress, ".gz"),
+                                        ("xz", lzma.compress, ".xz"), ("bzip2", bz2.compress, ".bz2")]:
+            files[label] = Path(tmp_dir).joinpath(f"packages.org{suffix}")
+            files[label].write_bytes(text if compress is None else compress(text))
+
+        for label, file in files.items():
+            seconds: float = min(timeit.repeat(lambda: parser.extract(file), number=1, repeat=3))
+            size: int = file.stat().st_size
+            print(f"{label:<6} {seconds * 1000:8.1f} ms  {size / 1e6:7.2f} MB read  "
+                  f"({len(text) / size:5.1f}x fewer bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark the per-line cost of parsing and resolving package lines, using the static
+OrgParser methods and a configured OrgParser instance.
+
+To compare with another version, pass the 'src' directory of its checkout as baseline, e.g. of the
+commit before configurable parsers were added:
+
+    git worktree add /tmp/deborg-base <commit>
+    python benchmarks/bench_parser.py 20000 /tmp/deborg-base/src
+
+the static methods of the baseline are then timed on the same lines (in a separate process).
+
+usage: python benchmarks/bench_parser.py [n_lines] [baseline_src]
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import timeit
+
+from pathlib import Path
+
+from deborg.orgparser import OrgParser
+
+from corpus import org_document_lines
+
+
+# times the static methods of the deborg package found first on sys.path
+STATIC_TIMING: str = """
+import sys, timeit
+from corpus import org_document_lines
+from deborg.orgparser import OrgParser
+lines = org_document_lines(int(sys.argv[1]))
+run = lambda: [OrgParser.extract_deb_package_from_line(line, "Debian", "12", ["desktop", "server"]) for line in lines]
+print(min(timeit.repeat(run, number=1, repeat=5)))
+"""
+
+
+def baseline_seconds(src: Path, n: int) -> float:
+    env: dict[str, str] = dict(os.environ, PYTHONPATH=os.pathsep.join([str(src), str(Path(__file__).parent)]))
+    result = subprocess.run([sys.executable, "-c", STATIC_TIMING, str(n)], env=env, check=True,
+                            capture_output=True, text=True)
+    return float(result.stdout)
+
+
+def main():
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    lines: list[str] = org_document_lines(n)
+    tags: list[str] = ["desktop", "server"]
+    parser: OrgParser = OrgParser("Debian", "12", tags)
+
+    if len(sys.argv) > 2:
+        print(f"{'baseline static':<20} {baseline_seconds(Path(sys.argv[2]), n) / n * 1e6:6.2f} us/line")
+
+    def static():
+        for line in lines:
+            OrgParser.extract_deb_package_from_line(line, "Debian", "12", tags)
+
+    def instance():
+        for line in lines:
+            parser.package_from_line(line)
+
+    for label, func in [("static methods", static), ("OrgParser instance", instance)]:
+        seconds: float = min(timeit.repeat(func, number=1, repeat=5))
+        print(f"{label:<20} {seconds / n * 1e6:6.2f} us/line")
+    parsed = list(parser.parse_lines(lines))
+    seconds = min(timeit.repeat(lambda: [parser.select(p) for _, p in parsed], number=1, repeat=5))
+    print(f"{'resolve only':<20} {seconds / n * 1e6:6.2f} us/line")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Benchmark the overhead of progress reporting, cancellation checks and line tracing while extracting packages.
+
+usage: python benchmarks/bench_progress.py [n_lines]
+"""
+
+from __future__ import annotations
+
+import sys
+import timeit
+
+from deborg.orgparser import OrgParser
+from deborg.progress import CancelToken, ProgressMonitor, extract_monitored
+from deborg.tracing import Tracer
+
+from corpus import generated_lines
+
+
+def main():
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    lines: list[str] = generated_lines(n)
+    parser: OrgParser = OrgParser("distro1", "r2")
+    reports: list = list()
+    runs: dict = {
+        "no monitor": lambda: parser.extract_from(lines),
+        "progress callback": lambda: extract_monitored(parser, lines, ProgressMonitor(reports.append, 0.1)),
+        "callback and token": lambda: extract_monitored(
+            parser, lines, ProgressMonitor(reports.append, 0.1, CancelToken(3600))),
+        "tracing": lambda: extract_monitored(parser, lines, Tracer(10)),
+    }
+    for label, run in runs.items():
+        seconds: float = min(timeit.repeat(run, number=1, repeat=5))
+        print(f"{label:<20} {seconds / n * 1e6:8.3f} us/line")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Benchmark point queries ('would package X be installed for this target?') on a warm catalog.
+
+usage: python benchmarks/bench_query.py [n_lines]
+"""
+
+from __future__ import annotations
+
+import sys
+import timeit
+
+from deborg.catalog import PackageCatalog, Target
+from deborg.query import query_catalog
+
+from corpus import generated_lines
+
+
+def main():
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    catalog: PackageCatalog = PackageCatalog.from_lines(generated_lines(n, common_every=10))
+    target: Target = Target("distro1", "r2", ("tag1",))
+    print(f"{len(catalog)} lines")
+    for name, label in [(f"pak{n // 2}-r", "listed on 1 line"), ("common", f"listed on {n // 10} lines"),
+                        ("missing", "not listed")]:
+        number: int = 10 if name == "common" else 10000
+        seconds: float = min(timeit.repeat(lambda: query_catalog(catalog, name, target), number=number, repeat=3))
+        print(f"{label:<22} {seconds / number * 1e6:10.1f} us/query")
+
+
+if __name__ == "__main__":
+    main()
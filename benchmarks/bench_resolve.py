@@ -0,0 +1,31 @@
+"""
+Benchmark resolution throughput: selecting the matching alternative of already parsed package lines.
+
+usage: python benchmarks/bench_resolve.py [n_lines]
+"""
+
+from __future__ import annotations
+
+import sys
+import timeit
+
+from deborg.catalog import PackageCatalog, Target
+from deborg.families import DistroFamilies
+
+from corpus import generated_lines
+
+
+def main():
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else 30000
+    catalog: PackageCatalog = PackageCatalog.from_lines(generated_lines(n, tag_lines=True))
+    derived: PackageCatalog = PackageCatalog(catalog.lines, DistroFamilies({"derived1": "distro1"}))
+    for label, resolved, target in [
+            ("no tags", catalog, Target("distro1", "r2")),
+            ("with tags", catalog, Target("distro1", "r2", ("tag1",))),
+            ("family", derived, Target("derived1", "r2", ("tag1",)))]:
+        seconds: float = min(timeit.repeat(lambda: sum(1 for _ in resolved.resolve(target)), number=1, repeat=5))
+        print(f"{label:<10} {len(catalog) / seconds:12.0f} lines/s  ({seconds / len(catalog) * 1e6:.2f} us/line)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark worker processes that each parse a large catalog against workers attaching to one shared catalog.
+
+For every worker the private (anonymous) memory it uses and the time until it can resolve is printed;
+attached workers should use roughly constant memory, independent of the catalog size.
+Linux only (memory is read from /proc/self/status).
+
+usage: python benchmarks/bench_shared.py [n_lines] [n_workers]
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import sys
+import time
+
+from deborg.catalog import PackageCatalog, Target
+from deborg.sharedcatalog import SharedCatalog
+
+from corpus import generated_lines
+
+
+TARGET: Target = Target("distro1", "r2", ("tag1",))
+
+
+def private_kb() -> int:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1])
+    return 0
+
+
+def parsing_worker(n: int) -> tuple[float, int, int]:
+    lines: list[str] = generated_lines(n)
+    before: int = private_kb()
+    start: float = time.perf_counter()
+    catalog: PackageCatalog = PackageCatalog.from_lines(lines)
+    ready: float = time.perf_counter() - start
+    del lines
+    resolved: int = sum(1 for _ in catalog.resolve(TARGET))
+    return ready, private_kb() - before, resolved
+
+
+def attaching_worker(name: str) -> tuple[float, int, int]:
+    before: int = private_kb()
+    start: float = time.perf_counter()
+    catalog: SharedCatalog = SharedCatalog.attach(name)
+    ready: float = time.perf_counter() - start
+    resolved: int = sum(1 for _ in catalog.resolve(TARGET))
+    memory: int = private_kb() - before
+    catalog.close()
+    return ready, memory, resolved
+
+
+def report(label: str, results: list[tuple[float, int, int]]):
+    ready: float = max([r[0] for r in results])
+    memory: int = max([r[1] for r in results])
+    print(f"{label:<10} ready after {ready * 1000:8.2f} ms, private memory per worker {memory / 1024:7.1f} MB, "
+          f"{results[0][2]} packages")
+
+
+def main():
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n_workers: int = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    context = multiprocessing.get_context("spawn")
+
+    with context.Pool(n_workers) as pool:
+        report("parsing", pool.map(parsing_worker, [n] * n_workers))
+
+    shared: SharedCatalog = SharedCatalog.create(PackageCatalog.from_lines(generated_lines(n)))
+    try:
+        print(f"shared catalog: {len(shared)} lines")
+        with context.Pool(n_workers) as pool:
+            report("attaching", pool.map(attaching_worker, [shared.name] * n_workers))
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+if __name__ == "__main__":
+    main()
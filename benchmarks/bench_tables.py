@@ -0,0 +1,44 @@
+"""
+Benchmark parsing the same packages written as org table rows and as list items.
+
+usage: python benchmarks/bench_tables.py [n_rows]
+"""
+
+from __future__ import annotations
+
+import sys
+import timeit
+
+from deborg.orgparser import OrgParser
+
+
+def specs(n: int) -> list[tuple[str, str, str, str]]:
+    distros: list[str] = ["", "Debian", "Ubuntu"]
+    return [(f"package-{i}", distros[i % 3], "12" if i % 5 == 0 else "", "desktop,server" if i % 7 == 0 else "")
+            for i in range(n)]
+
+
+def table_lines(n: int) -> list[str]:
+    lines: list[str] = ["| package | distro | release | tags |\n", "|---+---+---+---|\n"]
+    lines += [f"| {name} | {distro} | {release} | {tags} |\n" for name, distro, release, tags in specs(n)]
+    return lines
+
+
+def list_lines(n: int) -> list[str]:
+    lines: list[str] = []
+    for name, distro, release, tags in specs(n):
+        spec: str = ":".join([distro, release, tags]).rstrip(":")
+        lines.append(f"+ {name} {{{spec}}}\n" if spec else f"+ {name}\n")
+    return lines
+
+
+def main():
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    parser: OrgParser = OrgParser("Debian", "12", ["server"])
+    for label, lines in [("table rows", table_lines(n)), ("list items", list_lines(n))]:
+        seconds: float = min(timeit.repeat(lambda: list(parser.parse_lines(lines)), number=1, repeat=3))
+        print(f"{label:<12} {n / seconds:10.0f} lines/s  ({seconds / n * 1e6:.2f} us/line)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Benchmark resolving one shared PackageCatalog from an increasing number of threads.
+
+On a free-threaded CPython build (python3.13t and later, GIL disabled) throughput should
+scale with the number of threads; with the GIL it stays roughly constant.
+
+usage: python benchmarks/bench_threads.py [max_threads]
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from deborg.catalog import PackageCatalog, Target
+
+from corpus import generated_lines
+
+
+def main():
+    max_threads: int = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 4)
+    gil: bool = getattr(sys, "_is_gil_enabled", lambda: True)()
+    catalog: PackageCatalog = PackageCatalog.from_lines(generated_lines(5000))
+    targets: list[Target] = [Target(f"distro{i % 3}", f"r{i % 5}", (f"tag{i % 4}",)) for i in range(64)]
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}, "
+          f"{len(catalog)} lines, {len(targets)} resolutions per run")
+
+    n_threads: int = 1
+    while n_threads <= max_threads:
+        with ThreadPoolExecutor(max_workers=n_threads) as pool:
+            start: float = time.perf_counter()
+            list(pool.map(lambda t: sum(1 for _ in catalog.resolve(t)), targets))
+            elapsed: float = time.perf_counter() - start
+        print(f"{n_threads:3d} threads: {len(targets) / elapsed:8.1f} resolutions/s")
+        n_threads *= 2
+
+
+if __name__ == '__main__':
+    main()
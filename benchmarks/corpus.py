@@ -0,0 +1,48 @@
+"""
+Generated orgmode lines shared by the benchmarks.
+
+The benchmarks are run as scripts (python benchmarks/bench_<name>.py), which puts this directory on
+sys.path, so they import it as 'from corpus import ...'.
+"""
+
+from __future__ import annotations
+
+
+def package_line(i: int) -> str:
+    """Package line i, with a plain alternative and alternatives for a distro, a release and a tag."""
+    return f"+ pak{i}, pak{i}-d {{distro{i % 3}}}, pak{i}-r {{distro{i % 3}:r{i % 5}}}, " + \
+        f"pak{i}-t {{distro{i % 3}:r{i % 5}:tag{i % 4}}} :: comment\n"
+
+
+def generated_lines(n: int, common_every: int | None = None, tag_lines: bool = False) -> list[str]:
+    """
+    n package lines (see :func:`package_line`), for targets 'distro0' to 'distro2', 'r0' to 'r4' and
+    'tag0' to 'tag3'.
+
+    :param common_every: after every common_every-th package line add a line listing the package 'common'
+    :param tag_lines: after every package line add a line selected by tags only and a single package line
+    """
+    lines: list[str] = []
+    for i in range(n):
+        lines.append(package_line(i))
+        if common_every and i % common_every == 0:
+            lines.append(f"+ common, common-{i} {{distro{i % 3}}}\n")
+        if tag_lines:
+            lines.append(f"- only{i} {{::tag{i % 4},tag{(i + 1) % 4}}}\n")
+            lines.append(f"+ single{i}\n")
+    return lines
+
+
+def org_document_lines(n: int) -> list[str]:
+    """n lines of an org document: headings and list items with different bullets and indentation."""
+    lines: list[str] = []
+    for i in range(n):
+        if i % 4 == 0:
+            lines.append(f"** heading {i} with some text\n")
+        elif i % 4 == 1:
+            lines.append(f"   + pak{i}\n")
+        elif i % 4 == 2:
+            lines.append(f"   + pak{i}, pak{i}-d {{Debian}}, pak{i}-r {{Debian:12}} :: comment\n")
+        else:
+            lines.append(f"   - pak{i} {{::desktop,laptop}}, pak{i}-s {{Debian::server}}\n")
+    return lines
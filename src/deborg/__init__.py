@@ -19,6 +19,18 @@ deborg - A package to provide the shell command 'deborg' for parsing emacs orgmo
 files for debian package information.
 
 modules:
-    __main__  : Provides the shell command via argparse.
-    parser    : Contains the logic to parse orgfiles for debian package info.
+    __main__      : Provides the shell command via argparse.
+    aptindex      : Computes dependency closures from local apt 'Packages' index files.
+    catalog       : Holds parsed package lines that can be resolved for several targets.
+    cli           : Defines the commandline arguments of the shell command.
+    diff          : Compares resolved packages between targets or file versions.
+    families      : Declares which distros are based on which (distro families).
+    fingerprint   : Hashes resolved package lists, so that unchanged runs can be skipped.
+    inputfile     : Opens (possibly compressed) orgmode files.
+    orgparser     : Contains the logic to parse orgfiles for debian package info.
+    output        : Writes package lists in different formats and batches.
+    progress      : Reports parsing progress and stops parsing on a deadline or on request.
+    query         : Explains whether single packages would be installed for a target.
+    sharedcatalog : Packs catalogs into flat buffers that processes share via shared memory or mmap.
+    tracing       : Times package lines to find the slowest ones, and profiles extractions.
 """
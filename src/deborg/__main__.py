@@ -23,35 +23,319 @@ from __future__ import annotations
 __author__ = "Tobias Marczewski (mtoboid)"
 __version__ = "1.0.0"
 
+import dataclasses
+import json
 import sys
 
 from argparse import ArgumentParser
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 
-from deborg.cli import cli_parser
-from deborg.orgparser import OrgParser, OrgParserError
+from deborg.aptindex import DependencyClosure, PackageIndex, default_cache_file
+from deborg.catalog import PackageCatalog, Target, shared_include_graph
+from deborg.cli import cli_diff_parser, cli_parser, cli_query_parser
+from deborg.diff import PackageChange, diff_catalogs
+from deborg.families import DistroFamilies
+from deborg.fingerprint import RunState, file_stamps, fingerprint
+from deborg.orgparser import DebPakInfo, LineProblem, OrgParser, OrgParserError, ParseCancelled
+from deborg.output import PackageWriter
+from deborg.progress import CancelToken, Progress, ProgressMonitor, format_progress
+from deborg.query import LineQuery, format_package, query_catalog
+from deborg.tracing import Tracer, format_trace, profile_run
+
+
+# exit status of --if-changed when the packages did not change
+EXIT_UNCHANGED: int = 4
+# exit status when parsing stopped at the --timeout
+EXIT_INCOMPLETE: int = 5
 
 
 def main():
+    if sys.argv[1:2] == ["diff"]:
+        main_diff(sys.argv[2:])
+    if sys.argv[1:2] == ["query"]:
+        main_query(sys.argv[2:])
+
     parser: ArgumentParser = cli_parser()
     args = parser.parse_args()
     file: Path = Path(args.orgfile)
 
-    if not file.exists():
+    if args.orgfile != "-" and not file.exists():
         print(f"Error: specified file '{file.resolve().as_posix()}' not found.")
         sys.exit(1)
 
     _tags: list[str] | None = None
     if args.tags:
         _tags: list[str] = args.tags.split(",")
+    families: DistroFamilies | None = read_families(args.families)
+
+    # with --if-changed, a run is skipped when the options and all input files are unchanged
+    options: dict = run_options(args)
+    stamps: list[list] = list()
+    state_file: Path | None = Path(args.if_changed) if args.if_changed else None
+    state: RunState | None = None
+    if state_file is not None:
+        input_files: list[Path] = ([] if args.orgfile == "-" else [file]) + \
+            ([Path(args.families)] if args.families else []) + (index_files(args) if args.closure else [])
+        stamps = file_stamps(input_files)
+        state = RunState.load(state_file)
+        if state is not None and args.orgfile != "-" and state.is_current(options, stamps):
+            sys.exit(EXIT_UNCHANGED)
 
     try:
-        packages: list[str] = OrgParser.extract_deb_packages(file, args.distro, args.release, _tags)
-        sys.stdout.write(args.sep.join(packages))
+        org_parser: OrgParser = OrgParser(args.distro, args.release, _tags, numbered=args.numbered,
+                                          families=families, conflicts=args.conflicts,
+                                          unique=not args.keep_duplicates)
+        monitor: ProgressMonitor | None = None
+        token: CancelToken | None = CancelToken(args.timeout) if args.timeout is not None else None
+        if args.profile:
+            monitor = Tracer(args.slowest, report_progress if args.progress else None, 1.0, token)
+        elif args.progress or args.timeout is not None:
+            monitor = ProgressMonitor(report_progress if args.progress else None, 1.0, token)
+        # ambiguous and malformed lines with --conflicts=collect
+        problems: list[LineProblem] = list()
+        # package -> lines it is selected on, for --report-duplicates
+        duplicates: dict[str, list[tuple[int, str | None]]] | None = dict() if args.report_duplicates else None
+        # stdin is read as bytes, so that compressed input is recognised as well
+        packages: Iterable[tuple[int, DebPakInfo]] = \
+            org_parser.iter_packages_from(getattr(sys.stdin, "buffer", sys.stdin), monitor, problems, duplicates) \
+            if args.orgfile == "-" else org_parser.iter_packages(file, monitor, problems, duplicates)
+        # packages found before parsing was stopped are still written
+        stopped: list[ParseCancelled] = list()
+        packages = until_stopped(packages, stopped)
+        if isinstance(monitor, Tracer):
+            # parse completely before writing, so that only parsing is profiled
+            packages = profile_run(lambda: list(packages), monitor, Path(args.profile))
+            report_slowest(monitor)
+        if not args.fingerprint and state_file is None:
+            with PackageWriter(sys.stdout, args.format, args.sep, args.batch_size, args.max_bytes) as writer:
+                if args.closure:
+                    write_closure(writer, packages, args)
+                else:
+                    for nr, package in packages:
+                        writer.write(package.name, nr)
+            finish_monitor(monitor, stopped)
+            report_duplicates(duplicates)
+            report_problems(problems, args)
+            sys.exit(0)
+
+        # the packages have to be known completely before anything is written
+        resolved: PackageList = PackageList()
+        if args.closure:
+            write_closure(resolved, packages, args)
+        else:
+            for nr, package in packages:
+                resolved.write(package.name, nr)
+        # an incomplete list must neither be recorded nor compared
+        finish_monitor(monitor, stopped)
+        report_duplicates(duplicates)
+        report_problems(problems, args)
+        result: str = fingerprint([name for name, _ in resolved.packages],
+                                  Target(args.distro, args.release, tuple(_tags or ())))
+        if state_file is not None:
+            if args.orgfile != "-":
+                stamps += file_stamps(shared_include_graph().files(file, org_parser)[1:])
+            RunState(options, stamps, result).save(state_file)
+            if state is not None and state.fingerprint == result and state.options == options:
+                sys.exit(EXIT_UNCHANGED)
+        if args.fingerprint:
+            sys.stdout.write(f"{result}\n")
+        else:
+            with PackageWriter(sys.stdout, args.format, args.sep, args.batch_size, args.max_bytes) as writer:
+                for name, nr in resolved.packages:
+                    writer.write(name, nr)
         sys.exit(0)
+    except OrgParserError as pe:
+        sys.stderr.write(f"Error while parsing {'<stdin>' if args.orgfile == '-' else file.as_posix()}:\n{pe}")
+        sys.exit(1)
+
+
+def until_stopped(packages: Iterable[tuple[int, DebPakInfo]], stopped: list[ParseCancelled]) \
+        -> Iterator[tuple[int, DebPakInfo]]:
+    """Pass packages through until parsing is stopped by the --timeout, which is then appended to stopped."""
+    try:
+        yield from packages
+    except ParseCancelled as e:
+        stopped.append(e)
+
+
+def report_progress(progress: Progress):
+    sys.stderr.write(f"deborg: {format_progress(progress)}\n")
+    sys.stderr.flush()
+
+
+def finish_monitor(monitor: ProgressMonitor | None, stopped: list[ParseCancelled]):
+    """Report the final progress for --progress, and exit with EXIT_INCOMPLETE when parsing was stopped."""
+    if monitor is not None and monitor.callback is not None:
+        monitor.report()
+    if stopped:
+        sys.stdout.flush()
+        sys.stderr.write(f"Warning: {stopped[0]} The output is incomplete.\n")
+        sys.exit(EXIT_INCOMPLETE)
+
+
+def report_slowest(tracer: Tracer):
+    """Report the slowest lines found with --profile."""
+    sys.stderr.write(f"Slowest of {tracer.n_traced} package lines:\n")
+    for trace in tracer.slowest:
+        sys.stderr.write(f"  {format_trace(trace)}\n")
+
+
+def report_duplicates(duplicates: dict[str, list[tuple[int, str | None]]] | None):
+    """Report the packages selected on more than one line (--report-duplicates)."""
+    if not duplicates:
+        return
+    sys.stdout.flush()
+    for name, lines in duplicates.items():
+        where: str = ", ".join([f"line {nr}" if source is None else f"line {nr} of {source}" for nr, source in lines])
+        sys.stderr.write(f"Duplicate: {name} ({where})\n")
+
+
+def report_problems(problems: list[LineProblem], args):
+    """Report all lines collected with --conflicts=collect, and exit with 1 if there were any."""
+    if not problems:
+        return
+    sys.stdout.flush()
+    sys.stderr.write(f"Error while parsing {'<stdin>' if args.orgfile == '-' else args.orgfile}: "
+                     f"{len(problems)} problem{'s' if len(problems) > 1 else ''}:\n")
+    for problem in problems:
+        sys.stderr.write(f"{problem}\n")
+    sys.exit(1)
+
+
+class PackageList:
+    """Collects packages passed to it like a :class:`~output.PackageWriter`."""
+
+    def __init__(self):
+        self.packages: list[tuple[str, int | None]] = list()
+
+    def write(self, name: str, line: int | None = None):
+        self.packages.append((name, line))
+
+
+def run_options(args) -> dict:
+    """The options that influence which packages are resolved (see --if-changed)."""
+    return {"orgfile": args.orgfile if args.orgfile == "-" else Path(args.orgfile).resolve().as_posix(),
+            "distro": args.distro, "release": args.release,
+            "tags": sorted(set(args.tags.split(","))) if args.tags else [],
+            "numbered": args.numbered, "families": args.families, "conflicts": args.conflicts,
+            "closure": args.closure or [], "recommends": args.recommends}
+
+
+def write_closure(writer: PackageWriter | PackageList, packages: Iterable[tuple[int, DebPakInfo]], args):
+    """Write the dependency closure of packages, using the 'Packages' index files given by --closure."""
+    _index_files: list[Path] = index_files(args)
+    cache_file: Path = Path(args.index_cache) if args.index_cache else default_cache_file(_index_files)
+
+    lines: dict[str, int] = dict()
+    for nr, package in packages:
+        lines.setdefault(package.name, nr)
+    closure: DependencyClosure = PackageIndex.load(_index_files, cache_file).closure(lines, args.recommends)
+    if closure.missing:
+        sys.stderr.write(f"Warning: not found in the package index: {', '.join(closure.missing)}\n")
+    for name in closure.packages:
+        writer.write(name, lines.get(name))
+
+
+def index_files(args) -> list[Path]:
+    """The 'Packages' index files given by --closure (exits when one does not exist)."""
+    files: list[Path] = [Path(f) for f in args.closure]
+    for index_file in files:
+        if not index_file.is_file():
+            print(f"Error: specified file '{index_file.resolve().as_posix()}' not found.")
+            sys.exit(1)
+    return files
+
+
+def read_families(file_name: str | None) -> DistroFamilies | None:
+    """Read the distro family table given by --families (exits on errors)."""
+    if file_name is None:
+        return None
+    file: Path = Path(file_name)
+    if not file.is_file():
+        print(f"Error: specified file '{file.resolve().as_posix()}' not found.")
+        sys.exit(1)
+    try:
+        return DistroFamilies.from_file(file)
+    except ValueError as e:
+        sys.stderr.write(f"Error while reading {file.as_posix()}:\n{e}")
+        sys.exit(1)
+
+
+def main_diff(argv: list[str]):
+    """Entry point for 'deborg diff'."""
+    parser: ArgumentParser = cli_diff_parser()
+    args = parser.parse_args(argv)
+    file: Path = Path(args.orgfile)
+
+    for _file in [file] + ([Path(args.old)] if args.old not in (None, "-") else []):
+        if not _file.exists():
+            print(f"Error: specified file '{_file.resolve().as_posix()}' not found.")
+            sys.exit(1)
+
+    tags: tuple[str, ...] = tuple(args.tags.split(",")) if args.tags else ()
+    to_tags: tuple[str, ...] = tuple(args.to_tags.split(",")) if args.to_tags else tags
+    old_target: Target = Target(args.distro, args.release, tags)
+    new_target: Target = Target(*args.to, to_tags) if args.to else Target(args.distro, args.release, to_tags)
+
+    org_parser: OrgParser = OrgParser(families=read_families(args.families))
+    old_name: str = file.as_posix() if args.old is None else ("<stdin>" if args.old == "-" else args.old)
+    try:
+        new: PackageCatalog = PackageCatalog.from_file(file, org_parser)
+        old: PackageCatalog = new
+        if args.old == "-":
+            old = PackageCatalog.from_lines(sys.stdin, org_parser)
+        elif args.old is not None:
+            old = PackageCatalog.from_file(Path(args.old), org_parser)
+        changes: list[PackageChange] = diff_catalogs(old, old_target, new, new_target)
+    except OrgParserError as pe:
+        sys.stderr.write(f"Error while comparing {old_name} and {file.as_posix()}:\n{pe}")
+        sys.exit(1)
+
+    for change in changes:
+        if args.format == "jsonl":
+            sys.stdout.write(json.dumps(dataclasses.asdict(change)) + "\n")
+        else:
+            sys.stdout.write(f"{change}\n")
+    sys.exit(0)
+
+
+def main_query(argv: list[str]):
+    """Entry point for 'deborg query'."""
+    parser: ArgumentParser = cli_query_parser()
+    args = parser.parse_args(argv)
+    file: Path = Path(args.orgfile)
+
+    if not file.exists():
+        print(f"Error: specified file '{file.resolve().as_posix()}' not found.")
+        sys.exit(1)
+
+    tags: tuple[str, ...] = tuple(args.tags.split(",")) if args.tags else ()
+    try:
+        catalog: PackageCatalog = PackageCatalog.from_file(file, OrgParser(families=read_families(args.families)))
     except OrgParserError as pe:
         sys.stderr.write(f"Error while parsing {file.as_posix()}:\n{pe}")
         sys.exit(1)
+    results: list[LineQuery] = query_catalog(catalog, args.name, Target(args.distro, args.release, tags))
+    installed: bool = any([result.installed for result in results])
+
+    if args.format == "jsonl":
+        for result in results:
+            sys.stdout.write(json.dumps(dict(dataclasses.asdict(result), installed=result.installed)) + "\n")
+    else:
+        target: str = f"{args.distro} {args.release}" + (f" (tags: {','.join(tags)})" if tags else "")
+        verdict: str = "installed" if installed else "not installed"
+        sys.stdout.write(f"{args.name}: {verdict} for {target}\n")
+        if not results:
+            sys.stdout.write(f"  no line lists {args.name}\n")
+        for result in results:
+            where: str = f"line {result.nr}" + (f" of {result.source}" if result.source else "")
+            selected: str = format_package(result.selected) if result.selected else "nothing"
+            sys.stdout.write(f"  {where}: {result.error if result.error else 'selects ' + selected}\n")
+            for alternative in result.alternatives:
+                mark: str = "*" if alternative.selected else ("+" if alternative.matches else "-")
+                sys.stdout.write(f"    {mark} {format_package(alternative.package)}: {alternative.reason}\n")
+    sys.exit(0 if installed else 3)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,269 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2022 Tobias Marczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Compute the dependency closure of packages from local apt 'Packages' index files.
+
+Classes:
+
+    PackageIndex
+    DependencyClosure
+
+Functions:
+
+    default_cache_file
+
+Misc variables:
+
+    __author__
+    __version__
+"""
+
+from __future__ import annotations
+
+__author__ = "Tobias Marczewski"
+__version__ = "1.0.0"
+
+import hashlib
+import marshal
+import os
+import re
+
+from collections import deque
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from deborg.inputfile import write_atomically
+
+
+# bump when the layout of the cached index changes
+_CACHE_VERSION: int = 1
+
+# strips version constraints '(>= 1.0)', architecture lists '[amd64]',
+# build profiles '<!nocheck>' and architecture qualifiers ':any'
+_DEPENDENCY_NOISE: re.Pattern = re.compile("\\([^)]*\\)|\\[[^]]*]|<[^>]*>|:[-\\w]+")
+
+
+@dataclass
+class DependencyClosure:
+    """
+    Result of :func:`~aptindex.PackageIndex.closure`.
+
+    packages: the requested packages followed by all their (transitive) dependencies, without duplicates
+    missing: requested packages or dependencies that can not be satisfied by the index
+    """
+    packages: list[str] = field(default_factory=list)
+    missing: list[str] = field(default_factory=list)
+
+
+class PackageIndex:
+    """
+    A compact name -> dependencies graph built from apt 'Packages' index files.
+
+    Only the information needed for a closure is kept: for every package its 'Pre-Depends' and 'Depends'
+    (and separately 'Recommends'), and which packages provide a virtual package. Versions and architectures
+    are stripped, and the dependencies of a package are kept as one normalised string ('a|b,c'), which is
+    only split into groups of alternatives for the packages a closure actually visits; this keeps loading
+    a cached index of a full distribution fast.
+    """
+
+    def __init__(self, depends: dict[str, str], recommends: dict[str, str], provides: dict[str, tuple[str, ...]]):
+        self._depends: dict[str, str] = depends
+        self._recommends: dict[str, str] = recommends
+        self._provides: dict[str, tuple[str, ...]] = provides
+
+    def __len__(self) -> int:
+        return len(self._depends)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._depends
+
+    @classmethod
+    def from_packages_files(cls, files: Iterable[Path]) -> PackageIndex:
+        """
+        Parse 'Packages' index files; for packages listed in several files the first stanza is used.
+
+        :raises: FileNotFoundError
+        """
+        depends: dict[str, str] = dict()
+        recommends: dict[str, str] = dict()
+        provides: dict[str, list[str]] = dict()
+        for file in files:
+            if not file.is_file():
+                raise FileNotFoundError(f"File {file} not found.")
+            with file.open(mode='r', encoding='utf-8', errors='replace') as _file:
+                for stanza in _read_stanzas(_file):
+                    name: str | None = stanza.get("package")
+                    if not name or name in depends:
+                        continue
+                    depends[name] = _normalise_dependencies(
+                        stanza.get("pre-depends", "") + "," + stanza.get("depends", ""))
+                    if "recommends" in stanza:
+                        recommends[name] = _normalise_dependencies(stanza["recommends"])
+                    for virtual in _normalise_dependencies(stanza.get("provides", "")).split(","):
+                        if virtual:
+                            provides.setdefault(virtual, []).append(name)
+        return cls(depends, recommends, {k: tuple(v) for k, v in provides.items()})
+
+    @classmethod
+    def load(cls, files: Sequence[Path], cache_file: Path | None = None) -> PackageIndex:
+        """
+        Load the index for 'Packages' files, from cache_file when it is up to date with the files.
+
+        When the cache is missing or stale the files are parsed and the cache is (re)written. The cache
+        is keyed on path, size and modification time of every file, so checking it only needs a stat call.
+
+        :raises: FileNotFoundError
+        """
+        if cache_file is None:
+            return cls.from_packages_files(files)
+        key: tuple = _cache_key(files)
+        try:
+            # marshal.loads on the whole buffer is considerably faster than marshal.load on a file object
+            version, cached_key, depends, recommends, provides = marshal.loads(cache_file.read_bytes())
+            if version == _CACHE_VERSION and cached_key == key:
+                return cls(depends, recommends, provides)
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+        index: PackageIndex = cls.from_packages_files(files)
+        index._save(cache_file, key)
+        return index
+
+    def _save(self, cache_file: Path, key: tuple):
+        """Write the index atomically to cache_file; failing to write a cache is not an error."""
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            write_atomically(cache_file, marshal.dumps(
+                (_CACHE_VERSION, key, self._depends, self._recommends, self._provides)))
+        except OSError:
+            pass
+
+    def closure(self, packages: Iterable[str], recommends: bool = False) -> DependencyClosure:
+        """
+        Compute the transitive dependency closure of packages.
+
+        For a group of alternatives ('a | b') the first alternative that is either a package in the
+        index or a virtual package provided by one is chosen (a virtual package is satisfied by its
+        first provider), unless one of the alternatives already is part of the closure.
+
+        :param packages: names of the packages to install
+        :param recommends: also follow 'Recommends' (as apt does by default)
+
+        :return: the closure and the names that could not be satisfied
+        """
+        result: DependencyClosure = DependencyClosure()
+        selected: set[str] = set()
+        queue: deque[str] = deque()
+
+        def select(name: str):
+            if name not in selected:
+                selected.add(name)
+                result.packages.append(name)
+                queue.append(name)
+
+        for package in packages:
+            provider: str | None = self._satisfy((package,), selected)
+            if provider is None:
+                if package not in result.missing:
+                    result.missing.append(package)
+                continue
+            select(provider)
+
+        while queue:
+            name: str = queue.popleft()
+            groups: list[list[str]] = _split_dependencies(self._depends.get(name, ""))
+            if recommends:
+                groups += _split_dependencies(self._recommends.get(name, ""))
+            for group in groups:
+                provider = self._satisfy(group, selected)
+                if provider is None:
+                    unsatisfied: str = " | ".join(group)
+                    if unsatisfied not in result.missing:
+                        result.missing.append(unsatisfied)
+                    continue
+                select(provider)
+        return result
+
+    def _satisfy(self, group: Sequence[str], selected: set[str]) -> str | None:
+        """Return the package that satisfies a group of alternatives, or None."""
+        for name in group:
+            if name in selected:
+                return name
+        for name in group:
+            if name in self._depends:
+                return name
+            providers: tuple[str, ...] = self._provides.get(name, ())
+            for provider in providers:
+                if provider in selected:
+                    return provider
+            if providers:
+                return providers[0]
+        return None
+
+
+def default_cache_file(files: Sequence[Path]) -> Path:
+    """Location of the index cache for a set of 'Packages' files in the user's cache directory."""
+    cache_dir: Path = Path(os.environ.get("XDG_CACHE_HOME") or Path.home().joinpath(".cache"))
+    name: str = hashlib.sha1("\0".join([str(f.resolve()) for f in files]).encode()).hexdigest()
+    return cache_dir.joinpath("deborg", f"index-{name}.marshal")
+
+
+def _cache_key(files: Sequence[Path]) -> tuple:
+    key: list[tuple[str, int, int]] = list()
+    for file in files:
+        stat = file.stat()
+        key.append((str(file.resolve()), stat.st_size, stat.st_mtime_ns))
+    return tuple(key)
+
+
+def _read_stanzas(lines: Iterable[str]) -> Iterable[dict[str, str]]:
+    """Split a deb822 file into stanzas of {lower case field name: value}; folded lines are joined."""
+    stanza: dict[str, str] = dict()
+    last: str | None = None
+    for line in lines:
+        if not line.strip():
+            if stanza:
+                yield stanza
+            stanza = dict()
+            last = None
+        elif line[0] in " \t":
+            if last is not None:
+                stanza[last] += " " + line.strip()
+        else:
+            key, _, value = line.partition(":")
+            last = key.strip().lower()
+            stanza[last] = value.strip()
+    if stanza:
+        yield stanza
+
+
+def _normalise_dependencies(value: str) -> str:
+    """Normalise a dependency field ('a (>= 1) | b, c:any') to 'a|b,c'."""
+    groups: list[str] = list()
+    for group in _DEPENDENCY_NOISE.sub("", value).split(","):
+        alternatives: str = "|".join([n.strip() for n in group.split("|") if n.strip()])
+        if alternatives:
+            groups.append(alternatives)
+    return ",".join(groups)
+
+
+def _split_dependencies(value: str) -> list[list[str]]:
+    """Split a normalised dependency string 'a|b,c' into groups of alternatives [[a, b], [c]]."""
+    if not value:
+        return []
+    return [group.split("|") for group in value.split(",")]
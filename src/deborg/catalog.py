@@ -0,0 +1,474 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2022 Tobias Marczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Hold the parsed package lines of an orgmode file, so that they can be resolved for several targets.
+
+Classes:
+
+    Target
+    CatalogLine
+    PackageCatalog
+    IncludeGraph
+
+Functions:
+
+    shared_include_graph
+
+Misc variables:
+
+    __author__
+    __version__
+"""
+
+from __future__ import annotations
+
+__author__ = "Tobias Marczewski"
+__version__ = "1.0.0"
+
+import dataclasses
+import os
+import threading
+import weakref
+
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, TextIO
+
+from deborg.families import DistroFamilies, FamilyKeyword
+from deborg.inputfile import open_org_file, org_lines
+from deborg.orgparser import DebPakInfo, IncludeError, MalformedLineError, OrgParser
+
+if TYPE_CHECKING:
+    from deborg.progress import ProgressMonitor
+
+
+@dataclass(frozen=True)
+class Target:
+    """A system for which packages are resolved (distro, release, tags)."""
+    distro: str
+    release: str
+    tags: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class CatalogLine:
+    """
+    A parsed package line: its line number and the alternative packages it specifies.
+
+    For lines of included files `source` names the file and the chain of files including it,
+    e.g. 'common.org (included from desktop.org line 3)'.
+    """
+    nr: int
+    packages: tuple[DebPakInfo, ...]
+    source: str | None = None
+
+
+class PackageCatalog:
+    """
+    The parsed package lines of an orgmode file.
+
+    Parsing does not depend on distro, release or tags, hence a file only has to be parsed once and the
+    catalog can then be resolved for any number of targets.
+
+    Targets are resolved with the distro families of the parser used to build the catalog, extended by
+    the '#+DEBORG_FAMILY:' keywords of the file.
+
+    A catalog is immutable (all lines, packages and tags are stored in frozen dataclasses and tuples) and
+    resolving it does not modify any state, so a single catalog can be shared by any number of threads
+    without locking.
+    """
+    __slots__ = ("_lines", "_families", "_names")
+
+    def __init__(self, lines: Iterable[CatalogLine], families: DistroFamilies | None = None):
+        self._lines: tuple[CatalogLine, ...] = tuple(
+            [CatalogLine(line.nr, tuple([_frozen(p) for p in line.packages]), line.source) for line in lines])
+        self._families: DistroFamilies = families if families is not None else DistroFamilies()
+        # package name -> positions (in lines) of the lines listing it as an alternative
+        names: dict[str, list[int]] = dict()
+        for i, line in enumerate(self._lines):
+            for package in line.packages:
+                positions: list[int] = names.setdefault(package.name, [])
+                if not positions or positions[-1] != i:
+                    positions.append(i)
+        self._names: dict[str, tuple[int, ...]] = {name: tuple(positions) for name, positions in names.items()}
+
+    @classmethod
+    def _from_entries(cls, entries: Iterable[tuple[int, Sequence[DebPakInfo] | FamilyKeyword, str | None]],
+                      parser: OrgParser) -> PackageCatalog:
+        """Build a catalog from (line number, packages or family keyword, source) entries."""
+        lines: list[CatalogLine] = list()
+        families: DistroFamilies = parser.families
+        for nr, item, source in entries:
+            if isinstance(item, FamilyKeyword):
+                families = OrgParser.apply_family_keyword(families, item, nr, source, bool(lines))
+            elif isinstance(item, MalformedLineError):
+                # a catalog has to hold every line of the file (parsers with the 'collect' policy report them)
+                raise item
+            else:
+                lines.append(CatalogLine(nr, tuple(item), source))
+        return cls(lines, families)
+
+    @classmethod
+    def from_lines(cls, lines: str | bytes | TextIO | BinaryIO | Iterable[str], parser: OrgParser | None = None) \
+            -> PackageCatalog:
+        """
+        Parse the lines of an orgmode file, or a whole document held in memory, into a catalog.
+
+        Include directives are ignored, as there is no file to resolve them against.
+
+        :param lines: the lines of the file, or the document as str, bytes or file object
+                      (see :func:`~inputfile.org_lines`)
+        :param parser: parser to use, e.g. to look for other list bullets (its target is not used)
+
+        :raises: MalformedLineError
+        """
+        _parser: OrgParser = parser if parser is not None else OrgParser()
+        return cls._from_entries(
+            [(nr, item, None) for nr, item in _parser.scan_lines(org_lines(lines)) if not isinstance(item, str)],
+            _parser)
+
+    @classmethod
+    def from_file(cls, file: Path, parser: OrgParser | None = None) -> PackageCatalog:
+        """
+        Parse an orgmode file into a catalog, following '#+INCLUDE:' directives (unless disabled for parser).
+
+        :raises: MalformedLineError
+        :raises: IncludeError
+        :raises: FileNotFoundError
+        """
+        _parser: OrgParser = parser if parser is not None else OrgParser()
+        if not file.is_file():
+            raise FileNotFoundError(f"File {file} not found.")
+        if _parser.includes:
+            return cls._from_entries(shared_include_graph().iter_entries(file, _parser), _parser)
+        with open_org_file(file) as _file:
+            return cls.from_lines(_file, _parser)
+
+    @property
+    def lines(self) -> tuple[CatalogLine, ...]:
+        return self._lines
+
+    @property
+    def families(self) -> DistroFamilies:
+        """The distro families used to resolve targets."""
+        return self._families
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def lines_with(self, name: str) -> tuple[CatalogLine, ...]:
+        """The lines that list package name as one of their alternatives (looked up in the name index)."""
+        return tuple([self._lines[i] for i in self._names.get(name, ())])
+
+    def resolve(self, target: Target) -> Iterator[tuple[int, DebPakInfo]]:
+        """
+        Select the matching package of every line for target.
+
+        :return: iterator over (line number, package) tuples
+
+        :raises: OrgParserError
+        """
+        parser: OrgParser = OrgParser(target.distro, target.release, target.tags, families=self._families)
+        for line in self._lines:
+            package = parser.resolve_line(line.nr, line.packages, line.source)
+            if package:
+                yield line.nr, package
+
+
+class IncludeGraph:
+    """
+    Parse orgmode files together with the files they '#+INCLUDE:', caching the result for included files.
+
+    Included files are resolved relative to the including file. The top-level file is read line by line in
+    the calling thread, so that its lines are yielded as soon as they are parsed. Included files are parsed
+    as a whole by a pool of worker threads, and their parse result (package lines and include directives)
+    kept together with the file's modification time and size, so a fragment shared by many top-level files
+    is only parsed again after it changed. The includes of an included file are all parsed concurrently
+    before they are expanded in order; for the top-level file, up to READ_AHEAD lines following an include
+    are read ahead while it is expanded, so that the files included by them are parsed concurrently as well.
+    At most `max_files` parse results are kept; the least recently used one is dropped first.
+
+    A graph is safe to use from several threads, and from a child process forked while it was in use (the
+    child starts with a new pool and an empty cache). :func:`shared_include_graph` returns the graph used by
+    :class:`PackageCatalog` and :func:`~orgparser.OrgParser.iter_packages`.
+
+    :param max_workers: number of threads parsing included files (default: see ThreadPoolExecutor)
+    :param max_files: number of parsed files to keep
+    """
+
+    # number of entries of the top-level file read ahead at an include directive
+    READ_AHEAD: int = 256
+
+    def __init__(self, max_workers: int | None = None, max_files: int = 256):
+        if max_files < 1:
+            raise ValueError("max_files has to be a positive integer.")
+        self._lock: threading.Lock = threading.Lock()
+        self._files: OrderedDict[tuple, tuple[tuple[int, int], Future]] = OrderedDict()
+        self._max_workers: int | None = max_workers
+        self._max_files: int = max_files
+        self._executor: ThreadPoolExecutor | None = None
+        _graphs.add(self)
+
+    def __len__(self) -> int:
+        """Number of parsed files held by the graph."""
+        return len(self._files)
+
+    def clear(self):
+        """Forget all parsed files."""
+        with self._lock:
+            self._files.clear()
+
+    def iter_lines(self, file: Path, parser: OrgParser) -> Iterator[CatalogLine]:
+        """
+        Parse file and, in place of every include directive, the lines of the included file.
+
+        :param file: the top-level orgmode file
+        :param parser: the parser to use (only its list bullets, numbering and table options are relevant)
+
+        :return: iterator over the package lines; lines of included files have their `source` set
+
+        :raises: MalformedLineError
+        :raises: IncludeError, for missing included files and include cycles
+        """
+        for nr, item, source in self.iter_entries(file, parser):
+            if isinstance(item, MalformedLineError):
+                raise item
+            if not isinstance(item, FamilyKeyword):
+                yield CatalogLine(nr, item, source)
+
+    def iter_entries(self, file: Path, parser: OrgParser, monitor: ProgressMonitor | None = None) \
+            -> Iterator[tuple[int, tuple[DebPakInfo, ...] | FamilyKeyword, str | None]]:
+        """
+        Like :func:`~catalog.IncludeGraph.iter_lines`, but also report the '#+DEBORG_FAMILY:' keywords.
+
+        :param monitor: when given, the lines of file are read through monitor, so that its progress can be
+                        reported and parsing stopped; included files are then also read line by line, bypassing
+                        the cache, so that parsing can be stopped while they are read
+
+        :return: iterator over (line number, alternative packages or family keyword, source) tuples
+
+        :raises: MalformedLineError
+        :raises: IncludeError
+        :raises: ParseCancelled, only with a monitor
+        """
+        if monitor is not None:
+            # included files are read line by line then as well, there is nothing to parse ahead
+            return self._expand(file, parser, (), _scan_file(file, parser, None, monitor.lines), monitor)
+        return self._expand(file, parser, (), self._read_ahead(file, parser, _scan_file(file, parser, None)))
+
+    def files(self, file: Path, parser: OrgParser) -> list[Path]:
+        """
+        file and all files it (transitively) includes, each listed once.
+
+        :raises: MalformedLineError
+        :raises: IncludeError
+        """
+        files: list[Path] = [file]
+        seen: set[Path] = {file.resolve()}
+        for including in files:
+            entries: Iterable[tuple] = _scan_file(file, parser, None) if including is file \
+                else self._parse(including, parser).result()
+            for nr, item in entries:
+                if isinstance(item, str):
+                    included: Path = including.parent.joinpath(item)
+                    if not included.is_file():
+                        raise IncludeError(f"Error in line {nr} of {including.as_posix()}: "
+                                           f"included file {included.as_posix()} not found.")
+                    if included.resolve() not in seen:
+                        seen.add(included.resolve())
+                        files.append(included)
+        return files
+
+    def _expand(self, file: Path, parser: OrgParser, chain: Sequence[tuple[Path, int]],
+                scanned: Iterator[tuple[int, list[DebPakInfo] | str | FamilyKeyword]] | None = None,
+                monitor: ProgressMonitor | None = None) \
+            -> Iterator[tuple[int, tuple[DebPakInfo, ...] | FamilyKeyword, str | None]]:
+        """
+        Lines of file, which was included via chain ((file, line number) from the top-level file on).
+
+        :param scanned: the entries of file, when it is read line by line instead of taken from the cache
+        :param monitor: checks for cancellation while included files are read (they are read line by line then)
+        """
+        source: str | None = _describe(file, chain) if chain else None
+        if scanned is None and monitor is not None:
+            scanned = _scan_file(file, parser, source, monitor.checked)
+        try:
+            entries: Iterable[tuple] = self._parse(file, parser).result() if scanned is None else scanned
+        except MalformedLineError as e:
+            raise MalformedLineError(e.reason, e.nr, e.line, source) if source is not None else e
+
+        # start parsing all included files, before expanding the first one (unless file is read line by line)
+        included: dict[int, Path] = dict()
+        if scanned is None:
+            for nr, item in entries:
+                if isinstance(item, str):
+                    included[nr] = self._included(file, item, nr, source, chain)
+                    self._parse(included[nr], parser)
+
+        for nr, item in entries:
+            if isinstance(item, str):
+                target: Path = included[nr] if nr in included else self._included(file, item, nr, source, chain)
+                yield from self._expand(target, parser, tuple(chain) + ((file, nr),), monitor=monitor)
+            elif isinstance(item, MalformedLineError) and source is not None:
+                # collected malformed line (see OrgParser.CONFLICT_POLICIES)
+                yield nr, MalformedLineError(item.reason, item.nr, item.line, source), source
+            else:
+                yield nr, item, source
+
+    def _read_ahead(self, file: Path, parser: OrgParser,
+                    entries: Iterator[tuple[int, list[DebPakInfo] | str | FamilyKeyword]]) \
+            -> Iterator[tuple[int, list[DebPakInfo] | str | FamilyKeyword]]:
+        """
+        Pass the entries of the top-level file through. At an include directive, start parsing the included
+        file, then read up to READ_AHEAD further entries and start parsing the files they include, before the
+        directive is passed on (and expanded).
+        """
+        buffer: deque[tuple] = deque()
+        exhausted: bool = False
+        failure: Exception | None = None
+        while True:
+            if buffer:
+                entry: tuple = buffer.popleft()
+            elif failure is not None:
+                raise failure
+            elif exhausted:
+                return
+            else:
+                try:
+                    entry = next(entries)
+                except StopIteration:
+                    return
+            if isinstance(entry[1], str):
+                self._prefetch(file, entry[1], parser)
+                while not exhausted and failure is None and len(buffer) < self.READ_AHEAD:
+                    try:
+                        ahead: tuple = next(entries)
+                    except StopIteration:
+                        exhausted = True
+                    except Exception as e:
+                        # raised once the entries before it have been passed on
+                        failure = e
+                    else:
+                        buffer.append(ahead)
+                        if isinstance(ahead[1], str):
+                            self._prefetch(file, ahead[1], parser)
+            yield entry
+
+    def _prefetch(self, file: Path, name: str, parser: OrgParser):
+        """Start parsing the file included by an include directive for name in file (errors are reported later)."""
+        target: Path = file.parent.joinpath(name)
+        if target.is_file():
+            self._parse(target, parser)
+
+    @staticmethod
+    def _included(file: Path, name: str, nr: int, source: str | None, chain: Sequence[tuple[Path, int]]) -> Path:
+        """
+        The file included by an include directive for name in line nr of file.
+
+        :raises: IncludeError, for missing files and include cycles
+        """
+        target: Path = file.parent.joinpath(name)
+        where: str = f"Error in line {nr} of {source}" if source is not None else f"Error in line {nr}"
+        if not target.is_file():
+            raise IncludeError(f"{where}: included file {target.as_posix()} not found.")
+        if target.resolve() in [f.resolve() for f, _ in chain] + [file.resolve()]:
+            raise IncludeError(f"{where}: {target.as_posix()} includes itself.")
+        return target
+
+    def _parse(self, file: Path, parser: OrgParser) -> Future:
+        """The (cached, or newly started) parse of file: a future of its (line number, item) entries."""
+        stat = file.stat()
+        stamp: tuple[int, int] = (stat.st_mtime_ns, stat.st_size)
+        key: tuple = (file.resolve(), parser.bullets, parser.numbered, parser.tables, parser.conflicts == "collect")
+        with self._lock:
+            cached = self._files.get(key)
+            if cached is not None and cached[0] == stamp:
+                self._files.move_to_end(key)
+                return cached[1]
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._max_workers, thread_name_prefix="deborg-include")
+            future: Future = self._executor.submit(_parse_file, file, parser)
+            self._files[key] = (stamp, future)
+            self._files.move_to_end(key)
+            while len(self._files) > self._max_files:
+                self._files.popitem(last=False)
+            return future
+
+    def _after_fork(self):
+        """Start over in a forked child, where the worker threads, and any lock they held, do not exist."""
+        self._lock = threading.Lock()
+        self._executor = None
+        # parses that were not finished at the fork would never be
+        self._files = OrderedDict()
+
+
+# all graphs of the process, to be reset in a forked child
+_graphs: weakref.WeakSet[IncludeGraph] = weakref.WeakSet()
+_shared_graph: IncludeGraph = IncludeGraph()
+
+
+def shared_include_graph() -> IncludeGraph:
+    """The include graph shared by all catalogs and parsers of this process."""
+    return _shared_graph
+
+
+def _after_fork():
+    for graph in list(_graphs):
+        graph._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _parse_file(file: Path, parser: OrgParser) -> tuple:
+    """Parse one file without following its includes (runs in the worker threads of an IncludeGraph)."""
+    with open_org_file(file) as _file:
+        return tuple([(nr, tuple([_frozen(p) for p in item]) if isinstance(item, list) else item)
+                      for nr, item in parser.scan_lines(_file)])
+
+
+def _scan_file(file: Path, parser: OrgParser, source: str | None,
+               lines: Callable[[Iterable[str]], Iterable[str]] | None = None) \
+        -> Iterator[tuple[int, list[DebPakInfo] | str | FamilyKeyword]]:
+    """
+    Parse one file line by line in the calling thread, without following its includes.
+
+    :param lines: wraps the lines read, e.g. to monitor them
+    """
+    with open_org_file(file) as _file:
+        try:
+            yield from parser.scan_lines(_file if lines is None else lines(_file))
+        except MalformedLineError as e:
+            raise MalformedLineError(e.reason, e.nr, e.line, source) if source is not None else e
+
+
+def _describe(file: Path, chain: Sequence[tuple[Path, int]]) -> str:
+    """'c.org (included from b.org line 1, a.org line 3)' for c.org included by b.org, included by a.org."""
+    including: str = ", ".join([f"{f.as_posix()} line {nr}" for f, nr in reversed(chain)])
+    return f"{file.as_posix()} (included from {including})"
+
+
+def _frozen(package: DebPakInfo) -> DebPakInfo:
+    """Return package with its tags as tuple, so that it can not be changed by anyone sharing the catalog."""
+    if package.tags is None or isinstance(package.tags, tuple):
+        return package
+    return dataclasses.replace(package, tags=tuple(package.tags))
@@ -23,8 +23,15 @@ Classes:
     PrintExampleFile
     Examples
 
+Functions:
+
+    cli_parser
+    cli_diff_parser
+    cli_query_parser
+
 Misc variables:
 
+    FAMILIES_HELP
     __author__
     __version__
 """
@@ -37,6 +44,14 @@ __version__ = '1.0.0'
 import argparse
 from collections.abc import Sequence
 
+from deborg.orgparser import OrgParser
+from deborg.output import OUTPUT_FORMATS
+
+
+# help of --families, the same for all commands
+FAMILIES_HELP: str = "Distro family table: lines of '<derived distro> <parent distro>'; packages for a parent " \
+    "distro are used for derived distros, but are less specific than alternatives for the derived distro itself."
+
 
 class PrintExampleFile(argparse.Action):
     """Argparse action to display an example orgmode file that can be parsed by deborg."""
@@ -81,6 +96,14 @@ class PrintExampleFile(argparse.Action):
         "** language support\n" +\
         "   - thunderbird-locale-xx {Ubuntu}, thunderbird-l10n-xx {Debian} :: language xx\n" +\
         "   - thunderbird-locale-zz {Ubuntu}, thunderbird-l10n-zz {Debian} :: language zz\n" +\
+        "\n" +\
+        "* Tools\n" +\
+        "  # packages can also be listed in a table, when its header row names the columns\n" +\
+        "  # (package, distro, release, tags); every row is read like a list item\n" +\
+        "  | package | distro | tags   |\n" +\
+        "  |---------+--------+--------|\n" +\
+        "  | htop    |        |        |\n" +\
+        "  | nginx   |        | server |\n" +\
         ""
 
     def __init__(self, option_strings,
@@ -100,37 +123,38 @@ class Examples(object):
 
     Running `deborg 'examples.org' Examples.input[i]` should produce `Examples.output[i]`
     """
-    _input: list[str] = []
-    _output: list[str] = []
-    _n: int = 0
 
     def __init__(self):
+        # per instance, so that creating Examples (e.g. every cli_parser() call) never changes shared state
+        self._input: list[str] = []
+        self._output: list[str] = []
+        self._n: int = 0
         # 0
         self.add("'' ''",
-                 "package foo foo-two baz thunderbird")
+                 "package foo foo-two baz thunderbird htop")
         # 1
         self.add("'distro1' ''",
-                 "package1 foo foo-two baz-alternative thunderbird")
+                 "package1 foo foo-two baz-alternative thunderbird htop")
         # 2
         self.add("'distro2' 'release_b'",
-                 "package2b foo foo-two baz thunderbird")
+                 "package2b foo foo-two baz thunderbird htop")
         # 3
         self.add("'' '' --tags=server",
-                 "package foo foo-two baz apache thunderbird")
+                 "package foo foo-two baz apache thunderbird htop nginx")
         # 4
         self.add("'distro1' '' --tags=desktop",
-                 "package1 foo foo-two baz-alternative office-app-x thunderbird")
+                 "package1 foo foo-two baz-alternative office-app-x thunderbird htop")
         # 5
         self.add("'distro1' '' --tags=desktop,server",
-                 "package1 foo foo-two baz-alternative apache office-app-x thunderbird")
+                 "package1 foo foo-two baz-alternative apache office-app-x thunderbird htop nginx")
         # 6
         self.add("'Debian' ''",
-                 "package foo foo-two baz thunderbird thunderbird-l10n-xx thunderbird-l10n-zz")
+                 "package foo foo-two baz thunderbird thunderbird-l10n-xx thunderbird-l10n-zz htop")
         self.add("'Ubuntu' ''",
-                 "package foo foo-two baz thunderbird thunderbird-locale-xx thunderbird-locale-zz")
+                 "package foo foo-two baz thunderbird thunderbird-locale-xx thunderbird-locale-zz htop")
         # 8
         self.add("'distro' 'any' --sep='::'",
-                 "package::foo::foo-two::baz::thunderbird")
+                 "package::foo::foo-two::baz::thunderbird::htop")
 
     @property
     def input(self) -> Sequence[str]:
@@ -153,12 +177,7 @@ class Examples(object):
 def cli_parser() -> argparse.ArgumentParser:
     """Build a commandline argument parser for deborg"""
     indent: str = 2*" "
-    disclaimer: str = "\ndisclaimer:\n\n" + \
-        indent + f"Copyright (C) 2022 {__author__}\n" + \
-        indent + "This program comes with ABSOLUTELY NO WARRANTY.\n" + \
-        indent + "This is free software, and you are welcome to redistribute it under the terms\n" + \
-        indent + "of the GNU General Public License version 3 or later.\n\n" + \
-        indent + "For more information and bug reports please visit https://github.com/mtoboid/deborg\n"
+    disclaimer: str = _disclaimer(indent)
 
     description: str = "\ndescription:\n\n" + \
         indent + "This program parses an orgfile with list entries (+ <item> or - <item>)\n" + \
@@ -167,7 +186,7 @@ def cli_parser() -> argparse.ArgumentParser:
         indent + " + package2, package2a {Ubuntu}\n" + \
         indent + "...\n" + \
         indent + "where {<distro>:<release>} determine which package should be returned by deborg.\n" + \
-        indent + "Also see '%(prog)s --example-file'.\n"
+        indent + "Also see '%(prog)s --example-file', and '%(prog)s diff --help' to compare targets or files.\n"
 
     ex: Examples = Examples()
     examples: str = "\nexamples:\n\n" + \
@@ -201,7 +220,7 @@ def cli_parser() -> argparse.ArgumentParser:
     )
     parser.add_argument(
         "orgfile",
-        help="The .org file to parse.",
+        help="The .org file to parse (may be compressed with gzip, xz or bzip2), or '-' to read it from stdin.",
         type=str
     )
     parser.add_argument(
@@ -225,4 +244,280 @@ def cli_parser() -> argparse.ArgumentParser:
         help="Comma separated list of tags, no spaces. (tag1,tag2,tag3)",
         type=str
     )
+    parser.add_argument(
+        "-n", "--numbered",
+        dest="numbered",
+        action="store_true",
+        help="Also read packages from numbered list items ('1.' or '1)')."
+    )
+    parser.add_argument(
+        "-f", "--format", default="text",
+        dest="format",
+        choices=OUTPUT_FORMATS,
+        help="Output format: 'text' (names joined by SEP), 'nul' (NUL terminated records), " +
+             "'jsonl' (one JSON object per line) or 'selections' (input for 'dpkg --set-selections').",
+        type=str
+    )
+    parser.add_argument(
+        "--batch-size", default=None,
+        dest="batch_size",
+        metavar="N",
+        help="Split the output into batches of at most N packages; each batch is written as soon as it " +
+             "is complete (one line per batch for 'text'; 'nul' still writes one record per package).",
+        type=_positive_int
+    )
+    parser.add_argument(
+        "--max-bytes", default=None,
+        dest="max_bytes",
+        metavar="N",
+        help="Split the output into batches of at most N bytes, as written in the output format.",
+        type=_positive_int
+    )
+    parser.add_argument(
+        "--closure", default=None,
+        dest="closure",
+        action="append",
+        metavar="PACKAGES",
+        help="Output the dependency closure of the extracted packages, using the apt 'Packages' index " +
+             "file PACKAGES (can be given several times).",
+        type=str
+    )
+    parser.add_argument(
+        "--recommends",
+        dest="recommends",
+        action="store_true",
+        help="Also follow 'Recommends' when computing the dependency closure."
+    )
+    parser.add_argument(
+        "--fingerprint",
+        dest="fingerprint",
+        action="store_true",
+        help="Output a stable hash of the sorted package list and the target instead of the packages."
+    )
+    parser.add_argument(
+        "--if-changed", default=None,
+        dest="if_changed",
+        metavar="STATEFILE",
+        help="Only output the packages when they differ from those of the run that wrote STATEFILE; otherwise "
+             "exit with status 4 without output. STATEFILE is updated when the packages changed.",
+        type=str
+    )
+    parser.add_argument(
+        "--index-cache", default=None,
+        dest="index_cache",
+        metavar="FILE",
+        help="Cache file for the parsed 'Packages' index (default: in $XDG_CACHE_HOME/deborg).",
+        type=str
+    )
+    parser.add_argument(
+        "--families", default=None,
+        dest="families",
+        metavar="FILE",
+        help=FAMILIES_HELP,
+        type=str
+    )
+    parser.add_argument(
+        "--conflicts", default="error",
+        dest="conflicts",
+        choices=OrgParser.CONFLICT_POLICIES,
+        help="What to do with lines on which several alternatives match equally well: stop with an error "
+             "(default), 'collect' them and all malformed lines and report them all at the end, or select "
+             "the 'first' of them, or the 'most-specific' (matching most of the given tags, then the first)."
+    )
+    parser.add_argument(
+        "--keep-duplicates",
+        dest="keep_duplicates",
+        action="store_true",
+        help="Output a package once for every line it is selected on (by default only for the first line)."
+    )
+    parser.add_argument(
+        "--report-duplicates",
+        dest="report_duplicates",
+        action="store_true",
+        help="Report the packages selected on more than one line, with these lines, on stderr."
+    )
+    parser.add_argument(
+        "--progress",
+        dest="progress",
+        action="store_true",
+        help="Report lines and bytes read, packages found and throughput to stderr (at most once a second)."
+    )
+    parser.add_argument(
+        "--profile", default=None,
+        dest="profile",
+        metavar="FILE",
+        help="Time every package line and report the slowest ones on stderr; write a Chrome trace of them to "
+             "FILE when its name ends in '.json', otherwise the statistics of cProfile (for pstats).",
+        type=str
+    )
+    parser.add_argument(
+        "--slowest", default=10,
+        dest="slowest",
+        metavar="N",
+        help="Number of lines reported by --profile (default: 10).",
+        type=_positive_int
+    )
+    parser.add_argument(
+        "--timeout", default=None,
+        dest="timeout",
+        metavar="SECONDS",
+        help="Stop parsing after SECONDS, output the packages found until then and exit with status 5.",
+        type=float
+    )
     return parser
+
+
+def cli_diff_parser() -> argparse.ArgumentParser:
+    """Build a commandline argument parser for 'deborg diff'"""
+    indent: str = 2*" "
+    description: str = "\ndescription:\n\n" + \
+        indent + "Resolve the packages of orgfile for distro and release, and compare them with the packages\n" + \
+        indent + "resolved for another target (--to) and/or another version of the file (--old). Only added (+),\n" + \
+        indent + "removed (-) and changed (~) packages are printed, together with the line they come from.\n"
+    examples: str = "\nexamples:\n\n" + \
+        indent + "$ deborg diff packages.org Debian 11 --to Debian 12\n" + \
+        indent + "$ git show HEAD~1:packages.org | deborg diff packages.org Debian 12 --old -\n"
+
+    parser = argparse.ArgumentParser(
+        prog="deborg diff",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description="Show the difference between the packages resolved for two targets or file versions.",
+        epilog="" + description + examples + _disclaimer(indent)
+    )
+    parser.add_argument(
+        "orgfile",
+        help="The .org file to parse.",
+        type=str
+    )
+    parser.add_argument(
+        "distro",
+        help="Linux distribution for which to extract the packages, e.g. 'Debian', 'Ubuntu'...",
+        type=str
+    )
+    parser.add_argument(
+        "release",
+        help="Release for which to extract the packages, e.g. '10', '11', '18.04'...",
+        type=str
+    )
+    parser.add_argument(
+        "-t", "--tags", default=None,
+        dest="tags",
+        help="Comma separated list of tags, no spaces. (tag1,tag2,tag3)",
+        type=str
+    )
+    parser.add_argument(
+        "--old", default=None,
+        dest="old",
+        metavar="OLDFILE",
+        help="Older version of orgfile to compare against ('-' to read it from stdin).",
+        type=str
+    )
+    parser.add_argument(
+        "--to", default=None,
+        dest="to",
+        nargs=2,
+        metavar=("DISTRO", "RELEASE"),
+        help="Compare against the packages for this distro and release.",
+        type=str
+    )
+    parser.add_argument(
+        "--to-tags", default=None,
+        dest="to_tags",
+        metavar="TAGS",
+        help="Tags for the target given by --to (default: the same as --tags).",
+        type=str
+    )
+    parser.add_argument(
+        "-f", "--format", default="text",
+        dest="format",
+        choices=("text", "jsonl"),
+        help="Output format: 'text' (one change per line) or 'jsonl' (one JSON object per change).",
+        type=str
+    )
+    parser.add_argument(
+        "--families", default=None,
+        dest="families",
+        metavar="FILE",
+        help=FAMILIES_HELP,
+        type=str
+    )
+    return parser
+
+
+def cli_query_parser() -> argparse.ArgumentParser:
+    """Build a commandline argument parser for 'deborg query'"""
+    indent: str = 2*" "
+    description: str = "\ndescription:\n\n" + \
+        indent + "Look up the lines of orgfile that list package name, resolve them for distro and release, and\n" + \
+        indent + "explain for every alternative why it was selected or not. The exit status is 0 when the package\n" + \
+        indent + "would be installed, and 3 when it would not.\n"
+    examples: str = "\nexamples:\n\n" + \
+        indent + "$ deborg query packages.org nginx Debian 12 --tags=server\n"
+
+    parser = argparse.ArgumentParser(
+        prog="deborg query",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description="Explain whether a package would be installed for a distro and release.",
+        epilog="" + description + examples + _disclaimer(indent)
+    )
+    parser.add_argument(
+        "orgfile",
+        help="The .org file to parse.",
+        type=str
+    )
+    parser.add_argument(
+        "name",
+        help="Name of the package to look up.",
+        type=str
+    )
+    parser.add_argument(
+        "distro",
+        help="Linux distribution for which to resolve the package, e.g. 'Debian', 'Ubuntu'...",
+        type=str
+    )
+    parser.add_argument(
+        "release",
+        help="Release for which to resolve the package, e.g. '10', '11', '18.04'...",
+        type=str
+    )
+    parser.add_argument(
+        "-t", "--tags", default=None,
+        dest="tags",
+        help="Comma separated list of tags, no spaces. (tag1,tag2,tag3)",
+        type=str
+    )
+    parser.add_argument(
+        "-f", "--format", default="text",
+        dest="format",
+        choices=("text", "jsonl"),
+        help="Output format: 'text' (explanation per line) or 'jsonl' (one JSON object per line).",
+        type=str
+    )
+    parser.add_argument(
+        "--families", default=None,
+        dest="families",
+        metavar="FILE",
+        help=FAMILIES_HELP,
+        type=str
+    )
+    return parser
+
+
+def _disclaimer(indent: str) -> str:
+    return "\ndisclaimer:\n\n" + \
+        indent + f"Copyright (C) 2022 {__author__}\n" + \
+        indent + "This program comes with ABSOLUTELY NO WARRANTY.\n" + \
+        indent + "This is free software, and you are welcome to redistribute it under the terms\n" + \
+        indent + "of the GNU General Public License version 3 or later.\n\n" + \
+        indent + "For more information and bug reports please visit https://github.com/mtoboid/deborg\n"
+
+
+def _positive_int(value: str) -> int:
+    """Argparse type for options that only accept integers > 0."""
+    try:
+        number: int = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer value: '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"has to be a positive integer: '{value}'")
+    return number
@@ -0,0 +1,144 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2022 Tobias Marczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Compare the packages resolved for two targets, or for two versions of a file.
+
+Classes:
+
+    PackageChange
+
+Functions:
+
+    diff_catalogs
+
+Misc variables:
+
+    ADDED
+    REMOVED
+    CHANGED
+    __author__
+    __version__
+"""
+
+from __future__ import annotations
+
+__author__ = "Tobias Marczewski"
+__version__ = "1.0.0"
+
+from dataclasses import dataclass
+
+from deborg.catalog import CatalogLine, PackageCatalog, Target
+from deborg.orgparser import OrgParser
+
+
+ADDED: str = "added"
+REMOVED: str = "removed"
+CHANGED: str = "changed"
+
+
+@dataclass(frozen=True)
+class PackageChange:
+    """
+    One difference between two resolved package lists.
+
+    For 'added' only `new` and `new_line` are set, for 'removed' only `old` and `old_line`,
+    and for 'changed' (a removed and an added package from lines listing the same alternatives) all of them.
+    `old_source` and `new_source` are set for lines of included files (the file and the chain of files
+    including it).
+    """
+    kind: str
+    old: str | None = None
+    new: str | None = None
+    old_line: int | None = None
+    new_line: int | None = None
+    old_source: str | None = None
+    new_source: str | None = None
+
+    def __str__(self) -> str:
+        old_where: str = _where(self.old_line, self.old_source)
+        new_where: str = _where(self.new_line, self.new_source)
+        if self.kind == ADDED:
+            return f"+ {self.new} (line {new_where})"
+        if self.kind == REMOVED:
+            return f"- {self.old} (line {old_where})"
+        return f"~ {self.old} -> {self.new} (line {old_where} -> {new_where})"
+
+
+def diff_catalogs(old: PackageCatalog, old_target: Target,
+                  new: PackageCatalog, new_target: Target) -> list[PackageChange]:
+    """
+    Compare the packages resolved from catalog `old` for `old_target` with those from `new` for `new_target`.
+
+    To compare two targets pass the same catalog twice, which avoids parsing the file again. A package is
+    added or removed only when it is missing from the other list, wherever the lines it comes from moved
+    to; the line numbers only say where a package comes from. A removed and an added package that come
+    from lines listing the same alternatives are reported together as a change of that line.
+
+    :return: list of changes; removals and changes in the order of `old`, then additions in the order of `new`.
+
+    :raises: OrgParserError
+    """
+    old_packages: dict[str, CatalogLine] = _resolve_names(old, old_target)
+    new_packages: dict[str, CatalogLine] = _resolve_names(new, new_target)
+    added: dict[str, CatalogLine] = {name: line for name, line in new_packages.items() if name not in old_packages}
+    # alternatives of a line -> added packages from lines with these alternatives (in the order of `new`)
+    added_by_alternatives: dict[frozenset[str], list[str]] = dict()
+    for name, line in added.items():
+        added_by_alternatives.setdefault(_alternatives(line), []).append(name)
+
+    changes: list[PackageChange] = list()
+    for old_name, old_line in old_packages.items():
+        if old_name in new_packages:
+            continue
+        candidates: list[str] | None = added_by_alternatives.get(_alternatives(old_line))
+        if not candidates:
+            changes.append(PackageChange(REMOVED, old=old_name, old_line=old_line.nr, old_source=old_line.source))
+            continue
+        new_name: str = candidates.pop(0)
+        new_line: CatalogLine = added.pop(new_name)
+        changes.append(PackageChange(CHANGED, old=old_name, new=new_name, old_line=old_line.nr, new_line=new_line.nr,
+                                     old_source=old_line.source, new_source=new_line.source))
+    for new_name, new_line in added.items():
+        changes.append(PackageChange(ADDED, new=new_name, new_line=new_line.nr, new_source=new_line.source))
+    return changes
+
+
+def _resolve_names(catalog: PackageCatalog, target: Target) -> dict[str, CatalogLine]:
+    """
+    Resolve a catalog for target.
+
+    :return: the resolved package names (in the order of the catalog), each with the first line it was
+        selected from
+    """
+    resolved: dict[str, CatalogLine] = dict()
+    parser: OrgParser = OrgParser(target.distro, target.release, target.tags, families=catalog.families)
+    for line in catalog.lines:
+        package = parser.resolve_line(line.nr, line.packages, line.source)
+        if package and package.name not in resolved:
+            resolved[package.name] = line
+    return resolved
+
+
+def _alternatives(line: CatalogLine) -> frozenset[str]:
+    """Names of all alternatives listed on line."""
+    return frozenset([alternative.name for alternative in line.packages])
+
+
+def _where(nr: int | None, source: str | None) -> str:
+    """'12', or '12 of inc.org (included from ...)' for lines of included files."""
+    return f"{nr}" if source is None else f"{nr} of {source}"
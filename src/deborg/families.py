@@ -0,0 +1,157 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2022 Tobias Marczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Distro families: derived distros (e.g. Ubuntu) fall back to the packages of the distro they are based on.
+
+Classes:
+
+    FamilyKeyword
+    DistroFamilies
+
+Misc variables:
+
+    __author__
+    __version__
+"""
+
+from __future__ import annotations
+
+__author__ = "Tobias Marczewski"
+__version__ = "1.0.0"
+
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass(frozen=True)
+class FamilyKeyword:
+    """An org keyword '#+DEBORG_FAMILY: <derived> <parent>' declaring that derived is based on parent."""
+    derived: str
+    parent: str
+
+
+class DistroFamilies:
+    """
+    A table of derived distro -> the distro it is based on (e.g. Mint -> Ubuntu, Ubuntu -> Debian).
+
+    For a target distro the table is compiled into a precedence lookup {distro: rank}, where the target
+    itself has rank 0, its parent rank 1, the parent's parent rank 2, and so on. Alternatives for any of
+    these distros match the target; of two alternatives with otherwise the same specificity (tags >
+    release > distro), the one for a distro with a lower rank is more specific.
+    """
+
+    def __init__(self, parents: Mapping[str, str] | None = None):
+        """
+        :param parents: derived distro -> parent distro
+
+        :raises: ValueError, when the table contains a cycle.
+        """
+        self._parents: dict[str, str] = dict(parents) if parents else dict()
+        for distro in self._parents:
+            self.lineage(distro)
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> DistroFamilies:
+        """
+        Read a family table: one '<derived> <parent>' pair per line; empty lines and '#' comments are ignored.
+
+        :raises: ValueError, for malformed lines, a distro with two parents, or cycles.
+        """
+        families: DistroFamilies = cls()
+        for nr, line in enumerate(lines):
+            entry: str = line.split("#", 1)[0].strip()
+            if not entry:
+                continue
+            fields: list[str] = entry.split()
+            if len(fields) != 2:
+                raise ValueError(f"Error in line {nr}: expected '<derived distro> <parent distro>', got '{entry}'.")
+            families = families.with_parent(*fields)
+        return families
+
+    @classmethod
+    def from_file(cls, file: Path) -> DistroFamilies:
+        """
+        Read a family table from file (see :func:`~families.DistroFamilies.from_lines`).
+
+        :raises: ValueError
+        :raises: FileNotFoundError
+        """
+        if not file.is_file():
+            raise FileNotFoundError(f"File {file} not found.")
+        with file.open(mode='r') as _file:
+            return cls.from_lines(_file)
+
+    def __bool__(self) -> bool:
+        return bool(self._parents)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, DistroFamilies) and self._parents == other._parents
+
+    def __hash__(self) -> int:
+        return hash(frozenset(self._parents.items()))
+
+    def __repr__(self) -> str:
+        return f"DistroFamilies({self._parents!r})"
+
+    @property
+    def parents(self) -> dict[str, str]:
+        """A copy of the table (derived distro -> parent distro)."""
+        return dict(self._parents)
+
+    def with_parent(self, derived: str, parent: str) -> DistroFamilies:
+        """
+        A new table that additionally declares derived to be based on parent.
+
+        :raises: ValueError, when derived already has another parent, or the table would contain a cycle.
+        """
+        known: str | None = self._parents.get(derived)
+        if known is not None and known != parent:
+            raise ValueError(f"Distro '{derived}' is already based on '{known}', not '{parent}'.")
+        parents: dict[str, str] = dict(self._parents)
+        parents[derived] = parent
+        return DistroFamilies(parents)
+
+    def merged(self, other: DistroFamilies) -> DistroFamilies:
+        """
+        A new table with the entries of both tables.
+
+        :raises: ValueError, when the tables conflict.
+        """
+        families: DistroFamilies = self
+        for derived, parent in other._parents.items():
+            families = families.with_parent(derived, parent)
+        return families
+
+    def lineage(self, distro: str) -> tuple[str, ...]:
+        """
+        The distro followed by the distros it is (transitively) based on, e.g. ('Mint', 'Ubuntu', 'Debian').
+
+        :raises: ValueError, when the table contains a cycle.
+        """
+        lineage: list[str] = [distro]
+        while lineage[-1] in self._parents:
+            parent: str = self._parents[lineage[-1]]
+            if parent in lineage:
+                raise ValueError(f"Distro family cycle: {' -> '.join(lineage + [parent])}.")
+            lineage.append(parent)
+        return tuple(lineage)
+
+    def precedence(self, distro: str) -> dict[str, int]:
+        """Compile the lookup {distro: rank} for target distro (see :class:`DistroFamilies`)."""
+        return {name: rank for rank, name in enumerate(self.lineage(distro))}
@@ -0,0 +1,122 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2022 Tobias Marczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Stable fingerprints of resolved package lists, and the state needed to skip unchanged runs.
+
+Classes:
+
+    RunState
+
+Functions:
+
+    fingerprint
+    file_stamps
+
+Misc variables:
+
+    __author__
+    __version__
+"""
+
+from __future__ import annotations
+
+__author__ = "Tobias Marczewski"
+__version__ = "1.0.0"
+
+import hashlib
+import json
+
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from deborg.catalog import Target
+from deborg.inputfile import write_atomically
+
+
+# bump when the fingerprint or the layout of the state file changes
+_STATE_VERSION: int = 1
+
+
+def fingerprint(packages: Iterable[str], target: Target) -> str:
+    """
+    A stable hash of a resolved package list together with its target.
+
+    The hash does not depend on the order of the packages or tags, or on duplicates, so it only changes
+    when a different set of packages would be installed (or the target changes).
+
+    :return: 'sha256:<hex digest>'
+    """
+    canonical: str = json.dumps({"distro": target.distro, "release": target.release,
+                                 "tags": sorted(set(target.tags)), "packages": sorted(set(packages))},
+                                separators=(",", ":"))
+    return "sha256:" + hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def file_stamps(files: Iterable[Path]) -> list[list]:
+    """[path, size, modification time] of every file; comparing stamps only needs a stat call per file."""
+    stamps: list[list] = list()
+    for file in files:
+        stat = file.stat()
+        stamps.append([str(file.resolve()), stat.st_size, stat.st_mtime_ns])
+    return stamps
+
+
+@dataclass
+class RunState:
+    """
+    What a run resolved: the fingerprint, the options it depends on, and the stamps of the files it read.
+
+    options: the options that influence the resolved packages (target, output of a closure, ...)
+    files: stamps (see :func:`file_stamps`) of the orgmode file, its included files and other input files
+    fingerprint: see :func:`fingerprint`
+    """
+    options: dict = field(default_factory=dict)
+    files: list[list] = field(default_factory=list)
+    fingerprint: str = ""
+
+    @classmethod
+    def load(cls, file: Path) -> RunState | None:
+        """The state saved in file, or None when file is missing or can not be read."""
+        try:
+            data: dict = json.loads(file.read_text())
+            if data.pop("version", None) != _STATE_VERSION:
+                return None
+            return cls(**data)
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def save(self, file: Path):
+        """Write the state atomically to file."""
+        write_atomically(file, json.dumps(dict(version=_STATE_VERSION, **asdict(self))).encode())
+
+    def is_current(self, options: dict, files: list[list] | None = None) -> bool:
+        """
+        Were the options the same, and are the recorded files unchanged (size and modification time)?
+
+        :param files: stamps of the input files of the current run (orgmode file, families file, ...), which
+                      have to be the first of the recorded files (these are followed by the included files)
+        """
+        if options != self.options or not self.files:
+            return False
+        if files is not None and self.files[:len(files)] != files:
+            return False
+        try:
+            return file_stamps([Path(path) for path, _, _ in self.files]) == self.files
+        except OSError:
+            return False
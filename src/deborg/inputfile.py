@@ -0,0 +1,153 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2022 Tobias Marczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Open orgmode files for reading, decompressing gzip, xz and bzip2 compressed files on the fly, read
+orgmode documents that are already in memory, and write files (caches, state) atomically.
+
+Functions:
+
+    open_org_file
+    org_lines
+    compression
+    write_atomically
+
+Misc variables:
+
+    COMPRESSION_MAGIC
+    __author__
+    __version__
+"""
+
+from __future__ import annotations
+
+__author__ = "Tobias Marczewski"
+__version__ = "1.0.0"
+
+import io
+import os
+
+from collections.abc import Iterable
+from pathlib import Path
+from typing import BinaryIO, TextIO
+
+
+# leading bytes of a compressed file -> compression format
+COMPRESSION_MAGIC: dict[bytes, str] = {
+    b"\x1f\x8b": "gzip",
+    b"\xfd7zXZ\x00": "xz",
+    b"BZh": "bzip2",
+}
+
+
+def compression(file: Path) -> str | None:
+    """
+    Detect the compression of file by its leading (magic) bytes, independent of the file name.
+
+    :return: 'gzip', 'xz', 'bzip2', or None for an uncompressed file
+    """
+    with file.open(mode='rb') as _file:
+        head: bytes = _file.read(max([len(magic) for magic in COMPRESSION_MAGIC]))
+    for magic, name in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def org_lines(data: str | bytes | TextIO | BinaryIO | Iterable[str] | Iterable[bytes]) -> Iterable[str]:
+    """
+    The lines of an orgmode document held in memory or read from a stream, without writing it to a file.
+
+    Bytes and binary streams are decoded as UTF-8, after decompressing them when they start with the magic
+    bytes of gzip, xz or bzip2 (see :func:`open_org_file`).
+
+    :param data: str, bytes, text or binary file object, or an iterable of (str or bytes) lines
+    """
+    if isinstance(data, str):
+        return io.StringIO(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = io.BytesIO(bytes(data))
+    if hasattr(data, "read"):
+        if isinstance(data.read(0), str):
+            return data
+        return _decoded(data)
+    if isinstance(data, (list, tuple)) and not any([isinstance(line, bytes) for line in data[:1]]):
+        return data
+    return (line.decode() if isinstance(line, bytes) else line for line in data)
+
+
+def _decoded(stream: BinaryIO) -> Iterable[str]:
+    """Decompress (when compressed) and decode the lines of a binary stream; the stream is not closed."""
+    size: int = max([len(magic) for magic in COMPRESSION_MAGIC])
+    if hasattr(stream, "peek"):
+        head: bytes = stream.peek(size)[:size]
+    elif hasattr(stream, "seekable") and stream.seekable():
+        start: int = stream.tell()
+        head = stream.read(size)
+        stream.seek(start)
+    else:
+        stream = io.BytesIO(stream.read())
+        head = stream.getvalue()[:size]
+
+    kind: str | None = None
+    for magic, name in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            kind = name
+    if kind == "gzip":
+        import gzip
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    elif kind == "xz":
+        import lzma
+        stream = lzma.LZMAFile(stream, mode='rb')
+    elif kind == "bzip2":
+        import bz2
+        stream = bz2.BZ2File(stream, mode='rb')
+    # lines end with b'\n', which never is part of a multi byte UTF-8 character
+    return (line.decode("utf-8") for line in stream)
+
+
+def open_org_file(file: Path) -> TextIO:
+    """
+    Open file as text stream; compressed files are decompressed while being read, so that only the
+    compressed bytes have to be read from disk (or the network) and no temporary file is needed.
+    """
+    kind: str | None = compression(file)
+    if kind == "gzip":
+        import gzip
+        return gzip.open(file, mode='rt')
+    if kind == "xz":
+        import lzma
+        return lzma.open(file, mode='rt')
+    if kind == "bzip2":
+        import bz2
+        return bz2.open(file, mode='rt')
+    return file.open(mode='r')
+
+
+def write_atomically(file: Path, data: bytes):
+    """
+    Write data to a temporary file next to file and rename it to file, so that readers (and other processes
+    writing the same file) only ever see a complete file.
+
+    :raises: OSError
+    """
+    tmp_file: Path = file.with_name(f".{file.name}.{os.getpid()}")
+    try:
+        tmp_file.write_bytes(data)
+        os.replace(tmp_file, file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
@@ -21,6 +21,12 @@ Parse an emacs orgmode file to extract Debian package information.
 Classes:
 
     DebPakInfo
+    LineProblem
+    OrgParserError
+    DuplicatePackageError
+    MalformedLineError
+    IncludeError
+    ParseCancelled
     OrgParser
 
 Misc variables:
@@ -35,25 +41,42 @@ __author__ = "Tobias Marczewski"
 __version__ = "1.0.0"
 
 
+import functools
 import re
 
-from collections.abc import Sequence
+from collections.abc import Iterable, Iterator, Sequence
 from dataclasses import dataclass
 from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, TextIO
 
+from deborg.families import DistroFamilies, FamilyKeyword
+from deborg.inputfile import compression, open_org_file, org_lines
 
-@dataclass
+if TYPE_CHECKING:
+    from deborg.progress import ProgressMonitor
+
+
+@dataclass(frozen=True)
 class DebPakInfo:
     """
     Basic information container for a .deb package (name, distro, release, tags).
+
+    The specificity of the specification is computed once, when the package is created: specifying tags
+    is more specific than specifying a release, which is more specific than specifying a distro. Of the
+    alternatives on a line that match a target the most specific one is selected.
     """
     name: str
     distro: str = None
     release: str = None
-    tags: list[str] = None
+    tags: Sequence[str] = None
+
+    def __post_init__(self):
+        # not a dataclass field, so that it is not part of comparisons, repr() or asdict()
+        object.__setattr__(self, "specificity", (self.tags is not None) << 2 | (self.release is not None) << 1 |
+                           (self.distro is not None))
 
 
-class OrgParserError(BaseException):
+class OrgParserError(Exception):
     pass
 
 
@@ -61,12 +84,524 @@ class DuplicatePackageError(OrgParserError):
     pass
 
 
+class MalformedLineError(OrgParserError):
+    """
+    A package line that does not follow the expected format.
+
+    When raised while parsing a file, `nr` and `line` hold the line number and content of the offending line,
+    and `reason` the description of the problem. For lines of included files `source` names the file and the
+    chain of files including it.
+    """
+
+    def __init__(self, reason: str, nr: int | None = None, line: str | None = None, source: str | None = None):
+        super().__init__(reason if nr is None else f"Error in {_location(nr, source)}: {reason}")
+        self.reason: str = reason
+        self.nr: int | None = nr
+        self.line: str | None = line
+        self.source: str | None = source
+
+
+class IncludeError(OrgParserError):
+    """An '#+INCLUDE:' directive that can not be followed (missing file or include cycle)."""
+    pass
+
+
+class ParseCancelled(OrgParserError):
+    """
+    Parsing was stopped by the cancel token of a :class:`~progress.ProgressMonitor`.
+
+    `status` is 'cancelled' or 'deadline', `lines` the number of lines read until then.
+    """
+
+    def __init__(self, status: str, lines: int):
+        super().__init__(f"Parsing {status if status == 'cancelled' else 'stopped at the deadline'} "
+                         f"after {lines} lines.")
+        self.status: str = status
+        self.lines: int = lines
+
+
+@dataclass(frozen=True)
+class LineProblem:
+    """
+    A line that could not be resolved, collected instead of raised with the 'collect' conflict policy.
+
+    kind: 'ambiguous' (several alternatives match equally well) or 'malformed'
+    reason: description of the problem (the message of the error that would have been raised)
+    alternatives: the names of the equally matching alternatives, for ambiguous lines
+    """
+    kind: str
+    nr: int
+    source: str | None
+    reason: str
+    alternatives: tuple[str, ...] = ()
+
+    def __str__(self) -> str:
+        return f"Error in {_location(self.nr, self.source)}: {self.reason}"
+
+
+def _key(package: DebPakInfo) -> tuple:
+    """Name and specification of an alternative, the same whether its tags are a list or a tuple."""
+    return package.name, package.distro, package.release, tuple(package.tags) if package.tags is not None else None
+
+
+def _ambiguity(best: DebPakInfo, tied: Sequence[DebPakInfo]) -> str:
+    """The message reporting a line with several equally specific matching alternatives."""
+    msg = "More than two packages match the specifications"
+    return f"{msg}: {', '.join([p.name for p in [best] + list(tied)])}."
+
+
+def _location(nr: int, source: str | None) -> str:
+    """'line <nr>', or 'line <nr> of <source>' for lines of included files."""
+    return f"line {nr}" if source is None else f"line {nr} of {source}"
+
+
 class OrgParser:
-    """Class that contains static methods to parse an emacs .org file """
+    """
+    Parse an emacs .org file for .deb packages.
+
+    An OrgParser instance is configured once for a target (distro, release, tags) and the list bullets to
+    look for; everything that does not depend on the parsed text (the package line pattern, the set of tags)
+    is prepared in the constructor, so that parsing a line does no setup work. An instance is not changed by
+    parsing and can be shared between threads.
+
+    The static methods provide the same functionality without creating a parser first.
+    """
 
     # symbols that can indicate a line in a list, which can contain a .deb package
     LIST_BULLETS: str = "-+"
 
+    # how lines with several equally specific matching alternatives are handled:
+    #   error: raise an error; collect: skip the line and collect it (and malformed lines) as LineProblem;
+    #   first: select the first of them; most-specific: the one matching most of the requested tags, then the first
+    CONFLICT_POLICIES: tuple[str, ...] = ("error", "collect", "first", "most-specific")
+
+    # a table with a header row naming some of these columns (including 'package') lists one package per row
+    TABLE_COLUMNS: tuple[str, ...] = ("package", "distro", "release", "tags")
+
+    # scanning a package line: runs of whitespace, characters up to the end of a package string,
+    # and up to the end of a package name
+    _SPACES: re.Pattern = re.compile("[ \t]*")
+    _NAME_CHARS: re.Pattern = re.compile("[^ \t,]*")
+    _NAME_END: re.Pattern = re.compile("[^ \t{]*")
+    # an org include directive '#+INCLUDE: "file" :keyword ...' that includes org content; with a block type
+    # ('#+INCLUDE: "script.sh" src sh', 'example', 'export', ...) the file is not org and not followed
+    _INCLUDE: re.Pattern = re.compile("[ \\t]*#\\+include:[ \\t]*(?:\"([^\"]+)\"|([^ \\t\"]+))[ \\t]*(?::.*)?$",
+                                      re.IGNORECASE)
+    # a distro family keyword '#+DEBORG_FAMILY: <derived> <parent>'
+    _FAMILY: re.Pattern = re.compile("[ \\t]*#\\+deborg_family:(.*)", re.IGNORECASE)
+    # a package string without optional whitespace: name {distro:release:tags}
+    _PACKAGE_STRING: re.Pattern = re.compile(
+        "([-+.\\w]+)(?:[ \t]+[{](\\w*)(?::([\\w.]*)(?::([-,\\w]*))?)?[}])?")
+    # valid package names, and the fields in {<distro>:<release>:<tags>} (may be empty)
+    _PACKAGE_NAME: re.Pattern = re.compile("[-+.\\w]+")
+    _SPEC_FIELDS: tuple[re.Pattern, ...] = (
+        re.compile("\\w*"),
+        re.compile("[\\w.]*"),
+        re.compile("[-,\\w]*"),
+    )
+
+    def __init__(self, distro: str = "", release: str = "", tags: Iterable[str] | None = None,
+                 bullets: str | None = None, numbered: bool = False, tables: bool = True, includes: bool = True,
+                 families: DistroFamilies | None = None, conflicts: str = "error", unique: bool = True):
+        """
+        :param distro: name of the distro
+        :param release: name of the release
+        :param tags: tag or tags to include
+        :param bullets: symbols of list items that can contain packages (default: LIST_BULLETS)
+        :param numbered: also look for packages in numbered list items ('1.' or '1)')
+        :param tables: also look for packages in org tables (see TABLE_COLUMNS)
+        :param includes: follow '#+INCLUDE: "file"' directives (relative to the including file)
+        :param families: distro families; alternatives for a distro the target distro is based on match
+                         the target, but are less specific than alternatives for the target distro itself
+        :param conflicts: policy for ambiguous lines (see CONFLICT_POLICIES)
+        :param unique: extract every package only once, from the first line selecting it
+
+        :raises: ValueError, when no list bullets are given or the conflict policy is unknown.
+        """
+        if conflicts not in OrgParser.CONFLICT_POLICIES:
+            raise ValueError(f"Unknown conflict policy '{conflicts}', expected one of: "
+                             f"{', '.join(OrgParser.CONFLICT_POLICIES)}.")
+        self.distro: str = distro
+        self.release: str = release
+        self.tags: frozenset[str] = frozenset(tags) if tags else frozenset()
+        self.bullets: str = OrgParser.LIST_BULLETS if bullets is None else bullets
+        self.numbered: bool = numbered
+        self.tables: bool = tables
+        self.includes: bool = includes
+        self.families: DistroFamilies = families if families is not None else DistroFamilies()
+        self.conflicts: str = conflicts
+        self.unique: bool = unique
+        # distro -> rank of the distros whose alternatives match the target (0: the target distro itself)
+        self._distro_rank: dict[str, int] = self.families.precedence(distro)
+
+        bullet_patterns: list[str] = []
+        if self.bullets:
+            bullet_patterns.append("[" + re.escape(self.bullets) + "]")
+        if numbered:
+            bullet_patterns.append("\\d+[.)]")
+        if not bullet_patterns:
+            raise ValueError("No list bullets to look for.")
+        # the match ends where the package information starts
+        self._package_line: re.Pattern = re.compile("\\s*(?:" + "|".join(bullet_patterns) + ")\\s+(?=\\w)")
+
+    def extract(self, file: Path) -> list[str]:
+        """
+        Extract the names of the .deb packages from a file that match the target of the parser.
+
+        :raises: OrgParserError
+        :raises: FileNotFoundError
+        """
+        return [p.name for _, p in self.iter_packages(file)]
+
+    def iter_packages(self, file: Path, monitor: ProgressMonitor | None = None,
+                      problems: list[LineProblem] | None = None,
+                      duplicates: dict[str, list[tuple[int, str | None]]] | None = None) \
+            -> Iterator[tuple[int, DebPakInfo]]:
+        """
+        Lazily extract .deb packages from a file that match the target of the parser.
+
+        Files compressed with gzip, xz or bzip2 are decompressed while they are read. The file is read line by
+        line and each matching package is yielded as soon as its line has been parsed, so that callers can start
+        processing the output before the whole file has been read; included files are parsed through the
+        (caching) :func:`~catalog.shared_include_graph`.
+
+        :param monitor: reports the progress through file (not its included files) and stops parsing
+                        when cancelled, also while included files are read (these are then read line by
+                        line instead of taken from the cache)
+        :param problems: with the 'collect' conflict policy, ambiguous and malformed lines are appended to
+                         this list instead of raising an error
+        :param duplicates: filled with the packages selected on more than one line (also when they are not
+                           dropped, see `unique`):
+                           name -> (line number, source) of each of these lines
+
+        :return: iterator over (line number, package) tuples
+
+        :raises: OrgParserError
+        :raises: ParseCancelled, only with a monitor
+        :raises: FileNotFoundError
+        :raises: ValueError, for the 'collect' policy without a problems list
+        """
+        if not file.is_file():
+            raise FileNotFoundError(f"File {file} not found.")
+        if monitor is not None and compression(file) is None:
+            monitor.total_bytes = file.stat().st_size
+
+        if self.includes:
+            # imported here, as the catalog module builds on this one
+            from deborg.catalog import shared_include_graph
+            entries: Iterable = shared_include_graph().iter_entries(file, self, monitor)
+            if monitor is not None:
+                entries = monitor.entries(entries)
+            yield from self._resolve_entries(entries, monitor, problems, duplicates)
+            return
+
+        with open_org_file(file) as _file:
+            lines: Iterable[str] = _file if monitor is None else monitor.lines(_file)
+            entries = ((nr, item, None) for nr, item in self.scan_lines(lines))
+            if monitor is not None:
+                entries = monitor.entries(entries)
+            yield from self._resolve_entries(entries, monitor, problems, duplicates)
+
+    def extract_from(self, data: str | bytes | TextIO | BinaryIO | Iterable[str]) -> list[str]:
+        """
+        Extract the names of the .deb packages that match the target of the parser from an orgmode document
+        that is not a file (see :func:`~parser.OrgParser.iter_packages_from`).
+
+        :raises: OrgParserError
+        """
+        return [p.name for _, p in self.iter_packages_from(data)]
+
+    def iter_packages_from(self, data: str | bytes | TextIO | BinaryIO | Iterable[str],
+                           monitor: ProgressMonitor | None = None, problems: list[LineProblem] | None = None,
+                           duplicates: dict[str, list[tuple[int, str | None]]] | None = None) \
+            -> Iterator[tuple[int, DebPakInfo]]:
+        """
+        Lazily extract .deb packages that match the target of the parser from an orgmode document held in
+        memory or read from a stream, e.g. received over the network, without writing it to a file first.
+
+        Bytes and binary streams are decoded as UTF-8 and may be compressed (see :func:`~inputfile.org_lines`).
+        Include directives are ignored, as there is no file to resolve them against.
+
+        :param data: the document as str, bytes, text or binary file object, or iterable of lines
+        :param monitor: reports the progress and stops parsing when cancelled
+        :param problems: see :func:`~parser.OrgParser.iter_packages`
+        :param duplicates: see :func:`~parser.OrgParser.iter_packages`
+
+        :return: iterator over (line number, package) tuples
+
+        :raises: OrgParserError
+        :raises: ParseCancelled, only with a monitor
+        :raises: ValueError, for the 'collect' policy without a problems list
+        """
+        lines: Iterable[str] = org_lines(data) if monitor is None else monitor.lines(org_lines(data))
+        entries: Iterable = ((nr, item, None) for nr, item in self.scan_lines(lines) if not isinstance(item, str))
+        if monitor is not None:
+            entries = monitor.entries(entries)
+        yield from self._resolve_entries(entries, monitor, problems, duplicates)
+
+    def _resolve_entries(self, entries: Iterable[tuple[int, Sequence[DebPakInfo] | FamilyKeyword |
+                                                        MalformedLineError, str | None]],
+                         monitor: ProgressMonitor | None = None, problems: list[LineProblem] | None = None,
+                         duplicates: dict[str, list[tuple[int, str | None]]] | None = None) \
+            -> Iterator[tuple[int, DebPakInfo]]:
+        """
+        Resolve (line number, packages or family keyword, source) entries, applying family keywords
+        (and telling monitor about every resolved line and found package, and collecting problems for the
+        'collect' policy).
+
+        For a unique parser, packages already selected on an earlier line are dropped; they are reported in
+        duplicates (for any parser) when it is given. A dict of the packages seen so far keeps this a constant
+        time check per line, and the packages are still yielded in the order of the file as soon as their line
+        is resolved.
+        """
+        collect: bool = self.conflicts == "collect"
+        if collect and problems is None:
+            raise ValueError("The 'collect' conflict policy needs a list to collect the problems in.")
+        resolver: OrgParser = self
+        packages_seen: bool = False
+        # name -> (line number, source) of the line the package was first selected on
+        selected: dict[str, tuple[int, str | None]] | None = \
+            dict() if self.unique or duplicates is not None else None
+        for nr, item, source in entries:
+            if isinstance(item, FamilyKeyword):
+                resolver = self.with_families(
+                    OrgParser.apply_family_keyword(resolver.families, item, nr, source, packages_seen))
+                continue
+            if isinstance(item, MalformedLineError):
+                problems.append(LineProblem("malformed", nr, source, item.reason))
+                continue
+            packages_seen = True
+            tied: list[DebPakInfo] | None = None
+            if collect:
+                package, tied = resolver._select(item)
+            else:
+                package = resolver.resolve_line(nr, item, source)
+            if monitor is not None:
+                monitor.resolved()
+            if tied:
+                problems.append(LineProblem("ambiguous", nr, source, _ambiguity(package, tied),
+                                            tuple([p.name for p in [package] + tied])))
+                continue
+            if package:
+                if selected is not None:
+                    first: tuple[int, str | None] | None = selected.get(package.name)
+                    if first is None:
+                        selected[package.name] = (nr, source)
+                    else:
+                        if duplicates is not None:
+                            duplicates.setdefault(package.name, [first]).append((nr, source))
+                        if self.unique:
+                            continue
+                if monitor is not None:
+                    monitor.found()
+                yield nr, package
+
+    def with_families(self, families: DistroFamilies) -> OrgParser:
+        """A parser with the same configuration, but the distro families families."""
+        if families == self.families:
+            return self
+        return OrgParser(self.distro, self.release, self.tags, self.bullets, self.numbered, self.tables,
+                         self.includes, families, self.conflicts, self.unique)
+
+    @staticmethod
+    def apply_family_keyword(families: DistroFamilies, keyword: FamilyKeyword, nr: int, source: str | None,
+                             packages_seen: bool) -> DistroFamilies:
+        """
+        Extend families by the entry of a '#+DEBORG_FAMILY:' keyword in line nr of a file.
+
+        :param packages_seen: whether a package line came before the keyword (keywords apply to the whole
+                              file, hence have to come before the first package line)
+
+        :raises: MalformedLineError, for misplaced keywords and entries conflicting with families.
+        """
+        if packages_seen:
+            raise MalformedLineError("'#+DEBORG_FAMILY:' has to come before the first package line.", nr,
+                                     source=source)
+        try:
+            return families.with_parent(keyword.derived, keyword.parent)
+        except ValueError as e:
+            raise MalformedLineError(str(e), nr, source=source)
+
+    def package_from_line(self, line: str) -> DebPakInfo | None:
+        """
+        Parse a line and return the package matching the target of the parser.
+        (see :func:`~parser.OrgParser.extract_deb_package_from_line`)
+
+        :raises: DuplicatePackageError, when more than one package matches in a given line.
+        :raises: MalformedLineError
+        """
+        packages: list[DebPakInfo] | None = self.parse_line(line)
+        if packages is None:
+            return None
+        return self.select(packages)
+
+    def is_package_line(self, line: str) -> bool:
+        """Is the passed line a list entry that can contain package information?"""
+        return self._package_line.match(line) is not None
+
+    def parse_line(self, line: str) -> list[DebPakInfo] | None:
+        """
+        Parse a line into the list of alternative packages it specifies, independent of the target.
+
+        :return: list of DebPakInfo objects in the order of the line, or None if the line is not a package line.
+
+        :raises: MalformedLineError
+        """
+        bullet = self._package_line.match(line)
+        if bullet is None:
+            return None
+        return [OrgParser._get_package_info(package_string)
+                for package_string in OrgParser._split_package_string(line[bullet.end():].strip())]
+
+    def parse_lines(self, lines: Iterable[str]) -> Iterator[tuple[int, list[DebPakInfo]]]:
+        """
+        Parse lines of an orgmode file, independent of the target.
+
+        :return: iterator over (line number, alternative packages) tuples for each package line.
+
+        :raises: MalformedLineError
+        """
+        for nr, item in self.scan_lines(lines):
+            if isinstance(item, list):
+                yield nr, item
+
+    def scan_lines(self, lines: Iterable[str]) -> Iterator[tuple[int, list[DebPakInfo] | str | FamilyKeyword]]:
+        """
+        Parse lines of an orgmode file like :func:`~parser.OrgParser.parse_lines`, but also report
+        '#+INCLUDE: "file"' directives (when the parser follows includes) and '#+DEBORG_FAMILY:' keywords.
+
+        :return: iterator over (line number, alternative packages) tuples for each package line,
+                 (line number, included file name) tuples for each include directive, and
+                 (line number, FamilyKeyword) tuples for each family keyword; with the 'collect'
+                 conflict policy also (line number, MalformedLineError) tuples for malformed lines.
+
+        :raises: MalformedLineError
+        """
+        collect: bool = self.conflicts == "collect"
+        in_table: bool = False
+        # column indices of the current table when it is a package table (see TABLE_COLUMNS)
+        columns: tuple[int, ...] | None = None
+        for nr, line in enumerate(lines):
+            try:
+                if self.tables and line.lstrip().startswith("|"):
+                    row: str = line.strip()
+                    if row.startswith("|-"):
+                        # horizontal rule; a rule at the top of a table comes before the header row
+                        continue
+                    if not in_table:
+                        in_table = True
+                        columns = OrgParser._table_columns(row)
+                        continue
+                    packages: list[DebPakInfo] | None = None
+                    if columns is not None:
+                        packages = OrgParser._parse_table_row(row, columns)
+                else:
+                    in_table = False
+                    columns = None
+                    if line.lstrip()[:2] == "#+":
+                        include = OrgParser._INCLUDE.match(line) if self.includes else None
+                        if include:
+                            yield nr, include.group(1) if include.group(1) is not None else include.group(2)
+                            continue
+                        family = OrgParser._FAMILY.match(line)
+                        if family:
+                            yield nr, OrgParser._family_keyword(family.group(1))
+                            continue
+                    packages = self.parse_line(line)
+            except MalformedLineError as e:
+                if not collect:
+                    raise MalformedLineError(e.reason, nr, line.rstrip("\n"))
+                yield nr, MalformedLineError(e.reason, nr, line.rstrip("\n"))
+                continue
+            if packages is not None:
+                yield nr, packages
+
+    def select(self, packages: Sequence[DebPakInfo]) -> DebPakInfo | None:
+        """
+        Select the package matching the target of the parser from the alternatives of one package line.
+
+        :return: a DebPakInfo object, or None if none matches.
+
+        :raises: DuplicatePackageError, when more than one package matches (for the 'error' and 'collect'
+                 conflict policies).
+        """
+        best, tied = self._select(packages)
+        if not tied:
+            return best
+        if self.conflicts == "first":
+            return best
+        if self.conflicts == "most-specific":
+            # max() returns the first of several equal ones
+            return max([best] + tied, key=lambda p: len(self.tags.intersection(p.tags)) if p.tags else 0)
+        raise DuplicatePackageError(_ambiguity(best, tied))
+
+    def _select(self, packages: Sequence[DebPakInfo]) -> tuple[DebPakInfo | None, list[DebPakInfo]]:
+        """
+        The first of the most specific matching alternatives, and the further alternatives as specific as it
+        (only differing alternatives, in the order of the line).
+        """
+        # A package lacking distro, release or tags information (=None) matches any distro, release or
+        # tags. Of the matching packages the one with the most specific specification is returned
+        # (tags > release > distro, see DebPakInfo), in a single pass over the alternatives. Within the
+        # distro component an alternative for the target distro is more specific than one for a distro it
+        # is based on (the closer, the more specific), so the family rank only breaks ties.
+        distro_rank: dict[str, int] = self._distro_rank
+        # the ranks are 0 (the target distro) to len - 1 (its furthest ancestor)
+        n_ranks: int = len(distro_rank)
+
+        best: DebPakInfo | None = None
+        best_specificity: int = -1
+        # further alternatives as specific as best; identical alternatives are only counted once, and a set
+        # keeps this linear for lines with many alternatives
+        tied: list[DebPakInfo] = []
+        tied_keys: set[tuple] | None = None
+        for package in packages:
+            if package.release is not None and package.release != self.release:
+                continue
+            specificity: int = package.specificity * n_ranks
+            if package.distro is not None:
+                rank: int | None = distro_rank.get(package.distro)
+                if rank is None:
+                    continue
+                specificity -= rank
+            if package.tags is not None and self.tags.isdisjoint(package.tags):
+                continue
+            if specificity > best_specificity:
+                best, best_specificity, tied, tied_keys = package, specificity, [], None
+            elif specificity == best_specificity:
+                if tied_keys is None:
+                    tied_keys = {_key(best)}
+                key: tuple = _key(package)
+                if key not in tied_keys:
+                    tied_keys.add(key)
+                    tied.append(package)
+
+        return best, tied
+
+    def resolve_line(self, nr: int, packages: Sequence[DebPakInfo], source: str | None = None) \
+            -> DebPakInfo | None:
+        """
+        Select the matching package of a parsed line, reporting ambiguous lines with their line number
+        (and for lines of included files, the file and chain of files including it).
+
+        :raises: OrgParserError, when more than one package matches.
+        """
+        try:
+            return self.select(packages)
+        except DuplicatePackageError as e:
+            msg: str = f"Error in {_location(nr, source)}: {e}"
+            raise OrgParserError(msg)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def _configured(distro: str, release: str, tags: tuple[str, ...]) -> OrgParser:
+        """Shared parser instances for the static methods, so that they do not set up a parser on every call."""
+        return OrgParser(distro, release, tags)
+
+    @staticmethod
+    def _for(distro: str, release: str, tags: Iterable[str] | None) -> OrgParser:
+        return OrgParser._configured(distro, release, tuple(tags) if tags else ())
+
     @staticmethod
     def extract_deb_packages(file: Path, distro: str, release: str, tags: list[str] | None = None) -> list[str]:
         """
@@ -83,24 +618,49 @@ class OrgParser:
         :raises: OrgParserError
         :raises: FileNotFoundError
         """
+        return OrgParser._for(distro, release, tags).extract(file)
 
-        if not file.is_file():
-            raise FileNotFoundError(f"File {file} not found.")
+    @staticmethod
+    def extract_deb_packages_from(data: str | bytes | TextIO | BinaryIO | Iterable[str], distro: str, release: str,
+                                  tags: list[str] | None = None) -> list[str]:
+        """
+        Extract .deb packages that match distro and release from an orgmode document that is not a file.
+        (see :func:`~parser.OrgParser.iter_packages_from`)
 
-        lines: list[str]
-        packages: list[DebPakInfo] = list()
-        with file.open(mode='r') as _file:
-            lines = _file.readlines()
-        for nr, line in enumerate(lines):
-            try:
-                package = OrgParser.extract_deb_package_from_line(line, distro, release, tags)
-                if package:
-                    packages.append(package)
-            except DuplicatePackageError as e:
-                msg: str = f"Error in line {nr}: {e}"
-                raise OrgParserError(msg)
+        :param data: the document as str, bytes, text or binary file object, or iterable of lines
+        :param distro: name of the distro
+        :param release: name of the release
+        :param tags: tag or tags to include
+
+        :return: list of packages
+
+        :raises: OrgParserError
+        """
+        return OrgParser._for(distro, release, tags).extract_from(data)
+
+    @staticmethod
+    def iter_deb_packages(file: Path, distro: str, release: str, tags: list[str] | None = None) ->\
+            Iterator[tuple[int, DebPakInfo]]:
+        """
+        Lazily extract .deb packages from a file that match distro and release.
+        (see :func:`~parser.OrgParser.iter_packages`)
+
+        :return: iterator over (line number, package) tuples
+
+        :raises: OrgParserError
+        :raises: FileNotFoundError
+        """
+        return OrgParser._for(distro, release, tags).iter_packages(file)
 
-        return [p.name for p in packages]
+    @staticmethod
+    def resolve_package_line(nr: int, packages: Sequence[DebPakInfo], distro: str, release: str,
+                             tags: Sequence[str] = None) -> DebPakInfo | None:
+        """
+        Select the matching package of a parsed line, reporting ambiguous lines with their line number.
+
+        :raises: OrgParserError, when more than one package matches.
+        """
+        return OrgParser._for(distro, release, tags).resolve_line(nr, packages)
 
     @staticmethod
     def extract_deb_package_from_line(line: str, distro: str, release: str, tags: Sequence[str] = None)\
@@ -130,70 +690,56 @@ class OrgParser:
         :return: a DebPakInfo object, or None if none matches the specifications.
 
         :raises: DuplicatePackageError, when more than one package matches in a given line.
+        :raises: MalformedLineError, when the line does not follow the format above.
         """
-        if not OrgParser._is_package_line(line):
-            return None
-        _tags: list[str] = []
-        if tags:
-            _tags = list(tags)
-        packages: list[DebPakInfo] = list()
+        return OrgParser._for(distro, release, tags).package_from_line(line)
 
-        for package_string in OrgParser._split_package_line(line):
-            packages.append(OrgParser._get_package_info(package_string))
+    @staticmethod
+    def parse_package_line(line: str) -> list[DebPakInfo] | None:
+        """
+        Parse a line containing deb package information into the list of alternative packages it specifies.
+        (for line format see :func:`~parser.OrgParser.extract_deb_package_from_line`)
 
-        # filter packages
-        # if a package lacks distro or release information (=None) treat it
-        # to match any distro or release. If an exact match for distro or
-        # distro and release can be found return this.
-        kept_packages: list[DebPakInfo] = OrgParser._matching_packages(packages, distro, release, _tags)
+        :param line: The string to parse
 
-        if len(kept_packages) < 1:
-            return None
+        :return: list of DebPakInfo objects in the order of the line, or None if the line is not a package line.
 
-        # narrow by tags
-        if len(kept_packages) > 1 and len(_tags) > 0:
-            if any([p.tags is not None for p in kept_packages]):
-                kept_packages = [p for p in kept_packages if p.tags is not None]
-        # narrow by release
-        if len(kept_packages) > 1:
-            if any([p.release is not None for p in kept_packages]):
-                kept_packages = [p for p in kept_packages if p.release is not None]
-        # narrow by distro
-        if len(kept_packages) > 1:
-            if any([p.distro is not None for p in kept_packages]):
-                kept_packages = [p for p in kept_packages if p.distro is not None]
-
-        # still more than 1 package -> error
-        if len(kept_packages) > 1:
-            msg = "More than two packages match the specifications"
-            raise DuplicatePackageError(f"{msg}: {', '.join([p.name for p in kept_packages])}.")
-        return kept_packages[0]
+        :raises: MalformedLineError
+        """
+        return OrgParser._for("", "", None).parse_line(line)
 
     @staticmethod
-    def _matching_packages(packages: Sequence[DebPakInfo], distro: str, release: str, tags: list[str]) ->\
-            list[DebPakInfo]:
+    def parse_package_lines(lines: Iterable[str]) -> Iterator[tuple[int, list[DebPakInfo]]]:
         """
-        Filter packages by distro, release and tags.
-        (Retain all packages that are not in conflict with the specified distro or release)
+        Parse lines of an orgmode file, independent of any distro, release or tags.
+
+        :param lines: the lines of the file
+
+        :return: iterator over (line number, alternative packages) tuples for each package line.
         """
-        matching: list[DebPakInfo] = list()
-        for package in packages:
-            if package.release is not None and package.release != release:
-                continue
-            if package.distro is not None and package.distro != distro:
-                continue
-            if package.tags is not None:
-                if not any([tag in package.tags for tag in tags]):
-                    continue
-            if package not in matching:
-                matching.append(package)
-        return matching
+        return OrgParser._for("", "", None).parse_lines(lines)
+
+    @staticmethod
+    def select_package(packages: Sequence[DebPakInfo], distro: str, release: str, tags: Sequence[str] = None)\
+            -> DebPakInfo | None:
+        """
+        Select the package matching the specifications from the alternatives of one package line.
+
+        :param packages: the alternative packages (see :func:`~parser.OrgParser.parse_package_line`)
+        :param distro: return package for which distro?
+        :param release: return package for which release?
+        :param tags: package matching which tags?
+
+        :return: a DebPakInfo object, or None if none matches the specifications.
+
+        :raises: DuplicatePackageError, when more than one package matches.
+        """
+        return OrgParser._for(distro, release, tags).select(packages)
 
     @staticmethod
     def _is_package_line(line: str) -> bool:
         """Is the passed line a list entry that can contain package information?"""
-        check = re.match("^\\s*[" + OrgParser.LIST_BULLETS + "]\\s+\\w", line)
-        return True if check else False
+        return OrgParser._for("", "", None).is_package_line(line)
 
     @staticmethod
     def _split_package_line(line: str) -> list[str]:
@@ -203,75 +749,162 @@ class OrgParser:
 
         :param line: a line containing package information
         :return: a list of strings containing the info for each separate package.
+
+        :raises: MalformedLineError, when a '{' is not closed.
         """
-        if not OrgParser._is_package_line(line):
+        parser: OrgParser = OrgParser._for("", "", None)
+        bullet = parser._package_line.match(line)
+        if bullet is None:
             raise ValueError("Non package line passed!")
-        package_strings: list[str] = []
         # remove <list-bullet>
-        _line: str = line.strip()[1:].strip()
+        return OrgParser._split_package_string(line[bullet.end():].strip())
+
+    @staticmethod
+    def _family_keyword(value: str) -> FamilyKeyword:
+        """
+        Parse the value of a '#+DEBORG_FAMILY: <derived> <parent>' keyword.
+
+        :raises: MalformedLineError
+        """
+        fields: list[str] = value.split()
+        if len(fields) != 2:
+            raise MalformedLineError(f"Expected '#+DEBORG_FAMILY: <derived distro> <parent distro>', got "
+                                     f"'#+DEBORG_FAMILY:{value.rstrip()}'.")
+        return FamilyKeyword(fields[0], fields[1])
+
+    @staticmethod
+    def _split_package_string(_line: str) -> list[str]:
+        """
+        Split the package information of a package line (without the list bullet) into separate strings for
+        each package info, see :func:`~parser.OrgParser._split_package_line`.
+
+        Every character of the line is looked at a bounded number of times (the patterns used for scanning
+        are single character classes), so splitting takes linear time for any input.
+
+        :raises: MalformedLineError, when a '{' is not closed.
+        """
+        package_strings: list[str] = []
+        length: int = len(_line)
         last_pos: int = 0
         pos: int = 0
 
         # parse package by package (pak1 {..}, pak2, .. :: comment)
-        while pos < len(_line):
+        while pos < length:
             # ignore leading space
-            while _line[pos] == ' ':
-                pos += 1
+            pos = OrgParser._SPACES.match(_line, pos).end()
             # ignore a trailing comment
-            if _line[pos] == ':' and _line[pos+1] == ':':
+            if pos >= length or _line.startswith("::", pos):
                 break
             # package name
-            while pos < len(_line) and _line[pos] not in [' ', ',']:
-                pos += 1
+            pos = OrgParser._NAME_CHARS.match(_line, pos).end()
             # when not comma
-            if pos < len(_line) and _line[pos] != ',':
+            if pos < length and _line[pos] != ',':
                 # if space go to next non-space char
-                while pos < len(_line) and _line[pos] == ' ':
-                    pos += 1
+                pos = OrgParser._SPACES.match(_line, pos).end()
                 # check if bracket term
-                if pos < len(_line) and _line[pos] == '{':
-                    while _line[pos] != '}':
-                        pos += 1
-                    pos += 1
+                if pos < length and _line[pos] == '{':
+                    closing: int = _line.find('}', pos)
+                    if closing < 0:
+                        raise MalformedLineError(f"Missing '}}' for '{{' in: {_line[last_pos:].strip()}")
+                    pos = closing + 1
             # save part package string
             pack_string: str = _line[last_pos:pos].strip()
             package_strings.append(pack_string)
-            if pos < len(_line) and _line[pos] == ',':
+            if pos < length and _line[pos] == ',':
                 pos += 1
             last_pos = pos
 
         return package_strings
 
+    @staticmethod
+    def _table_columns(header: str) -> tuple[int, ...] | None:
+        """
+        Positions of the TABLE_COLUMNS in the cells of a split table row ('| a | b |'.split('|')),
+        -1 for missing columns, or None when the table does not list packages.
+        """
+        names: list[str] = [cell.strip().lower() for cell in header.split("|")[1:]]
+        if names and names[-1] == "":
+            names.pop()
+        if "package" not in names or not all([name in OrgParser.TABLE_COLUMNS for name in names]):
+            return None
+        return tuple([names.index(column) + 1 if column in names else -1 for column in OrgParser.TABLE_COLUMNS])
+
+    @staticmethod
+    def _parse_table_row(row: str, columns: tuple[int, ...]) -> list[DebPakInfo] | None:
+        """
+        Read the package of a row of a package table; a row is equivalent to a list item with one package.
+
+        The cells are fixed fields, so they are taken directly from the split row and only the non-empty
+        ones are checked against the patterns for a package name and the fields of {<distro>:<release>:<tags>}.
+
+        :return: a list with one DebPakInfo, or None when the package cell of the row is empty.
+
+        :raises: MalformedLineError
+        """
+        cells: list[str] = row.split("|")
+        n_cells: int = len(cells)
+        name, distro, release, tags = [cells[i].strip() if 0 < i < n_cells else "" for i in columns]
+        if not name:
+            return None
+        if not OrgParser._PACKAGE_NAME.fullmatch(name):
+            raise MalformedLineError(f"Not a valid package name: '{name}'.")
+        distro_pattern, release_pattern, tags_pattern = OrgParser._SPEC_FIELDS
+        if tags:
+            tags = tags.replace(" ", "")
+        if (distro and not distro_pattern.fullmatch(distro)) or (release and not release_pattern.fullmatch(release))\
+                or (tags and not tags_pattern.fullmatch(tags)):
+            raise MalformedLineError(f"Not a valid package specification for {name}: '{distro}:{release}:{tags}'.")
+        return [DebPakInfo(
+                    name=name,
+                    distro=distro if distro else None,
+                    release=release if release else None,
+                    tags=tags.split(",") if tags else None
+                )]
+
     @staticmethod
     def _get_package_info(string: str) -> DebPakInfo:
         """
         Extract debian package information from a string of the form:
         '<package-name> {<distro-name>:<release>:<tag1>,<tag2>,...}'
+
+        Well-formed strings without extra whitespace are matched by a single pattern in which every position
+        can only be matched one way. Other strings are cut into their fields first, and each field is then
+        checked against a pattern without nested repetition, so that no input can cause the regular
+        expressions to backtrack.
+
+        :raises: MalformedLineError
         """
-        package_info_regex: re.Pattern = re.compile(
-            "\\s*(?P<package_name>[-\\w]+)" +
-            "(\\s+[{]\\s*" +
-            "(?P<distro_name>[\\w]+)?" +
-            "((\\s*:\\s*(?P<release>[\\w.]*)?)" +
-            "(\\s*:\\s*(?P<tags>[-,\\w]*))?)?" +
-            "\\s*[}])?"
-        )
-        pak = package_info_regex.match(string)
-        if not pak:
-            raise ValueError("Not a valid package string.")
-
-        name: str = pak.group("package_name")
-        distro: str | None = pak.group("distro_name")
-        release: str | None = pak.group("release")
-
-        if distro == '':
-            distro = None
-        if release == '':
-            release = None
-
-        tags: list[str] | None = None
-        if pak.group("tags"):
-            tags = pak.group("tags").split(",")
+        _string: str = string.strip()
+        fast = OrgParser._PACKAGE_STRING.fullmatch(_string)
+        if fast:
+            name, distro, release, tags = fast.groups()
+            return DebPakInfo(
+                        name=name,
+                        distro=distro if distro else None,
+                        release=release if release else None,
+                        tags=tags.split(",") if tags else None
+                   )
+
+        name_end: int = OrgParser._NAME_END.match(_string).end()
+        name: str = _string[:name_end]
+        if not OrgParser._PACKAGE_NAME.fullmatch(name):
+            raise MalformedLineError(f"Not a valid package name: '{name}'.")
+
+        spec: str = _string[name_end:].strip()
+        if not spec:
+            return DebPakInfo(name=name)
+        if spec[0] != '{' or spec[-1] != '}' or '{' in spec[1:]:
+            raise MalformedLineError(f"Not a valid package specification for {name}: '{spec}'.")
+        fields: list[str] = [f.strip() for f in spec[1:-1].split(':')]
+        if len(fields) > 3:
+            raise MalformedLineError(f"Too many ':' in package specification for {name}: '{spec}'.")
+        fields += [''] * (3 - len(fields))
+        if not all([pattern.fullmatch(f) for pattern, f in zip(OrgParser._SPEC_FIELDS, fields)]):
+            raise MalformedLineError(f"Not a valid package specification for {name}: '{spec}'.")
+
+        distro: str | None = fields[0] if fields[0] != '' else None
+        release: str | None = fields[1] if fields[1] != '' else None
+        tags: list[str] | None = fields[2].split(",") if fields[2] != '' else None
 
         return DebPakInfo(
                     name=name,
@@ -0,0 +1,163 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2022 Tobias Marczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Write extracted package names in different output formats and bounded batches.
+
+Classes:
+
+    PackageWriter
+
+Misc variables:
+
+    OUTPUT_FORMATS
+    __author__
+    __version__
+"""
+
+from __future__ import annotations
+
+__author__ = "Tobias Marczewski"
+__version__ = "1.0.0"
+
+import json
+
+from typing import TextIO
+
+
+# text       - package names joined by a separator (one line per batch)
+# nul        - one NUL terminated record per package (batches only decide when records are written)
+# jsonl      - one JSON object per package (or per batch)
+# selections - lines of '<package> install' for 'dpkg --set-selections'
+OUTPUT_FORMATS: tuple[str, ...] = ("text", "nul", "jsonl", "selections")
+
+
+class PackageWriter:
+    """
+    Write package names to a text stream, grouped into batches of bounded size.
+
+    A batch is closed once it holds `batch_size` packages, or when adding the next package would let the
+    bytes written for the batch (in its output format, i.e. with separators, terminators or JSON syntax)
+    exceed `max_bytes`; a package that on its own exceeds `max_bytes` forms a batch of its own. Each batch
+    is written to the stream (and the stream flushed) as soon as it is closed, so a consumer can start
+    working on the first batch while the remaining packages are still being extracted.
+
+    Without `batch_size` and `max_bytes` the 'text' format writes all packages as one batch, without a
+    trailing newline, when the writer is closed; all other formats write every package to the stream as
+    soon as it is passed to the writer, but only flush the stream when the writer is closed.
+    """
+
+    def __init__(self, stream: TextIO, output_format: str = "text", sep: str = " ",
+                 batch_size: int | None = None, max_bytes: int | None = None):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'.")
+        if batch_size is not None and batch_size < 1:
+            raise ValueError("batch_size has to be a positive integer.")
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError("max_bytes has to be a positive integer.")
+
+        self._stream: TextIO = stream
+        self._format: str = output_format
+        self._sep: str = sep
+        self._batched: bool = batch_size is not None or max_bytes is not None
+        self._batch_size: int | None = batch_size
+        self._max_bytes: int | None = max_bytes
+        if not self._batched and output_format != "text":
+            self._batch_size = 1
+        # bytes between two records of a batch (see _format_batch)
+        self._sep_bytes: int = len(sep.encode()) if output_format == "text" else 2 if output_format == "jsonl" else 0
+
+        self._batch: list[tuple[str, int | None]] = []
+        self._batch_bytes: int = 0
+        self._n_batches: int = 0
+
+    @property
+    def n_batches(self) -> int:
+        """Number of batches written so far."""
+        return self._n_batches
+
+    def write(self, name: str, line: int | None = None):
+        """
+        Add a package to the current batch; write the batch out if it is full.
+
+        :param name: name of the package
+        :param line: line number the package was found on (only used by the 'jsonl' format)
+        """
+        size: int = self._record_bytes(name)
+        if self._batch and self._max_bytes is not None:
+            if self._batch_bytes + self._sep_bytes + size > self._max_bytes:
+                self.flush()
+        self._batch_bytes += self._sep_bytes + size if self._batch else self._batch_bytes_empty() + size
+        self._batch.append((name, line))
+        if self._batch_size is not None and len(self._batch) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        """Close the current batch and write it to the stream."""
+        if not self._batch:
+            return
+        self._stream.write(self._format_batch(self._batch))
+        # without batches, packages are only written as they come and flushed at the end
+        if self._batched:
+            self._stream.flush()
+        self._n_batches += 1
+        self._batch = []
+        self._batch_bytes = 0
+
+    def close(self):
+        """Write any remaining packages, and flush the stream."""
+        self.flush()
+        self._stream.flush()
+
+    def __enter__(self) -> PackageWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # do not write a partial last batch when extraction failed
+        if exc_type is None:
+            self.close()
+
+    def _record_bytes(self, name: str) -> int:
+        """Bytes written for package name within a batch (see _format_batch)."""
+        if self._format == "nul":
+            return len(name.encode()) + 1
+        if self._format == "selections":
+            return len(f"{name} install\n".encode())
+        if self._format == "jsonl":
+            return len(json.dumps(name))
+        return len(name.encode())
+
+    def _batch_bytes_empty(self) -> int:
+        """Bytes written for a batch besides its records: the newline of 'text', the JSON object of 'jsonl'."""
+        if self._format == "jsonl":
+            return len(json.dumps({"batch": self._n_batches, "packages": []})) + 1
+        return 1 if self._format == "text" else 0
+
+    def _format_batch(self, batch: list[tuple[str, int | None]]) -> str:
+        names: list[str] = [name for name, _ in batch]
+        if self._format == "text":
+            return self._sep.join(names) + ("\n" if self._batched else "")
+        if self._format == "nul":
+            # every name is a record of its own, so that 'xargs -0' passes each as a separate argument
+            return ''.join([f"{name}\0" for name in names])
+        if self._format == "selections":
+            return ''.join([f"{name} install\n" for name in names])
+        # jsonl
+        if not self._batched:
+            name, line = batch[0]
+            return json.dumps({"package": name, "line": line}) + "\n"
+        return json.dumps({"batch": self._n_batches, "packages": names}) + "\n"
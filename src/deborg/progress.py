@@ -0,0 +1,261 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2022 Tobias Marczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Report the progress of parsing large files, and stop parsing on a deadline or on request.
+
+Classes:
+
+    Progress
+    CancelToken
+    ProgressMonitor
+    ParseResult
+
+Functions:
+
+    extract_monitored
+    format_progress
+
+Misc variables:
+
+    COMPLETE
+    CANCELLED
+    DEADLINE
+    __author__
+    __version__
+"""
+
+from __future__ import annotations
+
+__author__ = "Tobias Marczewski"
+__version__ = "1.0.0"
+
+import threading
+import time
+
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, TextIO
+
+from deborg.orgparser import OrgParser, ParseCancelled
+
+
+COMPLETE: str = "complete"
+CANCELLED: str = "cancelled"
+DEADLINE: str = "deadline"
+
+
+@dataclass(frozen=True)
+class Progress:
+    """
+    How far parsing has come.
+
+    lines: number of lines read from the parsed file
+    bytes: size of these lines after decompression, counted in characters (bytes for ASCII text)
+    packages: number of packages found so far
+    elapsed: seconds since parsing started
+    total_bytes: size of the parsed file, when known (not for compressed files and streams)
+    """
+    lines: int
+    bytes: int
+    packages: int
+    elapsed: float
+    total_bytes: int | None = None
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second."""
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def fraction(self) -> float | None:
+        """Fraction of the file that has been read, when its size is known."""
+        return min(self.bytes / self.total_bytes, 1.0) if self.total_bytes else None
+
+
+class CancelToken:
+    """
+    Tells a running parse to stop, either when cancel() is called (from any thread) or once a deadline passed.
+
+    :param timeout: seconds from now after which parsing stops (None: no deadline)
+    """
+
+    def __init__(self, timeout: float | None = None):
+        self._cancelled: threading.Event = threading.Event()
+        self.deadline: float | None = time.monotonic() + timeout if timeout is not None else None
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def status(self) -> str | None:
+        """CANCELLED or DEADLINE when parsing has to stop, otherwise None."""
+        if self._cancelled.is_set():
+            return CANCELLED
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return DEADLINE
+        return None
+
+
+class ProgressMonitor:
+    """
+    Counts the lines read and the packages found while parsing, reports the progress to a callback at
+    most every `interval` seconds, and stops parsing (raising :class:`~orgparser.ParseCancelled`) when
+    the cancel token says so.
+
+    The clock, the callback and the token are only consulted every CHECK_EVERY lines, so that monitoring
+    adds little more than counting to every line. Parsing without a monitor is not affected at all.
+
+    :param callback: called with a :class:`Progress`
+    :param interval: minimum number of seconds between two calls of callback
+    :param token: stops parsing when cancelled or past its deadline
+    """
+
+    # number of lines between two looks at the clock, callback and token
+    CHECK_EVERY: int = 1024
+
+    def __init__(self, callback: Callable[[Progress], None] | None = None, interval: float = 0.5,
+                 token: CancelToken | None = None):
+        self.callback: Callable[[Progress], None] | None = callback
+        self.interval: float = interval
+        self.token: CancelToken | None = token
+        self.total_bytes: int | None = None
+        self._lines: int = 0
+        self._bytes: int = 0
+        self._packages: int = 0
+        self._start: float = time.monotonic()
+        self._next_report: float = self._start + interval
+
+    @property
+    def progress(self) -> Progress:
+        return Progress(self._lines, self._bytes, self._packages, time.monotonic() - self._start, self.total_bytes)
+
+    def lines(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        Pass lines through, counting them and checking for reports and cancellation on the way.
+
+        :raises: ParseCancelled
+        """
+        self.check()
+        check_every: int = self.CHECK_EVERY
+        n: int = 0
+        for line in lines:
+            if n == check_every:
+                self._lines += n
+                n = 0
+                self.check()
+            self._bytes += len(line)
+            n += 1
+            yield line
+        self._lines += n
+
+    def checked(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        Pass lines through without counting them (e.g. those of included files), but still checking for
+        reports and cancellation every CHECK_EVERY lines.
+
+        :raises: ParseCancelled
+        """
+        self.check()
+        check_every: int = self.CHECK_EVERY
+        n: int = 0
+        for line in lines:
+            if n == check_every:
+                n = 0
+                self.check()
+            n += 1
+            yield line
+
+    def entries(self, entries: Iterable[tuple]) -> Iterable[tuple]:
+        """The parsed (line number, item, source) entries, before they are resolved (passed through unchanged)."""
+        return entries
+
+    def resolved(self):
+        """Called as soon as a package line has been resolved (before its package is counted as found)."""
+
+    def found(self):
+        """Count a found package."""
+        self._packages += 1
+
+    def check(self):
+        """
+        Report the progress when the interval has passed, and stop when the token says so.
+
+        :raises: ParseCancelled
+        """
+        if self.token is not None:
+            status: str | None = self.token.status()
+            if status is not None:
+                raise ParseCancelled(status, self._lines)
+        if self.callback is not None and time.monotonic() >= self._next_report:
+            self.report()
+
+    def report(self):
+        """Report the progress now (e.g. once parsing has finished)."""
+        self._next_report = time.monotonic() + self.interval
+        if self.callback is not None:
+            self.callback(self.progress)
+
+
+@dataclass(frozen=True)
+class ParseResult:
+    """
+    The packages extracted by :func:`extract_monitored`; when parsing stopped early, only those found
+    until then.
+
+    status: COMPLETE, or CANCELLED or DEADLINE when parsing stopped early
+    """
+    packages: list[str]
+    status: str
+    progress: Progress
+
+    @property
+    def complete(self) -> bool:
+        return self.status == COMPLETE
+
+
+def extract_monitored(parser: OrgParser, source: Path | str | bytes | TextIO | BinaryIO | Iterable[str],
+                      monitor: ProgressMonitor) -> ParseResult:
+    """
+    Extract the packages matching the target of parser from a file (a Path) or an in-memory document (see
+    :func:`~orgparser.OrgParser.iter_packages_from`), reporting progress and stopping early when the token
+    of monitor is cancelled or its deadline passed.
+
+    :return: the packages, and whether all of them were found
+
+    :raises: OrgParserError
+    :raises: FileNotFoundError
+    """
+    packages: list[str] = list()
+    status: str = COMPLETE
+    iterator: Iterator = parser.iter_packages(source, monitor) if isinstance(source, Path) \
+        else parser.iter_packages_from(source, monitor)
+    try:
+        for _, package in iterator:
+            packages.append(package.name)
+    except ParseCancelled as e:
+        status = e.status
+    monitor.report()
+    return ParseResult(packages, status, monitor.progress)
+
+
+def format_progress(progress: Progress) -> str:
+    """'12345 lines, 1.2 MB (35%), 678 packages, 45.6 MB/s' (for --progress)."""
+    size: str = f"{progress.bytes / 1e6:.1f} MB"
+    if progress.fraction is not None:
+        size += f" ({progress.fraction:.0%})"
+    return f"{progress.lines} lines, {size}, {progress.packages} packages, {progress.throughput / 1e6:.1f} MB/s"
@@ -0,0 +1,148 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2022 Tobias Marczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Answer whether a single package would be installed for a target, and explain why (not).
+
+Classes:
+
+    Alternative
+    LineQuery
+
+Functions:
+
+    query_catalog
+    format_package
+
+Misc variables:
+
+    __author__
+    __version__
+"""
+
+from __future__ import annotations
+
+__author__ = "Tobias Marczewski"
+__version__ = "1.0.0"
+
+from dataclasses import dataclass
+
+from deborg.catalog import CatalogLine, PackageCatalog, Target
+from deborg.orgparser import DebPakInfo, DuplicatePackageError, OrgParser
+
+
+@dataclass(frozen=True)
+class Alternative:
+    """One alternative of a queried line: does it match the target, was it selected, and why."""
+    package: DebPakInfo
+    matches: bool
+    selected: bool
+    reason: str
+
+
+@dataclass(frozen=True)
+class LineQuery:
+    """
+    A line listing the queried package: the package selected from it for the target (if any), the
+    verdict on every alternative, and for lines with several equally specific matches the error.
+    """
+    name: str
+    nr: int
+    source: str | None
+    selected: DebPakInfo | None
+    alternatives: tuple[Alternative, ...]
+    error: str | None = None
+
+    @property
+    def installed(self) -> bool:
+        """Is the queried package the one selected from this line?"""
+        return self.selected is not None and self.selected.name == self.name
+
+
+def query_catalog(catalog: PackageCatalog, name: str, target: Target) -> list[LineQuery]:
+    """
+    Resolve only the lines of catalog that list package name, and explain the result of each.
+
+    The lines are found with the name index of the catalog, so a query takes time proportional to the
+    number of lines listing the package, not to the size of the catalog.
+
+    :return: one result per line listing the package (empty when no line lists it); the package is
+             installed for target when any of them is :attr:`~LineQuery.installed`.
+    """
+    parser: OrgParser = OrgParser(target.distro, target.release, target.tags, families=catalog.families)
+    return [_query_line(parser, name, line) for line in catalog.lines_with(name)]
+
+
+def format_package(package: DebPakInfo) -> str:
+    """Write a package the way it is specified in a file: 'name {distro:release:tags}'."""
+    tags: str = ",".join(package.tags) if package.tags is not None else ""
+    spec: str = ":".join([package.distro or "", package.release or "", tags]).rstrip(":")
+    return f"{package.name} {{{spec}}}" if spec else package.name
+
+
+def _query_line(parser: OrgParser, name: str, line: CatalogLine) -> LineQuery:
+    selected: DebPakInfo | None = None
+    error: str | None = None
+    try:
+        selected = parser.select(line.packages)
+    except DuplicatePackageError as e:
+        error = str(e)
+
+    alternatives: list[Alternative] = list()
+    n_matching: int = sum([1 for p in line.packages if parser.select([p]) is not None])
+    for package in line.packages:
+        mismatch: str | None = _mismatch(parser, package)
+        if mismatch is not None:
+            alternatives.append(Alternative(package, False, False, mismatch))
+        elif package == selected:
+            reason: str = "only matching alternative" if n_matching == 1 else \
+                f"most specific matching alternative ({_specificity(parser, package)})"
+            alternatives.append(Alternative(package, True, True, reason))
+        elif selected is not None:
+            alternatives.append(Alternative(package, True, False, f"less specific than {format_package(selected)}"))
+        else:
+            alternatives.append(Alternative(package, True, False, "as specific as another matching alternative"))
+    return LineQuery(name, line.nr, line.source, selected, tuple(alternatives), error)
+
+
+def _mismatch(parser: OrgParser, package: DebPakInfo) -> str | None:
+    """Why package does not match the target of parser, or None when it matches."""
+    if package.distro is not None and package.distro not in parser.families.lineage(parser.distro):
+        return f"distro {package.distro} is not {_lineage(parser)}"
+    if package.release is not None and package.release != parser.release:
+        return f"release {package.release} is not {parser.release}"
+    if package.tags is not None and parser.tags.isdisjoint(package.tags):
+        return f"none of the tags {','.join(package.tags)} is requested"
+    return None
+
+
+def _specificity(parser: OrgParser, package: DebPakInfo) -> str:
+    """The most specific part of the specification of a matching package, as used to narrow a line."""
+    if package.tags is not None and parser.tags:
+        return "tags " + ",".join([t for t in package.tags if t in parser.tags])
+    if package.release is not None:
+        return f"release {package.release}"
+    if package.distro == parser.distro:
+        return f"distro {package.distro}"
+    if package.distro is not None:
+        return f"distro {package.distro}, which {parser.distro} is based on"
+    return "no specification"
+
+
+def _lineage(parser: OrgParser) -> str:
+    lineage: tuple[str, ...] = parser.families.lineage(parser.distro)
+    return lineage[0] if len(lineage) == 1 else f"any of {', '.join(lineage)}"
@@ -0,0 +1,327 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# Copyright (C) 2022 Tobias Marczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+A package catalog stored in one flat buffer, that several processes can share without copying it.
+
+Classes:
+
+    SharedCatalog
+
+Functions:
+
+    pack_catalog
+
+Misc variables:
+
+    __author__
+    __version__
+"""
+
+from __future__ import annotations
+
+__author__ = "Tobias Marczewski"
+__version__ = "1.0.0"
+
+import mmap
+import struct
+import sys
+
+from collections.abc import Iterator
+from multiprocessing import shared_memory
+from pathlib import Path
+
+from deborg.catalog import CatalogLine, PackageCatalog, Target
+from deborg.families import DistroFamilies
+from deborg.inputfile import write_atomically
+from deborg.orgparser import DebPakInfo, OrgParser
+
+
+# Buffer layout (all integers are signed 32 bit in native byte order, -1 stands for None):
+#
+#   header      magic, byte order, version and the number of entries of every section
+#   lines       (nr, first package, number of packages, source string) per line
+#   packages    (name, distro, release, tags string) per package; tags are stored joined by ','
+#   families    (derived, parent string) per family table entry
+#   offsets     start of every string in the string data, plus the end of the last one
+#   strings     the sorted, distinct, utf-8 encoded strings
+_MAGIC: bytes = b"DEBORGCT"
+_VERSION: int = 1
+_HEADER: struct.Struct = struct.Struct("=8s8siiiiii")
+_INT: int = 4
+
+
+def pack_catalog(catalog: PackageCatalog) -> bytes:
+    """Serialise catalog into the flat buffer layout read by :class:`SharedCatalog`."""
+    strings: set[str] = set()
+    for line in catalog.lines:
+        if line.source is not None:
+            strings.add(line.source)
+        for package in line.packages:
+            strings.update([s for s in _package_strings(package) if s is not None])
+    for derived, parent in catalog.families.parents.items():
+        strings.update([derived, parent])
+    ordered: list[str] = sorted(strings)
+    ids: dict[str, int] = {s: i for i, s in enumerate(ordered)}
+
+    def _id(string: str | None) -> int:
+        return -1 if string is None else ids[string]
+
+    lines: list[int] = list()
+    packages: list[int] = list()
+    for line in catalog.lines:
+        lines += [line.nr, len(packages) // 4, len(line.packages), _id(line.source)]
+        for package in line.packages:
+            packages += [_id(s) for s in _package_strings(package)]
+    families: list[int] = list()
+    for derived, parent in catalog.families.parents.items():
+        families += [ids[derived], ids[parent]]
+
+    encoded: list[bytes] = [s.encode() for s in ordered]
+    offsets: list[int] = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+
+    header: bytes = _HEADER.pack(_MAGIC, sys.byteorder.encode().ljust(8), _VERSION,
+                                 len(lines) // 4, len(packages) // 4, len(families) // 2, len(ordered), 0)
+    return b"".join([header, _ints(lines), _ints(packages), _ints(families), _ints(offsets)] + encoded)
+
+
+class SharedCatalog:
+    """
+    A read-only package catalog backed by a flat, offset based buffer (see :func:`pack_catalog`).
+
+    The buffer can be placed in shared memory (:func:`~SharedCatalog.create` and :func:`~SharedCatalog.attach`)
+    or in a file that is memory mapped (:func:`~SharedCatalog.write` and :func:`~SharedCatalog.open`), so that
+    any number of worker processes resolve the same catalog from the same physical memory. Attaching only
+    maps the buffer and reads the header; no Python objects are created for lines or packages, except for
+    the alternatives of a line that match a target while it is resolved.
+
+    Resolving gives the same result as :func:`~catalog.PackageCatalog.resolve` for the packed catalog.
+    """
+
+    def __init__(self, buffer, owner=None):
+        """
+        :param buffer: a buffer holding a packed catalog (bytes, mmap, shared memory, ...)
+        :param owner: the object providing buffer, closed by :func:`~SharedCatalog.close`
+
+        :raises: ValueError, when buffer does not hold a packed catalog.
+        """
+        view: memoryview = memoryview(buffer).cast("B")
+        if len(view) < _HEADER.size:
+            raise ValueError("Buffer does not hold a packed catalog.")
+        magic, byteorder, version, n_lines, n_packages, n_families, n_strings, _ = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Buffer does not hold a packed catalog.")
+        if byteorder.strip() != sys.byteorder.encode():
+            raise ValueError(f"Catalog was packed on a {byteorder.strip().decode()} endian system.")
+
+        self._owner = owner
+        self._closed: bool = False
+        self._view: memoryview = view.toreadonly()
+        pos: int = _HEADER.size
+        self._n_lines: int = n_lines
+        self._lines: memoryview = self._view[pos:pos + 4 * n_lines * _INT].cast("i")
+        pos += 4 * n_lines * _INT
+        self._packages: memoryview = self._view[pos:pos + 4 * n_packages * _INT].cast("i")
+        pos += 4 * n_packages * _INT
+        family_ids: memoryview = self._view[pos:pos + 2 * n_families * _INT].cast("i")
+        pos += 2 * n_families * _INT
+        self._n_strings: int = n_strings
+        self._offsets: memoryview = self._view[pos:pos + (n_strings + 1) * _INT].cast("i")
+        pos += (n_strings + 1) * _INT
+        self._strings: memoryview = self._view[pos:]
+        self._families: DistroFamilies = DistroFamilies(
+            {self._string(family_ids[2 * i]): self._string(family_ids[2 * i + 1]) for i in range(n_families)})
+        family_ids.release()
+
+    @classmethod
+    def create(cls, catalog: PackageCatalog, name: str | None = None) -> SharedCatalog:
+        """
+        Pack catalog into a new block of shared memory; pass :attr:`name` to the worker processes.
+
+        The creating process owns the block and has to :func:`~SharedCatalog.unlink` it when it is no
+        longer needed.
+        """
+        data: bytes = pack_catalog(catalog)
+        memory: shared_memory.SharedMemory = shared_memory.SharedMemory(name=name, create=True, size=len(data))
+        memory.buf[:len(data)] = data
+        return cls(memory.buf[:len(data)], memory)
+
+    @classmethod
+    def attach(cls, name: str) -> SharedCatalog:
+        """
+        Attach to a catalog in shared memory created by :func:`~SharedCatalog.create` (in another process).
+
+        :raises: FileNotFoundError, when there is no block of shared memory called name.
+        """
+        return cls(*_attached_buffer(name))
+
+    @staticmethod
+    def write(catalog: PackageCatalog, file: Path):
+        """Pack catalog into file (atomically replacing it), so that it can be mapped by :func:`SharedCatalog.open`."""
+        write_atomically(file, pack_catalog(catalog))
+
+    @classmethod
+    def open(cls, file: Path) -> SharedCatalog:
+        """
+        Map a catalog file written by :func:`SharedCatalog.write` read-only into memory.
+
+        :raises: FileNotFoundError
+        :raises: ValueError
+        """
+        if not file.is_file():
+            raise FileNotFoundError(f"File {file} not found.")
+        with file.open(mode='rb') as _file:
+            mapped: mmap.mmap = mmap.mmap(_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped, mapped)
+
+    @property
+    def name(self) -> str | None:
+        """Name of the shared memory block holding the catalog, if any."""
+        return getattr(self._owner, "name", None)
+
+    @property
+    def families(self) -> DistroFamilies:
+        """The distro families used to resolve targets."""
+        return self._families
+
+    def __len__(self) -> int:
+        return self._n_lines
+
+    def __enter__(self) -> SharedCatalog:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Detach from the buffer; the catalog can not be used afterwards."""
+        if self._closed:
+            return
+        self._closed = True
+        for view in (self._lines, self._packages, self._offsets, self._strings, self._view):
+            view.release()
+        if self._owner is not None:
+            self._owner.close()
+
+    def unlink(self):
+        """Free the shared memory block (once, in the process that created it); attached processes keep it."""
+        if isinstance(self._owner, shared_memory.SharedMemory):
+            self._owner.unlink()
+
+    def resolve(self, target: Target) -> Iterator[tuple[int, DebPakInfo]]:
+        """
+        Select the matching package of every line for target.
+
+        :return: iterator over (line number, package) tuples
+
+        :raises: OrgParserError
+        """
+        parser: OrgParser = OrgParser(target.distro, target.release, target.tags, families=self._families)
+        # the target translated to string ids, so that alternatives can be filtered without decoding them
+        distros: set[int] = {self._find(d) for d in self._families.lineage(target.distro)}
+        release: int = self._find(target.release)
+        tags_match: dict[int, bool] = dict()
+        lines: memoryview = self._lines
+        packages: memoryview = self._packages
+
+        for i in range(0, 4 * self._n_lines, 4):
+            first: int = lines[i + 1]
+            matching: list[int] = list()
+            for p in range(4 * first, 4 * (first + lines[i + 2]), 4):
+                if packages[p + 1] >= 0 and packages[p + 1] not in distros:
+                    continue
+                if packages[p + 2] >= 0 and packages[p + 2] != release:
+                    continue
+                tags: int = packages[p + 3]
+                if tags >= 0:
+                    if tags not in tags_match:
+                        tags_match[tags] = not parser.tags.isdisjoint(self._string(tags).split(","))
+                    if not tags_match[tags]:
+                        continue
+                matching.append(p)
+            if not matching:
+                continue
+            nr: int = lines[i]
+            if len(matching) == 1:
+                yield nr, self._package(matching[0])
+                continue
+            source: int = lines[i + 3]
+            package = parser.resolve_line(nr, [self._package(p) for p in matching],
+                                          self._string(source) if source >= 0 else None)
+            if package:
+                yield nr, package
+
+    def to_catalog(self) -> PackageCatalog:
+        """Unpack the buffer into a :class:`~catalog.PackageCatalog`."""
+        lines: list[CatalogLine] = list()
+        for i in range(0, 4 * self._n_lines, 4):
+            first, n, source = self._lines[i + 1], self._lines[i + 2], self._lines[i + 3]
+            lines.append(CatalogLine(self._lines[i], tuple([self._package(4 * p) for p in range(first, first + n)]),
+                                     self._string(source) if source >= 0 else None))
+        return PackageCatalog(lines, self._families)
+
+    def _package(self, p: int) -> DebPakInfo:
+        """The package at position p of the packages section."""
+        packages: memoryview = self._packages
+        name, distro, release, tags = packages[p], packages[p + 1], packages[p + 2], packages[p + 3]
+        return DebPakInfo(self._string(name),
+                          self._string(distro) if distro >= 0 else None,
+                          self._string(release) if release >= 0 else None,
+                          tuple(self._string(tags).split(",")) if tags >= 0 else None)
+
+    def _string(self, i: int) -> str:
+        return str(self._strings[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+    def _find(self, string: str) -> int:
+        """Id of string (binary search in the sorted strings), or -2 when the catalog does not contain it."""
+        i: int = _bisect(self._n_strings, string, self._string)
+        return i if i < self._n_strings and self._string(i) == string else -2
+
+
+def _package_strings(package: DebPakInfo) -> tuple[str | None, ...]:
+    tags: str | None = ",".join(package.tags) if package.tags is not None else None
+    return package.name, package.distro, package.release, tags
+
+
+def _ints(values: list[int]) -> bytes:
+    return struct.pack(f"={len(values)}i", *values)
+
+
+def _bisect(n: int, string: str, key) -> int:
+    """Position of string in the sorted strings key(0) .. key(n - 1) (as bisect.bisect_left)."""
+    low, high = 0, n
+    while low < high:
+        middle: int = (low + high) // 2
+        if key(middle) < string:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def _attached_buffer(name: str) -> tuple[memoryview, shared_memory.SharedMemory]:
+    """Attach to a block of shared memory, without making this process responsible for removing it."""
+    try:
+        memory: shared_memory.SharedMemory = shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # before Python 3.13 the block is registered with the resource tracker; processes started by
+        # multiprocessing (or forked after the block was created) share the tracker of the creating process,
+        # for which registering the block again has no effect
+        memory = shared_memory.SharedMemory(name)
+    return memory.buf, memory
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+
+import pytest
+
+
+def _generated_lines(n: int) -> list[str]:
+    lines: list[str] = []
+    for i in range(n):
+        lines.append(f"* heading {i}\n")
+        lines.append(f"+ pak{i}, pak{i}-d{i % 3} {{distro{i % 3}}}, pak{i}-r {{distro{i % 3}:r{i % 5}}}, " +
+                     f"pak{i}-t {{distro{i % 3}:r{i % 5}:tag{i % 4}}} :: comment\n")
+        lines.append(f"- only{i} {{::tag{i % 4},tag{(i + 1) % 4}}}\n")
+    return lines
+
+
+@pytest.fixture
+def generated_lines() -> Callable[[int], list[str]]:
+    """Make n package lines using all kinds of specifications, that resolve unambiguously for any target."""
+    return _generated_lines
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import marshal
+from pathlib import Path
+
+import pytest
+
+from deborg.aptindex import DependencyClosure, PackageIndex
+
+
+PACKAGES_FILE: Path = Path(__file__).resolve().parent.joinpath("input/Packages")
+
+
+@pytest.fixture
+def index() -> PackageIndex:
+    return PackageIndex.from_packages_files([PACKAGES_FILE])
+
+
+class TestPackageIndex:
+    """Tests for the dependency closure computed from a 'Packages' index."""
+
+    def test_index_contains_all_stanzas(self, index):
+        assert len(index) == 8
+        assert "app" in index and "mail-transport-agent" not in index
+
+    def test_closure_of_package_without_dependencies(self, index):
+        assert index.closure(["standalone"]) == DependencyClosure(["standalone"], [])
+
+    def test_closure_follows_alternatives_and_virtual_packages(self, index):
+        closure: DependencyClosure = index.closure(["app"])
+        # libfoo1 is not in the index -> libfoo-alt1; mail-transport-agent -> postfix
+        assert closure.packages == ["app", "dpkg", "libc6", "libfoo-alt1", "postfix", "python3"]
+        assert closure.missing == ["libssl3", "python3-minimal"]
+
+    def test_closure_with_recommends(self, index):
+        assert "app-data" in index.closure(["app"], recommends=True).packages
+        assert "app-data" not in index.closure(["app"]).packages
+
+    def test_missing_requested_package(self, index):
+        closure: DependencyClosure = index.closure(["standalone", "not-there"])
+        assert closure.packages == ["standalone"]
+        assert closure.missing == ["not-there"]
+
+    def test_alternative_already_in_closure_is_preferred(self):
+        index = PackageIndex({"a": "b|c", "b": "", "c": ""}, {}, {})
+        assert index.closure(["c", "a"]).packages == ["c", "a"]
+
+    def test_cache_is_written_and_reused(self, tmp_path, index):
+        cache: Path = tmp_path.joinpath("index.marshal")
+        first: PackageIndex = PackageIndex.load([PACKAGES_FILE], cache)
+        assert cache.is_file()
+        # a cache hit must not touch the Packages file again
+        version, key, depends, recommends, provides = marshal.loads(cache.read_bytes())
+        depends["standalone"] = "marker"
+        cache.write_bytes(marshal.dumps((version, key, depends, recommends, provides)))
+        second: PackageIndex = PackageIndex.load([PACKAGES_FILE], cache)
+        assert first.closure(["standalone"]).packages == ["standalone"]
+        assert second.closure(["standalone"]).missing == ["marker"]
+
+    def test_stale_cache_is_rebuilt(self, tmp_path):
+        packages: Path = tmp_path.joinpath("Packages")
+        packages.write_text("Package: one\n")
+        cache: Path = tmp_path.joinpath("index.marshal")
+        assert len(PackageIndex.load([packages], cache)) == 1
+        packages.write_text("Package: one\n\nPackage: two\n")
+        assert len(PackageIndex.load([packages], cache)) == 2
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import dataclasses
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from deborg.catalog import PackageCatalog, Target
+from deborg.orgparser import OrgParser, OrgParserError
+
+
+TESTFILE: Path = Path(__file__).resolve().parent.joinpath("input/testfile_ex1.org")
+
+
+class TestPackageCatalog:
+    """Tests for the target independent catalog of parsed package lines."""
+
+    def test_catalog_contains_package_lines_only(self):
+        catalog = PackageCatalog.from_lines(["* heading\n", "+ pak-a, pak-b {distro}\n", "text\n", "- pak-c\n"])
+        assert len(catalog) == 2
+        assert [line.nr for line in catalog.lines] == [1, 3]
+        assert [p.name for p in catalog.lines[0].packages] == ["pak-a", "pak-b"]
+
+    @pytest.mark.parametrize("distro,release", [
+        ("distro", "any"), ("distroA", "release1"), ("distroA", "release2"),
+        ("distroB", "release1"), ("distroB", "release2")])
+    def test_resolve_matches_extract_deb_packages(self, distro, release):
+        catalog = PackageCatalog.from_file(TESTFILE)
+        resolved: list[str] = [p.name for _, p in catalog.resolve(Target(distro, release))]
+        assert resolved == OrgParser.extract_deb_packages(TESTFILE, distro, release)
+
+    def test_resolve_reports_line_of_ambiguous_package(self):
+        catalog = PackageCatalog.from_lines(["# comment\n", "+ pak-a, pak-b\n"])
+        with pytest.raises(OrgParserError, match="Error in line 1"):
+            list(catalog.resolve(Target("distro", "release")))
+
+    def test_missing_file_raises_error(self):
+        with pytest.raises(FileNotFoundError):
+            PackageCatalog.from_file(Path("/not/existing/file.org"))
+
+
+class TestCatalogConcurrency:
+    """Resolving one shared catalog from many threads at the same time."""
+
+    N_THREADS: int = 8
+
+    def test_catalog_is_immutable(self):
+        catalog = PackageCatalog.from_lines(["+ pak {distro::tag1,tag2}\n"])
+        package = catalog.lines[0].packages[0]
+        assert package.tags == ("tag1", "tag2")
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            package.name = "other"
+        with pytest.raises(AttributeError):
+            catalog.extra = "not allowed"
+
+    def test_concurrent_resolution_gives_identical_results(self, generated_lines):
+        catalog = PackageCatalog.from_lines(generated_lines(300))
+        targets: list[Target] = [Target(f"distro{d}", f"r{r}", tuple([f"tag{t}" for t in range(tags)]))
+                                 for d in range(4) for r in range(6) for tags in range(3)]
+        expected: dict[Target, list] = {t: list(catalog.resolve(t)) for t in targets}
+        start = threading.Barrier(self.N_THREADS)
+
+        def resolve_all(offset: int) -> dict[Target, list]:
+            start.wait()
+            # every thread walks the targets in a different order
+            order: list[Target] = targets[offset:] + targets[:offset]
+            return {t: list(catalog.resolve(t)) for t in order * 3}
+
+        with ThreadPoolExecutor(max_workers=self.N_THREADS) as pool:
+            results = list(pool.map(resolve_all, range(self.N_THREADS)))
+        assert all([result == expected for result in results])
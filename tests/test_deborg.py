@@ -4,6 +4,9 @@ Tests for the command line utility deborg accessed via deborg.__main__.py.
 
 from __future__ import annotations
 
+import gzip
+import io
+
 from pytest_console_scripts import RunResult
 
 from deborg.cli import Examples
@@ -77,3 +80,225 @@ def test_example_file_examples(tmpdir, script_runner):
         result: RunResult = script_runner.run(*command)
         assert result.returncode == 0
         assert result.stdout.strip() == tests.output[i].strip()
+
+
+def test_nul_output_format(script_runner):
+    result = script_runner.run(
+        'deborg', 'tests/input/testfile_ex1.org',
+        'distroA', 'release0', '--format=nul')
+    assert result.success
+    assert result.stdout.endswith("\0")
+    assert result.stdout.split("\0")[:3] == ["package", "package2", "package-with-hyphens"]
+
+
+def test_batched_output(script_runner):
+    result = script_runner.run(
+        'deborg', 'tests/input/testfile_ex1.org',
+        'distroA', 'release0', '--batch-size=4')
+    assert result.success
+    batches: list[str] = result.stdout.splitlines()
+    assert len(batches) == 3
+    assert all([len(b.split(" ")) <= 4 for b in batches])
+
+
+def test_invalid_batch_size_is_rejected(script_runner):
+    result = script_runner.run(
+        'deborg', 'tests/input/testfile_ex1.org',
+        'distroA', 'release0', '--batch-size=0')
+    assert result.returncode == 2
+
+
+def test_diff_targets(script_runner):
+    result = script_runner.run(
+        'deborg', 'diff', 'tests/input/testfile_ex1.org',
+        'distroA', 'release1', '--to', 'distroA', 'release2')
+    assert result.success
+    assert result.stdout.splitlines() == [
+        "- package-distA7 (line 48)",
+        "- package-distA8 (line 51)",
+        "~ package-distA9 -> package-distB9 (line 54 -> 54)",
+        "- package-distA10 (line 57)",
+        "~ package-distA12 -> package-distB12 (line 63 -> 63)",
+    ]
+
+
+def test_diff_against_old_version_on_stdin(script_runner):
+    with open('tests/input/testfile_ex1.org') as orgfile:
+        old_content: str = orgfile.read().replace("+ packageX ", "+ packageY ")
+    result = script_runner.run(
+        'deborg', 'diff', 'tests/input/testfile_ex1.org',
+        'distroA', 'release1', '--old', '-', stdin=io.StringIO(old_content))
+    assert result.success
+    assert result.stdout.splitlines() == ["- packageY (line 21)", "+ packageX (line 21)"]
+
+
+def test_dependency_closure(tmpdir, script_runner):
+    orgfile = tmpdir.join("testfile.org")
+    orgfile.write("+ standalone\n+ python3\n")
+    result = script_runner.run(
+        'deborg', str(orgfile), 'distro', 'release',
+        '--closure=tests/input/Packages', f"--index-cache={tmpdir.join('cache')}")
+    assert result.success
+    assert result.stdout == "standalone python3 libc6"
+    assert result.stderr.strip() == "Warning: not found in the package index: python3-minimal"
+
+
+def test_examples_do_not_share_state():
+    assert Examples().n == Examples().n
+    assert Examples().input is not Examples().input
+
+
+def test_compressed_orgfile(tmpdir, script_runner):
+    orgfile = tmpdir.join("testfile.org.gz")
+    with open("tests/input/testfile_ex1.org", mode='rb') as plain:
+        orgfile.write_binary(gzip.compress(plain.read()))
+    result = script_runner.run('deborg', str(orgfile), 'distroA', 'release0')
+    expected = script_runner.run('deborg', 'tests/input/testfile_ex1.org', 'distroA', 'release0')
+    assert result.success
+    assert result.stdout == expected.stdout
+
+
+def test_distro_families(tmpdir, script_runner):
+    families = tmpdir.join("families")
+    families.write("# derived parent\nUbuntu Debian\nMint Ubuntu\n")
+    orgfile = tmpdir.join("testfile.org")
+    orgfile.write("+ pak, pak-debian {Debian}\n+ other, other-ubuntu {Ubuntu}\n")
+    result = script_runner.run('deborg', str(orgfile), 'Mint', '21', f"--families={families}")
+    assert result.success
+    assert result.stdout == "pak-debian other-ubuntu"
+
+
+def test_query(script_runner):
+    result = script_runner.run(
+        'deborg', 'query', 'tests/input/testfile_ex1.org', 'package2', 'distroA', 'release0')
+    assert result.success
+    assert result.stdout == ("package2: installed for distroA release0\n"
+                             "  line 11: selects package2\n"
+                             "    * package2: only matching alternative\n")
+    result = script_runner.run(
+        'deborg', 'query', 'tests/input/testfile_ex1.org', 'not-a-package', 'distroA', 'release0')
+    assert result.returncode == 3
+    assert "no line lists not-a-package" in result.stdout
+
+
+def test_orgfile_from_stdin(script_runner):
+    with open("tests/input/testfile_ex1.org", mode='rb') as plain:
+        result = script_runner.run('deborg', '-', 'distroA', 'release0', stdin=io.BytesIO(gzip.compress(plain.read())))
+    expected = script_runner.run('deborg', 'tests/input/testfile_ex1.org', 'distroA', 'release0')
+    assert result.success
+    assert result.stdout == expected.stdout
+
+
+def test_fingerprint(tmpdir, script_runner):
+    orgfile = tmpdir.join("testfile.org")
+    orgfile.write("+ pak-b\n+ pak-a\n")
+    result = script_runner.run('deborg', str(orgfile), 'distroA', 'release0', '--fingerprint')
+    assert result.success
+    assert result.stdout.startswith("sha256:")
+    orgfile.write("+ pak-a\n+ pak-b\n+ pak-a\n")
+    assert script_runner.run('deborg', str(orgfile), 'distroA', 'release0', '--fingerprint').stdout == result.stdout
+
+
+def test_if_changed(tmpdir, script_runner):
+    orgfile = tmpdir.join("testfile.org")
+    orgfile.write("+ pak-a\n")
+    state = f"--if-changed={tmpdir.join('state.json')}"
+    result = script_runner.run('deborg', str(orgfile), 'distroA', 'release0', state)
+    assert result.success
+    assert result.stdout == "pak-a"
+    result = script_runner.run('deborg', str(orgfile), 'distroA', 'release0', state)
+    assert result.returncode == 4
+    assert result.stdout == ""
+    # a different target has to be resolved again
+    assert script_runner.run('deborg', str(orgfile), 'distroB', 'release0', state).stdout == "pak-a"
+    orgfile.write("+ pak-a\n+ pak-b\n")
+    result = script_runner.run('deborg', str(orgfile), 'distroB', 'release0', state)
+    assert result.success
+    assert result.stdout == "pak-a pak-b"
+
+
+def test_if_changed_other_orgfile(tmpdir, script_runner):
+    tmpdir.join("a.org").write("+ pak-a\n")
+    tmpdir.join("b.org").write("+ pak-b\n")
+    state = f"--if-changed={tmpdir.join('state.json')}"
+    assert script_runner.run('deborg', str(tmpdir.join("a.org")), 'distroA', 'release0', state).stdout == "pak-a"
+    # the same state file for another orgfile is not 'unchanged'
+    result = script_runner.run('deborg', str(tmpdir.join("b.org")), 'distroA', 'release0', state)
+    assert result.success
+    assert result.stdout == "pak-b"
+
+
+def test_progress_and_timeout(script_runner):
+    result = script_runner.run('deborg', 'tests/input/testfile_ex1.org', 'distroA', 'release0', '--progress')
+    expected = script_runner.run('deborg', 'tests/input/testfile_ex1.org', 'distroA', 'release0')
+    assert result.success
+    assert result.stdout == expected.stdout
+    assert result.stderr.startswith("deborg: ") and " packages, " in result.stderr
+    result = script_runner.run('deborg', 'tests/input/testfile_ex1.org', 'distroA', 'release0', '--timeout=0')
+    assert result.returncode == 5
+    assert result.stdout == ""
+    assert result.stderr == "Warning: Parsing stopped at the deadline after 0 lines. The output is incomplete.\n"
+
+
+def test_collect_conflicts(tmpdir, script_runner):
+    orgfile = tmpdir.join("testfile.org")
+    orgfile.write("- a, b\n- c\n- d {\n")
+    result = script_runner.run('deborg', str(orgfile), 'distroA', 'release0', '--conflicts=collect')
+    assert result.returncode == 1
+    assert result.stdout == "c"
+    assert result.stderr.splitlines()[1:] == [
+        "Error in line 0: More than two packages match the specifications: a, b.",
+        "Error in line 2: Missing '}' for '{' in: d {"]
+    result = script_runner.run('deborg', str(orgfile), 'distroA', 'release0', '--conflicts=first')
+    assert result.returncode == 1
+    orgfile.write("- a, b\n- c\n")
+    result = script_runner.run('deborg', str(orgfile), 'distroA', 'release0', '--conflicts=first')
+    assert result.success
+    assert result.stdout == "a c"
+
+
+def test_duplicates(tmpdir, script_runner):
+    orgfile = tmpdir.join("testfile.org")
+    orgfile.write("* A\n- git\n- vim\n* B\n- git\n")
+    result = script_runner.run('deborg', str(orgfile), 'distroA', 'release0', '--report-duplicates')
+    assert result.success
+    assert result.stdout == "git vim"
+    assert result.stderr == "Duplicate: git (line 1, line 4)\n"
+    result = script_runner.run('deborg', str(orgfile), 'distroA', 'release0', '--keep-duplicates',
+                               '--report-duplicates')
+    assert result.stdout == "git vim git"
+    assert result.stderr == "Duplicate: git (line 1, line 4)\n"
+
+
+def test_profile(tmpdir, script_runner):
+    trace = tmpdir.join("trace.json")
+    result = script_runner.run('deborg', 'tests/input/testfile_ex1.org', 'distroA', 'release0',
+                               f"--profile={trace}", '--slowest=2')
+    expected = script_runner.run('deborg', 'tests/input/testfile_ex1.org', 'distroA', 'release0')
+    assert result.success
+    assert result.stdout == expected.stdout
+    assert result.stderr.startswith("Slowest of ")
+    assert len(result.stderr.splitlines()) == 3
+    assert "traceEvents" in trace.read()
+
+
+def test_missing_closure_index_is_reported(tmpdir, script_runner):
+    missing = tmpdir.join("Packages")
+    for extra in [[], [f"--if-changed={tmpdir.join('state.json')}"]]:
+        result = script_runner.run('deborg', 'tests/input/testfile_ex1.org', 'distroA', 'release0',
+                                   f"--closure={missing}", *extra)
+        assert result.returncode == 1
+        assert "not found" in result.stdout
+        assert "Traceback" not in result.stderr
+
+
+def test_if_changed_records_conflict_policy(tmpdir, script_runner):
+    orgfile = tmpdir.join("testfile.org")
+    orgfile.write("- a\n- c {distroA:r:t1}, d {distroA:r:t1,t2}\n")
+    state = f"--if-changed={tmpdir.join('state.json')}"
+    result = script_runner.run('deborg', str(orgfile), 'distroA', 'r', '-t', 't1,t2', '--conflicts=first', state)
+    assert result.stdout == "a c"
+    result = script_runner.run('deborg', str(orgfile), 'distroA', 'r', '-t', 't1,t2', '--conflicts=most-specific',
+                               state)
+    assert result.success
+    assert result.stdout == "a d"
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from deborg.catalog import PackageCatalog, Target
+from deborg.diff import ADDED, CHANGED, REMOVED, PackageChange, diff_catalogs
+
+
+LINES: list[str] = [
+    "* packages\n",
+    "+ common\n",
+    "+ pak-old {Debian:11}, pak-new {Debian:12}\n",
+    "+ only-eleven {Debian:11}\n",
+    "+ only-twelve {Debian:12}\n",
+    "+ server-pak {::server}\n",
+]
+
+
+class TestDiff:
+    """Tests for comparing resolved package lists."""
+
+    def test_diff_two_targets(self):
+        catalog = PackageCatalog.from_lines(LINES)
+        changes = diff_catalogs(catalog, Target("Debian", "11"), catalog, Target("Debian", "12"))
+        assert changes == [
+            PackageChange(CHANGED, old="pak-old", new="pak-new", old_line=2, new_line=2),
+            PackageChange(REMOVED, old="only-eleven", old_line=3),
+            PackageChange(ADDED, new="only-twelve", new_line=4),
+        ]
+
+    def test_diff_same_target_is_empty(self):
+        catalog = PackageCatalog.from_lines(LINES)
+        assert diff_catalogs(catalog, Target("Debian", "12"), catalog, Target("Debian", "12")) == []
+
+    def test_diff_tags(self):
+        catalog = PackageCatalog.from_lines(LINES)
+        changes = diff_catalogs(catalog, Target("Debian", "12"), catalog, Target("Debian", "12", ("server",)))
+        assert changes == [PackageChange(ADDED, new="server-pak", new_line=5)]
+
+    def test_diff_file_versions_matches_moved_lines(self):
+        old = PackageCatalog.from_lines(LINES)
+        new_lines: list[str] = ["+ inserted\n"] + LINES[:3] + ["+ replacement\n"] + LINES[4:]
+        new = PackageCatalog.from_lines(new_lines)
+        changes = diff_catalogs(old, Target("Debian", "11"), new, Target("Debian", "11"))
+        assert changes == [
+            PackageChange(REMOVED, old="only-eleven", old_line=3),
+            PackageChange(ADDED, new="inserted", new_line=0),
+            PackageChange(ADDED, new="replacement", new_line=4),
+        ]
+
+    def test_diff_compares_resolved_names(self):
+        # nano is the only package missing for Debian 12; vim and git only come from other lines
+        catalog = PackageCatalog.from_lines([
+            "+ vim {Debian:11}\n",
+            "+ vim {Debian:12}, nano {Debian:11}\n",
+            "+ git\n",
+            "+ git {Debian:12}\n",
+        ])
+        changes = diff_catalogs(catalog, Target("Debian", "11"), catalog, Target("Debian", "12"))
+        assert changes == [PackageChange(REMOVED, old="nano", old_line=1)]
+
+    def test_diff_reports_source_of_included_lines(self, tmp_path):
+        tmp_path.joinpath("host.org").write_text('- common\n#+INCLUDE: "extra.org"\n')
+        tmp_path.joinpath("extra.org").write_text("- only-twelve {Debian:12}\n")
+        catalog = PackageCatalog.from_file(tmp_path.joinpath("host.org"))
+        changes = diff_catalogs(catalog, Target("Debian", "11"), catalog, Target("Debian", "12"))
+        source: str = f"{tmp_path.joinpath('extra.org').as_posix()} " \
+                      f"(included from {tmp_path.joinpath('host.org').as_posix()} line 1)"
+        assert changes == [PackageChange(ADDED, new="only-twelve", new_line=0, new_source=source)]
+        assert str(changes[0]) == f"+ only-twelve (line 0 of {source})"
+
+    def test_change_str(self):
+        assert str(PackageChange(ADDED, new="pak", new_line=3)) == "+ pak (line 3)"
+        assert str(PackageChange(REMOVED, old="pak", old_line=3)) == "- pak (line 3)"
+        assert str(PackageChange(CHANGED, "a", "b", 1, 2)) == "~ a -> b (line 1 -> 2)"
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from deborg.catalog import PackageCatalog, Target
+from deborg.families import DistroFamilies
+from deborg.orgparser import MalformedLineError, OrgParser
+
+
+FAMILIES = DistroFamilies({"Ubuntu": "Debian", "Mint": "Ubuntu", "Raspbian": "Debian"})
+
+
+class TestDistroFamilies:
+    """The family table and the per-target precedence compiled from it."""
+
+    def test_lineage(self):
+        assert FAMILIES.lineage("Mint") == ("Mint", "Ubuntu", "Debian")
+        assert FAMILIES.lineage("Fedora") == ("Fedora",)
+
+    def test_precedence(self):
+        assert FAMILIES.precedence("Mint") == {"Mint": 0, "Ubuntu": 1, "Debian": 2}
+
+    def test_cycle_raises_error(self):
+        with pytest.raises(ValueError, match="cycle"):
+            DistroFamilies({"A": "B", "B": "A"})
+
+    def test_conflicting_parent_raises_error(self):
+        with pytest.raises(ValueError, match="already based on"):
+            FAMILIES.with_parent("Ubuntu", "Fedora")
+
+    def test_from_lines(self):
+        families = DistroFamilies.from_lines(["# derivatives\n", "Ubuntu Debian\n", "\n", "Mint Ubuntu  # LM\n"])
+        assert families.parents == {"Ubuntu": "Debian", "Mint": "Ubuntu"}
+
+    def test_from_lines_malformed(self):
+        with pytest.raises(ValueError, match="Error in line 1"):
+            DistroFamilies.from_lines(["Ubuntu Debian\n", "Mint\n"])
+
+
+class TestFamilyResolution:
+    """Alternatives for parent distros match derived targets, with lower specificity than exact matches."""
+
+    @pytest.mark.parametrize("distro,expected", [
+        ("Debian", "pak-debian"), ("Ubuntu", "pak-ubuntu"), ("Mint", "pak-ubuntu"),
+        ("Raspbian", "pak-debian"), ("Fedora", "pak")])
+    def test_closest_distro_wins(self, distro, expected):
+        parser = OrgParser(distro, "any", families=FAMILIES)
+        packages = parser.parse_line("- pak, pak-debian {Debian}, pak-ubuntu {Ubuntu}\n")
+        assert parser.select(packages).name == expected
+
+    def test_without_families_distro_must_match_exactly(self):
+        parser = OrgParser("Mint", "any")
+        packages = parser.parse_line("- pak, pak-debian {Debian}\n")
+        assert parser.select(packages).name == "pak"
+
+    def test_parent_distro_with_release(self):
+        parser = OrgParser("Raspbian", "12", families=FAMILIES)
+        assert parser.select(parser.parse_line("- pak {Debian:11}, pak12 {Debian:12}\n")).name == "pak12"
+
+    def test_parent_with_release_beats_exact_distro(self):
+        # the family rank only decides between alternatives that are otherwise equally specific
+        parser = OrgParser("Raspbian", "12", families=FAMILIES)
+        assert parser.select(parser.parse_line("- pak {Debian:12}, pak-r {Raspbian}\n")).name == "pak"
+        assert parser.select(parser.parse_line("- pak {Debian:12}, pak-r {Raspbian:12}\n")).name == "pak-r"
+
+    @pytest.mark.parametrize("line", [
+        "- pkg-x {Debian::server}, pkg-y {Ubuntu}\n", "- pkg-x {::server}, pkg-y {Ubuntu}\n"])
+    def test_more_specific_parent_alternative_wins(self, line):
+        parser = OrgParser("Ubuntu", "any", ["server"], families=FAMILIES)
+        assert parser.select(parser.parse_line(line)).name == "pkg-x"
+
+    def test_keywords_in_file(self, tmp_path):
+        file: Path = tmp_path.joinpath("packages.org")
+        file.write_text("#+DEBORG_FAMILY: Ubuntu Debian\n#+deborg_family: Mint Ubuntu\n"
+                        "* Packages\n- pak, pak-debian {Debian}\n")
+        for includes in (True, False):
+            parser = OrgParser("Mint", "21", includes=includes)
+            assert parser.extract(file) == ["pak-debian"]
+        catalog = PackageCatalog.from_file(file)
+        assert catalog.families == DistroFamilies({"Ubuntu": "Debian", "Mint": "Ubuntu"})
+        assert [p.name for _, p in catalog.resolve(Target("Mint", "21"))] == ["pak-debian"]
+
+    def test_keywords_from_included_file(self, tmp_path):
+        tmp_path.joinpath("families.org").write_text("#+DEBORG_FAMILY: Ubuntu Debian\n")
+        file: Path = tmp_path.joinpath("packages.org")
+        file.write_text('#+INCLUDE: "families.org"\n- pak, pak-debian {Debian}\n')
+        assert OrgParser.extract_deb_packages(file, "Ubuntu", "22.04") == ["pak-debian"]
+
+    def test_keyword_after_package_line_raises_error(self, tmp_path):
+        file: Path = tmp_path.joinpath("packages.org")
+        file.write_text("- pak\n#+DEBORG_FAMILY: Ubuntu Debian\n")
+        with pytest.raises(MalformedLineError, match="Error in line 1: .* before the first package line"):
+            OrgParser("Ubuntu", "22.04").extract(file)
+
+    def test_malformed_keyword_raises_error(self):
+        with pytest.raises(MalformedLineError, match="Error in line 0"):
+            PackageCatalog.from_lines(["#+DEBORG_FAMILY: Ubuntu\n"])
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import os
+
+from pathlib import Path
+
+from deborg.catalog import Target
+from deborg.fingerprint import RunState, file_stamps, fingerprint
+
+
+TARGET = Target("distroA", "release0", ("server", "desktop"))
+
+
+class TestFingerprint:
+    """Fingerprints only depend on the set of packages and the target."""
+
+    def test_independent_of_order_and_duplicates(self):
+        assert fingerprint(["b", "a", "b"], TARGET) == fingerprint(["a", "b"], TARGET)
+        assert fingerprint(["a"], TARGET) == fingerprint(["a"], Target("distroA", "release0", ("desktop", "server")))
+
+    def test_depends_on_packages_and_target(self):
+        assert fingerprint(["a"], TARGET) != fingerprint(["a", "b"], TARGET)
+        assert fingerprint(["a"], TARGET) != fingerprint(["a"], Target("distroA", "release1", TARGET.tags))
+
+    def test_stable(self):
+        # the hash of the canonical form must not change between versions, or all saved states go stale
+        assert fingerprint(["a"], Target("d", "r")) == \
+            "sha256:32b9fe1b495c3aff085834567794291b4d6271f18e907e57661bdfe472d0d23c"
+
+
+class TestRunState:
+    """The state of a run is saved and compared without parsing the recorded files again."""
+
+    def test_round_trip(self, tmp_path: Path):
+        orgfile = tmp_path.joinpath("a.org")
+        orgfile.write_text("+ a\n")
+        state = RunState({"distro": "distroA"}, file_stamps([orgfile]), fingerprint(["a"], TARGET))
+        state.save(tmp_path.joinpath("state.json"))
+        assert RunState.load(tmp_path.joinpath("state.json")) == state
+        assert sorted([f.name for f in tmp_path.iterdir()]) == ["a.org", "state.json"]
+
+    def test_missing_or_corrupt_state(self, tmp_path: Path):
+        assert RunState.load(tmp_path.joinpath("missing.json")) is None
+        tmp_path.joinpath("corrupt.json").write_text("{")
+        assert RunState.load(tmp_path.joinpath("corrupt.json")) is None
+
+    def test_is_current(self, tmp_path: Path):
+        orgfile = tmp_path.joinpath("a.org")
+        orgfile.write_text("+ a\n")
+        state = RunState({"distro": "distroA"}, file_stamps([orgfile]), "")
+        assert state.is_current({"distro": "distroA"})
+        assert not state.is_current({"distro": "distroB"})
+        other = tmp_path.joinpath("b.org")
+        other.write_text("+ b\n")
+        assert state.is_current({"distro": "distroA"}, file_stamps([orgfile]))
+        assert not state.is_current({"distro": "distroA"}, file_stamps([other]))
+        stat = orgfile.stat()
+        os.utime(orgfile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        assert not state.is_current({"distro": "distroA"})
+        orgfile.unlink()
+        assert not state.is_current({"distro": "distroA"})
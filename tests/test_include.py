@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import itertools
+import os
+import signal
+import time
+
+from pathlib import Path
+
+import pytest
+
+from deborg.catalog import IncludeGraph, PackageCatalog, Target
+from deborg.orgparser import IncludeError, MalformedLineError, OrgParser, OrgParserError
+
+
+@pytest.fixture
+def org_tree(tmp_path) -> Path:
+    """A top-level file including two fragments, which both include the same common fragment."""
+    tmp_path.joinpath("frags").mkdir()
+    tmp_path.joinpath("host.org").write_text(
+        "* Host\n"
+        "- htop\n"
+        '#+INCLUDE: "frags/desktop.org"\n'
+        "#+include: frags/server.org :minlevel 2\n"
+        "- vim\n")
+    tmp_path.joinpath("frags", "desktop.org").write_text(
+        '#+INCLUDE: "common.org"\n'
+        "- firefox, firefox-esr {debian}\n")
+    tmp_path.joinpath("frags", "server.org").write_text(
+        "- nginx\n"
+        '#+INCLUDE: "common.org"\n')
+    tmp_path.joinpath("frags", "common.org").write_text(
+        "* Common\n"
+        "- git\n")
+    return tmp_path
+
+
+class TestIncludes:
+    """Following '#+INCLUDE:' directives."""
+
+    def test_included_lines_replace_directive(self, org_tree):
+        packages = OrgParser("debian", "bookworm", unique=False).extract(org_tree.joinpath("host.org"))
+        assert packages == ["htop", "git", "firefox-esr", "nginx", "git", "vim"]
+        # by default a package is only extracted once, even when listed by several files
+        packages = OrgParser.extract_deb_packages(org_tree.joinpath("host.org"), "debian", "bookworm")
+        assert packages == ["htop", "git", "firefox-esr", "nginx", "vim"]
+
+    def test_lines_report_source(self, org_tree):
+        graph = IncludeGraph()
+        lines = list(graph.iter_lines(org_tree.joinpath("host.org"), OrgParser()))
+        assert [(line.nr, line.source is None) for line in lines] == [
+            (1, True), (1, False), (1, False), (0, False), (1, False), (4, True)]
+        assert lines[1].source.endswith(
+            "common.org (included from " + org_tree.joinpath("frags/desktop.org").as_posix() +
+            " line 0, " + org_tree.joinpath("host.org").as_posix() + " line 2)")
+
+    def test_includes_can_be_disabled(self, org_tree):
+        parser = OrgParser("debian", "bookworm", includes=False)
+        assert [p.name for _, p in parser.iter_packages(org_tree.joinpath("host.org"))] == ["htop", "vim"]
+
+    def test_includes_with_block_type_are_not_followed(self, tmp_path):
+        tmp_path.joinpath("host.org").write_text(
+            '#+INCLUDE: "script.sh" src sh\n'
+            "#+include: notes.org example\n"
+            '#+INCLUDE: "export.html" export html\n'
+            '#+INCLUDE: "frag.org" :minlevel 1\n'
+            "- vim\n")
+        tmp_path.joinpath("script.sh").write_text("- not-a-package\n")
+        tmp_path.joinpath("frag.org").write_text("- git\n")
+        packages = OrgParser("debian", "bookworm").extract(tmp_path.joinpath("host.org"))
+        assert packages == ["git", "vim"]
+
+    def test_catalog_from_lines_ignores_includes(self):
+        catalog = PackageCatalog.from_lines(['#+INCLUDE: "other.org"\n', "- pak\n"])
+        assert [line.nr for line in catalog.lines] == [1]
+
+    def test_shared_fragment_parsed_once(self, org_tree):
+        graph = IncludeGraph()
+        list(graph.iter_lines(org_tree.joinpath("host.org"), OrgParser()))
+        list(graph.iter_lines(org_tree.joinpath("frags/server.org"), OrgParser()))
+        # desktop, server and common; top-level files are read line by line and not cached,
+        # and common is not parsed again
+        assert len(graph) == 3
+
+    def test_cache_keeps_recently_used_files(self, org_tree):
+        graph = IncludeGraph(max_files=2)
+        list(graph.iter_lines(org_tree.joinpath("host.org"), OrgParser()))
+        assert len(graph) == 2
+        assert [f.name for f in graph.files(org_tree.joinpath("host.org"), OrgParser())] == \
+            ["host.org", "desktop.org", "server.org", "common.org"]
+        with pytest.raises(ValueError):
+            IncludeGraph(max_files=0)
+
+    def test_top_level_lines_are_streamed(self, org_tree):
+        lines = IncludeGraph().iter_lines(org_tree.joinpath("host.org"), OrgParser())
+        assert next(lines).packages[0].name == "htop"
+        # an error after the first line only shows once the parse gets there
+        org_tree.joinpath("host.org").write_text("- htop\n- broken {debian\n")
+        lines = IncludeGraph().iter_lines(org_tree.joinpath("host.org"), OrgParser())
+        assert next(lines).packages[0].name == "htop"
+        with pytest.raises(MalformedLineError):
+            next(lines)
+
+    def test_top_level_includes_are_parsed_ahead(self, tmp_path):
+        tmp_path.joinpath("host.org").write_text(
+            "- htop\n" + "".join([f'#+INCLUDE: "frag{i}.org"\n' for i in range(4)]) + "- broken {debian\n")
+        for i in range(4):
+            tmp_path.joinpath(f"frag{i}.org").write_text(f"- pak{i}\n")
+        graph = IncludeGraph()
+        lines = graph.iter_lines(tmp_path.joinpath("host.org"), OrgParser())
+        assert next(lines).packages[0].name == "htop"
+        assert len(graph) == 0
+        # at the first include, the parse of all sibling fragments has been started
+        assert next(lines).packages[0].name == "pak0"
+        assert len(graph) == 4
+        assert [line.packages[0].name for line in itertools.islice(lines, 3)] == ["pak1", "pak2", "pak3"]
+        # the malformed line read ahead is only reported once the lines before it have been passed on
+        with pytest.raises(MalformedLineError):
+            next(lines)
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+    def test_forked_child_parses_includes(self, org_tree):
+        graph = IncludeGraph()
+        # start the worker threads in the parent
+        list(graph.iter_lines(org_tree.joinpath("frags/server.org"), OrgParser()))
+        pid: int = os.fork()
+        if pid == 0:
+            try:
+                lines = list(graph.iter_lines(org_tree.joinpath("host.org"), OrgParser()))
+                os._exit(0 if len(lines) == 6 else 1)
+            finally:
+                os._exit(2)
+        for _ in range(200):
+            finished, status = os.waitpid(pid, os.WNOHANG)
+            if finished:
+                assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+                return
+            time.sleep(0.05)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        pytest.fail("the forked child did not finish")
+
+    def test_files_lists_every_file_once(self, org_tree):
+        files = IncludeGraph().files(org_tree.joinpath("host.org"), OrgParser())
+        assert [f.name for f in files] == ["host.org", "desktop.org", "server.org", "common.org"]
+
+    def test_changed_file_is_parsed_again(self, org_tree):
+        graph = IncludeGraph()
+        common: Path = org_tree.joinpath("frags/common.org")
+        assert len(list(graph.iter_lines(org_tree.joinpath("frags/server.org"), OrgParser()))) == 2
+        stat = common.stat()
+        common.write_text("- git\n- tig\n")
+        os.utime(common, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert len(list(graph.iter_lines(org_tree.joinpath("frags/server.org"), OrgParser()))) == 3
+
+    def test_include_cycle_raises_error(self, org_tree):
+        org_tree.joinpath("frags", "common.org").write_text('- git\n#+INCLUDE: "../host.org"\n')
+        with pytest.raises(IncludeError, match="Error in line 1 of .*common.org .*host.org includes itself"):
+            PackageCatalog.from_file(org_tree.joinpath("host.org"))
+
+    def test_missing_include_raises_error(self, org_tree):
+        org_tree.joinpath("frags", "common.org").unlink()
+        with pytest.raises(IncludeError, match="line 0 of .*desktop.org .*common.org not found"):
+            PackageCatalog.from_file(org_tree.joinpath("host.org"))
+
+    def test_malformed_line_reports_chain(self, org_tree):
+        org_tree.joinpath("frags", "common.org").write_text("- git\n- broken {debian\n")
+        with pytest.raises(MalformedLineError) as e:
+            PackageCatalog.from_file(org_tree.joinpath("frags/server.org"))
+        assert e.value.nr == 1
+        assert e.value.source.endswith("server.org line 1)")
+        assert str(e.value).startswith("Error in line 1 of ")
+
+    def test_ambiguous_line_reports_chain(self, org_tree):
+        org_tree.joinpath("frags", "common.org").write_text("- git, tig\n")
+        catalog = PackageCatalog.from_file(org_tree.joinpath("host.org"))
+        with pytest.raises(OrgParserError, match="Error in line 0 of .*common.org .*included from .*desktop.org"):
+            list(catalog.resolve(Target("debian", "bookworm")))
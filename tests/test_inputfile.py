@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import bz2
+import gzip
+import io
+import lzma
+
+from pathlib import Path
+
+import pytest
+
+from deborg.catalog import PackageCatalog
+from deborg.inputfile import compression, open_org_file, write_atomically
+from deborg.orgparser import MalformedLineError, OrgParser
+
+
+TESTFILE: Path = Path(__file__).resolve().parent.joinpath("input/testfile_ex1.org")
+
+COMPRESSORS = {"gzip": gzip.compress, "xz": lzma.compress, "bzip2": bz2.compress}
+
+
+class TestCompressedInput:
+    """Reading gzip, xz and bzip2 compressed orgmode files."""
+
+    @pytest.mark.parametrize("kind", ["gzip", "xz", "bzip2"])
+    def test_compression_detected_by_content(self, tmp_path, kind):
+        # the file name does not give the compression away
+        file: Path = tmp_path.joinpath("packages.org")
+        file.write_bytes(COMPRESSORS[kind](TESTFILE.read_bytes()))
+        assert compression(file) == kind
+        with open_org_file(file) as _file:
+            assert _file.read() == TESTFILE.read_text()
+
+    def test_plain_file_not_compressed(self):
+        assert compression(TESTFILE) is None
+
+    def test_empty_file(self, tmp_path):
+        file: Path = tmp_path.joinpath("empty.org")
+        file.write_bytes(b"")
+        assert compression(file) is None
+        assert OrgParser.extract_deb_packages(file, "distro", "release") == []
+
+    @pytest.mark.parametrize("kind", ["gzip", "xz", "bzip2"])
+    @pytest.mark.parametrize("includes", [True, False])
+    def test_extract_from_compressed_file(self, tmp_path, kind, includes):
+        file: Path = tmp_path.joinpath(f"packages.org.{kind}")
+        file.write_bytes(COMPRESSORS[kind](TESTFILE.read_bytes()))
+        parser = OrgParser("distroA", "release1", includes=includes)
+        assert parser.extract(file) == OrgParser("distroA", "release1").extract(TESTFILE)
+        assert len(PackageCatalog.from_file(file, parser)) == len(PackageCatalog.from_file(TESTFILE))
+
+
+class TestInMemoryInput:
+    """Parsing orgmode documents that are not files."""
+
+    @pytest.fixture
+    def expected(self) -> list[str]:
+        return OrgParser("distroA", "release1").extract(TESTFILE)
+
+    @pytest.mark.parametrize("kind", ["str", "bytes", "gzip", "text stream", "binary stream", "lines", "byte lines"])
+    def test_extract_from(self, kind, expected):
+        text: str = TESTFILE.read_text()
+        data = {"str": text,
+                "bytes": text.encode(),
+                "gzip": gzip.compress(text.encode()),
+                "text stream": io.StringIO(text),
+                "binary stream": io.BytesIO(text.encode()),
+                "lines": text.splitlines(keepends=True),
+                "byte lines": text.encode().splitlines(keepends=True)}[kind]
+        assert OrgParser("distroA", "release1").extract_from(data) == expected
+        assert OrgParser.extract_deb_packages_from(data if not hasattr(data, "seek") else io.BytesIO(text.encode()),
+                                                   "distroA", "release1") == expected
+
+    def test_compressed_stream_is_not_closed(self, expected):
+        stream = io.BytesIO(lzma.compress(TESTFILE.read_bytes()))
+        assert OrgParser("distroA", "release1").extract_from(stream) == expected
+        assert not stream.closed
+
+    def test_line_numbers_and_errors(self):
+        with pytest.raises(MalformedLineError, match="Error in line 1"):
+            OrgParser().extract_from(b"- pak\n- pak {distro\n")
+        assert list(OrgParser("d", "r").iter_packages_from("* h\n- pak\n"))[0][0] == 1
+
+    def test_catalog_from_str(self):
+        assert len(PackageCatalog.from_lines("- a\n* h\n- b, c {d}\n")) == 2
+
+
+class TestWriteAtomically:
+    """Replacing files without ever leaving a partly written one."""
+
+    def test_replaces_file(self, tmp_path: Path):
+        file: Path = tmp_path.joinpath("state.json")
+        file.write_text("old")
+        write_atomically(file, b"new")
+        assert file.read_bytes() == b"new"
+        assert [f.name for f in tmp_path.iterdir()] == ["state.json"]
+
+    def test_failed_write_leaves_no_temporary_file(self, tmp_path: Path):
+        with pytest.raises(OSError):
+            write_atomically(tmp_path.joinpath("missing", "state.json"), b"new")
+        assert list(tmp_path.iterdir()) == []
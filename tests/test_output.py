@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import io
+import json
+
+from collections.abc import Callable
+
+import pytest
+
+from deborg.output import PackageWriter
+
+
+PACKAGES: list[str] = ["pak-a", "pak-bb", "pak-ccc", "pak-d"]
+
+
+def write_all(output_format: str, sep: str = " ", batch_size: int | None = None,
+              max_bytes: int | None = None) -> str:
+    stream = io.StringIO()
+    with PackageWriter(stream, output_format, sep, batch_size, max_bytes) as writer:
+        for nr, name in enumerate(PACKAGES):
+            writer.write(name, nr)
+    return stream.getvalue()
+
+
+class RecordingStream(io.StringIO):
+    """Keeps every write and counts the flushes."""
+
+    def __init__(self):
+        super().__init__()
+        self.writes: list[str] = []
+        self.n_flushes: int = 0
+
+    def write(self, text: str) -> int:
+        self.writes.append(text)
+        return super().write(text)
+
+    def flush(self):
+        self.n_flushes += 1
+        super().flush()
+
+
+class TestPackageWriter:
+    """Tests for the output formats and batching of PackageWriter."""
+
+    def test_text_unbatched_matches_plain_join(self):
+        assert write_all("text", sep="::") == "::".join(PACKAGES)
+
+    def test_text_batch_size(self):
+        assert write_all("text", batch_size=3) == "pak-a pak-bb pak-ccc\npak-d\n"
+
+    def test_text_max_bytes(self):
+        # 'pak-a pak-bb' is 12 bytes, adding ' pak-ccc' would exceed 15
+        assert write_all("text", max_bytes=15) == "pak-a pak-bb\npak-ccc pak-d\n"
+
+    def test_oversized_package_forms_own_batch(self):
+        assert write_all("text", max_bytes=3) == "pak-a\npak-bb\npak-ccc\npak-d\n"
+
+    def test_batch_size_and_max_bytes_combined(self):
+        assert write_all("text", batch_size=1, max_bytes=100) == "pak-a\npak-bb\npak-ccc\npak-d\n"
+
+    def test_nul_records(self):
+        assert write_all("nul") == "pak-a\0pak-bb\0pak-ccc\0pak-d\0"
+
+    def test_nul_batched_records(self):
+        # batches do not change the records, every name is NUL terminated
+        assert write_all("nul", batch_size=2) == "pak-a\0pak-bb\0pak-ccc\0pak-d\0"
+
+    def test_nul_max_bytes_counts_terminators(self):
+        stream = io.StringIO()
+        with PackageWriter(stream, "nul", max_bytes=13) as writer:
+            for name in PACKAGES:
+                writer.write(name)
+            # 'pak-a\0pak-bb\0' are 13 bytes, 'pak-ccc\0pak-d\0' would be 14
+            assert writer.n_batches == 2
+        assert writer.n_batches == 3
+        assert stream.getvalue() == "pak-a\0pak-bb\0pak-ccc\0pak-d\0"
+
+    @pytest.mark.parametrize("output_format", ["text", "nul", "jsonl", "selections"])
+    @pytest.mark.parametrize("max_bytes", [1, 10, 20, 35, 60])
+    def test_max_bytes_bounds_written_batches(self, output_format, max_bytes):
+        stream = RecordingStream()
+        with PackageWriter(stream, output_format, max_bytes=max_bytes) as writer:
+            for nr, name in enumerate(PACKAGES * 3):
+                writer.write(name, nr)
+        assert len(stream.writes) == writer.n_batches
+        n_records: dict[str, Callable[[str], int]] = {
+            "text": lambda batch: len(batch.split(" ")), "nul": lambda batch: batch.count("\0"),
+            "jsonl": lambda batch: len(json.loads(batch)["packages"]), "selections": lambda batch: batch.count("\n")}
+        for batch in stream.writes:
+            # only a package that does not fit on its own exceeds max_bytes
+            assert len(batch.encode()) <= max_bytes or n_records[output_format](batch) == 1
+
+    def test_unbatched_output_is_flushed_on_close(self):
+        stream = RecordingStream()
+        with PackageWriter(stream, "jsonl") as writer:
+            for name in PACKAGES:
+                writer.write(name)
+        assert len(stream.writes) == len(PACKAGES)
+        assert stream.n_flushes == 1
+
+    def test_jsonl(self):
+        records = [json.loads(line) for line in write_all("jsonl").splitlines()]
+        assert records == [{"package": name, "line": nr} for nr, name in enumerate(PACKAGES)]
+
+    def test_jsonl_batched(self):
+        records = [json.loads(line) for line in write_all("jsonl", batch_size=3).splitlines()]
+        assert records == [{"batch": 0, "packages": PACKAGES[:3]},
+                           {"batch": 1, "packages": PACKAGES[3:]}]
+
+    def test_selections(self):
+        assert write_all("selections", batch_size=3) == ''.join([f"{p} install\n" for p in PACKAGES])
+
+    def test_batches_are_written_when_complete(self):
+        stream = io.StringIO()
+        writer = PackageWriter(stream, "text", batch_size=2)
+        writer.write("pak-a")
+        assert stream.getvalue() == ""
+        writer.write("pak-b")
+        assert stream.getvalue() == "pak-a pak-b\n"
+        assert writer.n_batches == 1
+
+    def test_partial_batch_discarded_on_error(self):
+        stream = io.StringIO()
+        with pytest.raises(RuntimeError):
+            with PackageWriter(stream, "text") as writer:
+                writer.write("pak-a")
+                raise RuntimeError()
+        assert stream.getvalue() == ""
+
+    def test_invalid_arguments_raise_error(self):
+        with pytest.raises(ValueError):
+            PackageWriter(io.StringIO(), "xml")
+        with pytest.raises(ValueError):
+            PackageWriter(io.StringIO(), "text", batch_size=0)
+        with pytest.raises(ValueError):
+            PackageWriter(io.StringIO(), "text", max_bytes=0)
@@ -1,10 +1,16 @@
 from __future__ import annotations
 
-import pytest
+import random
+import time
+
 from collections.abc import Sequence
 from pathlib import Path
 
-from deborg.orgparser import DebPakInfo, OrgParser
+import pytest
+
+from deborg.families import DistroFamilies
+from deborg.orgparser import (DebPakInfo, DuplicatePackageError, LineProblem, MalformedLineError, OrgParser,
+                              OrgParserError)
 
 
 class TestDebPakInfo:
@@ -447,4 +453,372 @@ class TestParser:
             distro, release, expected_out = args
             packages: list[str] = OrgParser.extract_deb_packages(
                 file, distro, release)
-            assert sorted(packages) == sorted(expected_out)
\ No newline at end of file
+            assert sorted(packages) == sorted(expected_out)
+
+
+class TestConfiguredParser:
+    """Tests for OrgParser instances configured for one target."""
+
+    def test_instance_matches_static_methods(self, deb_package_line_input_with_tags):
+        for line, distro, release, tags, expected_DebPakInfo in deb_package_line_input_with_tags:
+            parser = OrgParser(distro, release, tags)
+            assert parser.package_from_line(line) == expected_DebPakInfo
+
+    def test_extract_matches_static_method(self, org_file1_tests):
+        file, io_args = org_file1_tests
+        for distro, release, expected_out in io_args:
+            assert sorted(OrgParser(distro, release).extract(file)) == sorted(expected_out)
+
+    def test_tags_are_normalised(self):
+        parser = OrgParser("distro", "release", ["tag1", "tag2", "tag1"])
+        assert parser.tags == frozenset({"tag1", "tag2"})
+        assert OrgParser().tags == frozenset()
+
+    def test_numbered_list_items(self):
+        lines: list[str] = ["1. pak-a {distro}\n", "  12) pak-b\n", "+ pak-c\n", "1.pak-d\n"]
+        assert [p for _, p in OrgParser("distro", "release").parse_lines(lines)] == [[DebPakInfo("pak-c")]]
+        parsed = [(nr, [p.name for p in ps]) for nr, ps in OrgParser(numbered=True).parse_lines(lines)]
+        assert parsed == [(0, ["pak-a"]), (1, ["pak-b"]), (2, ["pak-c"])]
+
+    def test_custom_bullets(self):
+        parser = OrgParser(bullets="*")
+        assert parser.parse_line("* pak-a") == [DebPakInfo("pak-a")]
+        assert parser.parse_line("+ pak-a") is None
+
+    def test_no_bullets_raises_error(self):
+        with pytest.raises(ValueError):
+            OrgParser(bullets="")
+
+
+@pytest.fixture
+def org_table_lines() -> Sequence[str]:
+    return [
+        "* Packages in a table\n",
+        "  |---------+--------+---------+-----------|\n",
+        "  | Package | distro | release | tags      |\n",
+        "  |---------+--------+---------+-----------|\n",
+        "  | pak-a   |        |         |           |\n",
+        "  | pak-b   | Debian | 12      |           |\n",
+        "  | pak-c   |        |         | one, two  |\n",
+        "  |         | Debian |         |           |\n",
+        "  | pak-d   | Ubuntu |\n",
+        "  |---------+--------+---------+-----------|\n",
+        "\n",
+        "  | name    | value  |\n",
+        "  | pak-x   | 1      |\n",
+        "  + pak-e\n",
+    ]
+
+
+class TestOrgTables:
+    """Tests for package specifications in org tables."""
+
+    def test_table_rows_are_list_items(self, org_table_lines):
+        parsed = list(OrgParser().parse_lines(org_table_lines))
+        assert parsed == [
+            (4, [DebPakInfo("pak-a")]),
+            (5, [DebPakInfo("pak-b", distro="Debian", release="12")]),
+            (6, [DebPakInfo("pak-c", tags=["one", "two"])]),
+            (8, [DebPakInfo("pak-d", distro="Ubuntu")]),
+            (13, [DebPakInfo("pak-e")]),
+        ]
+
+    def test_table_row_equals_list_item(self):
+        table: list[str] = ["| tags | package | release | distro |\n", "| t1,t2 | pak | 12 | Debian |\n"]
+        item: str = "+ pak {Debian:12:t1,t2}\n"
+        assert list(OrgParser().parse_lines(table))[0][1] == OrgParser().parse_line(item)
+
+    def test_tables_can_be_disabled(self, org_table_lines):
+        parsed = list(OrgParser(tables=False).parse_lines(org_table_lines))
+        assert parsed == [(13, [DebPakInfo("pak-e")])]
+
+    def test_extract_from_table(self, tmp_path, org_table_lines):
+        file: Path = tmp_path.joinpath("table.org")
+        file.write_text(''.join(org_table_lines))
+        assert OrgParser.extract_deb_packages(file, "Debian", "12", ["two"]) == ["pak-a", "pak-b", "pak-c", "pak-e"]
+
+    def test_malformed_table_row(self):
+        with pytest.raises(MalformedLineError) as error:
+            list(OrgParser().parse_lines(["| package | distro |\n", "| pak | Debian 12 |\n"]))
+        assert error.value.nr == 1
+
+
+@pytest.fixture
+def malformed_package_lines() -> Sequence[str]:
+    """Package lines that used to crash the parser or were silently misread."""
+    return [
+        "+ package {distro",
+        "+ package {distro:release, other",
+        "+ package :",
+        "+ package, {distro}",
+        "+ package {a:b:c:d}",
+        "+ package {distro name}",
+        "+ package {distro} {other}",
+        "+ package {a{b}}",
+        "+ package:: comment",
+        "+ package,, other",
+    ]
+
+
+class TestTokenizerRobustness:
+    """Malformed input, fuzzing and worst case inputs for the line tokenizer."""
+
+    # time limit for a single adversarial line; linear parsing needs a few ms
+    MAX_SECONDS: float = 1.0
+
+    def test_malformed_lines_raise_malformed_line_error(self, malformed_package_lines):
+        for line in malformed_package_lines:
+            with pytest.raises(MalformedLineError):
+                OrgParser.parse_package_line(line)
+
+    def test_malformed_line_error_reports_line_number(self):
+        lines: list[str] = ["* heading\n", "+ good\n", "+ bad {distro\n"]
+        with pytest.raises(MalformedLineError) as error:
+            list(OrgParser.parse_package_lines(lines))
+        assert error.value.nr == 2
+        assert error.value.line == "+ bad {distro"
+        assert str(error.value).startswith("Error in line 2: Missing '}'")
+
+    def test_package_names_with_dots_and_plus(self):
+        assert [p.name for p in OrgParser.parse_package_line("+ g++, libgtk2.0-0 {Debian}")] == \
+               ["g++", "libgtk2.0-0"]
+
+    def test_whitespace_inside_braces(self):
+        assert OrgParser._get_package_info("pak { Debian : 11 : t1,t2 }") == \
+               DebPakInfo(name="pak", distro="Debian", release="11", tags=["t1", "t2"])
+
+    def test_fuzzing_only_raises_parser_errors(self):
+        rnd = random.Random(1234)
+        alphabet: str = "ab-_.+ {}:,\t"
+        # distro 'a' is based on 'b', so that alternatives for a parent distro are selected as well
+        families = DistroFamilies({"a": "b"})
+        family_parser = OrgParser("a", "b", ["a"], families=families)
+        for _ in range(20000):
+            line: str = rnd.choice("+-") + " " + rnd.choice("ab") + \
+                ''.join([rnd.choice(alphabet) for _ in range(rnd.randint(0, 30))])
+            try:
+                packages = OrgParser.parse_package_line(line)
+            except OrgParserError:
+                continue
+            assert packages is not None and len(packages) > 0
+            for package in packages:
+                assert package.name
+                try:
+                    OrgParser.select_package(packages, "a", "b", ["a"])
+                except OrgParserError:
+                    pass
+            try:
+                expected = reference_select(packages, "a", "b", ["a"], families)
+            except DuplicatePackageError:
+                with pytest.raises(DuplicatePackageError):
+                    family_parser.select(packages)
+                continue
+            assert family_parser.select(packages) == expected
+
+    @pytest.mark.parametrize("line", [
+        "+ pak " + "{" * 200000,
+        "+ pak " + "{" + " " * 200000 + "!}",
+        "+ pak " + ":" * 200000,
+        "+ " + "p" * 200000 + " {" + "a:" * 2 + "t," * 100000 + "}",
+        "+ " + ", ".join([f"pak{i} {{distro{i}:r{i}:t{i}}}" for i in range(20000)]),
+        "+ pak :: " + "{:" * 100000,
+        "+ " + " " * 200000 + "pak",
+    ], ids=[
+        "repeated-open-brace", "spaces-in-braces", "repeated-colon", "long-name-many-tags",
+        "many-alternatives", "long-comment", "leading-spaces"])
+    def test_adversarial_lines_are_parsed_in_linear_time(self, line):
+        start: float = time.perf_counter()
+        try:
+            OrgParser.parse_package_line(line)
+        except OrgParserError:
+            pass
+        assert time.perf_counter() - start < self.MAX_SECONDS
+
+    def test_resolving_many_alternatives_is_fast(self):
+        line: str = "+ " + ", ".join([f"pak{i} {{distro{i}:r{i}:t{i}}}" for i in range(20000)]) + ", default"
+        packages = OrgParser.parse_package_line(line)
+        start: float = time.perf_counter()
+        assert OrgParser.select_package(packages, "distro19999", "r19999", ["t19999"]).name == "pak19999"
+        assert time.perf_counter() - start < self.MAX_SECONDS
+
+    def test_parse_time_grows_linearly(self):
+        def parse_time(n: int) -> float:
+            line: str = "+ " + ", ".join([f"pak{i} {{d{i % 7}::t{i % 3}}}" for i in range(n)])
+            start: float = time.perf_counter()
+            for _ in range(3):
+                OrgParser.parse_package_line(line)
+            return time.perf_counter() - start
+        parse_time(1000)
+        # 8 times the input must not take much more than 8 times as long
+        assert parse_time(16000) < 8 * 3 * parse_time(2000)
+
+
+def reference_select(packages: Sequence[DebPakInfo], distro: str, release: str, tags: Sequence[str],
+                     families: DistroFamilies) -> DebPakInfo | None:
+    """
+    Selection by successive narrowing passes (tags, release, distro, closest distro), as implemented before
+    ranks were used.
+    """
+    rank: dict[str, int] = families.precedence(distro)
+    kept: list[DebPakInfo] = []
+    seen: set[tuple] = set()
+    for p in packages:
+        if p.release is not None and p.release != release:
+            continue
+        if p.distro is not None and p.distro not in rank:
+            continue
+        if p.tags is not None and set(tags).isdisjoint(p.tags):
+            continue
+        key = (p.name, p.distro, p.release, tuple(p.tags) if p.tags is not None else None)
+        if key not in seen:
+            seen.add(key)
+            kept.append(p)
+    if not kept:
+        return None
+    if len(kept) > 1 and tags and any([p.tags is not None for p in kept]):
+        kept = [p for p in kept if p.tags is not None]
+    if len(kept) > 1 and any([p.release is not None for p in kept]):
+        kept = [p for p in kept if p.release is not None]
+    if len(kept) > 1 and any([p.distro is not None for p in kept]):
+        kept = [p for p in kept if p.distro is not None]
+    if len(kept) > 1 and kept[0].distro is not None:
+        kept = [p for p in kept if rank[p.distro] == min([rank[p.distro] for p in kept])]
+    if len(kept) > 1:
+        raise DuplicatePackageError(
+            f"More than two packages match the specifications: {', '.join([p.name for p in kept])}.")
+    return kept[0]
+
+
+class TestSinglePassResolver:
+    """The single pass selection by specificity gives the same results as successive narrowing."""
+
+    FAMILIES = DistroFamilies({"Ubuntu": "Debian", "Mint": "Ubuntu"})
+
+    @staticmethod
+    def generated_corpus(n: int, seed: int) -> list[list[DebPakInfo]]:
+        rnd = random.Random(seed)
+        distros: list[str | None] = [None, None, "Debian", "Ubuntu", "Mint", "Fedora"]
+        releases: list[str | None] = [None, None, "1", "2"]
+        tag_sets: list[tuple[str, ...] | None] = [None, None, ("a",), ("b",), ("a", "b")]
+        lines: list[list[DebPakInfo]] = []
+        for _ in range(n):
+            lines.append([DebPakInfo(f"p{rnd.randrange(4)}", rnd.choice(distros), rnd.choice(releases),
+                                     rnd.choice(tag_sets)) for _ in range(rnd.randrange(1, 6))])
+        return lines
+
+    def test_specificity(self):
+        assert DebPakInfo("p").specificity == 0
+        assert DebPakInfo("p", "d").specificity < DebPakInfo("p", None, "r").specificity
+        assert DebPakInfo("p", "d", "r").specificity < DebPakInfo("p", tags=["t"]).specificity
+        assert DebPakInfo("p", "d") == DebPakInfo("p", "d")
+        assert "specificity" not in repr(DebPakInfo("p"))
+
+    @pytest.mark.parametrize("families", [DistroFamilies(), FAMILIES])
+    @pytest.mark.parametrize("distro,release,tags", [
+        ("Debian", "1", ()), ("Debian", "2", ("a",)), ("Ubuntu", "1", ("a", "b")), ("Mint", "2", ("b",)),
+        ("Mint", "1", ()), ("Fedora", "3", ("c",))])
+    def test_equivalent_to_narrowing(self, families, distro, release, tags):
+        parser = OrgParser(distro, release, tags, families=families)
+        n_errors: int = 0
+        # a more specific alternative for a parent distro wins over one for the distro itself
+        specific_parent: list[list[DebPakInfo]] = [
+            [DebPakInfo("x", "Debian", None, ("a",)), DebPakInfo("y", "Ubuntu")],
+            [DebPakInfo("x", None, None, ("a",)), DebPakInfo("y", "Ubuntu")],
+            [DebPakInfo("x", "Debian", "1"), DebPakInfo("y", "Mint")]]
+        for packages in specific_parent + self.generated_corpus(2000, seed=len(distro) * 10 + len(tags)):
+            try:
+                expected = reference_select(packages, distro, release, tags, families)
+            except DuplicatePackageError as e:
+                n_errors += 1
+                with pytest.raises(DuplicatePackageError) as error:
+                    parser.select(packages)
+                assert str(error.value) == str(e)
+                continue
+            assert parser.select(packages) == expected
+        # the corpus covers ambiguous lines as well
+        assert n_errors > 0
+
+
+class TestConflictPolicies:
+    """Handling of lines with several equally specific matching alternatives."""
+
+    LINES: list[str] = [
+        "- a, b\n",
+        "- c {distroA:r:t1}, d {distroA:r:t1,t2}\n",
+        "- e\n",
+        "- f {\n",
+        "- g {distroA}, h {distroA}\n",
+    ]
+
+    def test_errors_are_exceptions(self):
+        assert issubclass(OrgParserError, Exception)
+        with pytest.raises(Exception):
+            OrgParser("distroA", "r").extract_from(self.LINES)
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError, match="Unknown conflict policy"):
+            OrgParser(conflicts="last")
+
+    @pytest.mark.parametrize("policy,expected", [
+        ("first", ["a", "c", "e", "g"]),
+        ("most-specific", ["a", "d", "e", "g"]),
+    ])
+    def test_selecting_policies(self, policy, expected):
+        parser = OrgParser("distroA", "r", ["t1", "t2"], conflicts=policy)
+        assert parser.extract_from([line for line in self.LINES if "{\n" not in line]) == expected
+
+    def test_collect(self):
+        parser = OrgParser("distroA", "r", ["t1", "t2"], conflicts="collect")
+        problems: list[LineProblem] = []
+        assert [p.name for _, p in parser.iter_packages_from(self.LINES, problems=problems)] == ["e"]
+        assert [(p.kind, p.nr, p.alternatives) for p in problems] == [
+            ("ambiguous", 0, ("a", "b")), ("ambiguous", 1, ("c", "d")), ("malformed", 3, ()),
+            ("ambiguous", 4, ("g", "h"))]
+        assert str(problems[0]) == "Error in line 0: More than two packages match the specifications: a, b."
+
+    def test_collect_needs_problems_list(self):
+        with pytest.raises(ValueError):
+            OrgParser(conflicts="collect").extract_from(self.LINES)
+
+    def test_collect_from_included_files(self, tmp_path):
+        tmp_path.joinpath("a.org").write_text('- a\n#+INCLUDE: "b.org"\n')
+        tmp_path.joinpath("b.org").write_text("- b {\n- c, d\n")
+        problems: list[LineProblem] = []
+        parser = OrgParser(conflicts="collect")
+        assert [p.name for _, p in parser.iter_packages(tmp_path.joinpath("a.org"), problems=problems)] == ["a"]
+        assert [(p.kind, p.nr) for p in problems] == [("malformed", 0), ("ambiguous", 1)]
+        assert all([p.source.startswith(tmp_path.joinpath("b.org").as_posix()) for p in problems])
+
+
+class TestDeduplication:
+    """Packages selected on several lines are only extracted once, in the order of their first line."""
+
+    LINES: list[str] = [
+        "* Base\n",
+        "- vim\n",
+        "- git\n",
+        "* Development\n",
+        "- git\n",
+        "- gcc, clang {distroB}\n",
+        "- vim-gtk3 {distroA}, vim\n",
+        "- vim\n",
+    ]
+
+    def test_first_occurrence_is_kept(self):
+        assert OrgParser("distroA", "r").extract_from(self.LINES) == ["vim", "git", "gcc", "vim-gtk3"]
+
+    def test_can_be_disabled(self):
+        assert OrgParser("distroA", "r", unique=False).extract_from(self.LINES) == \
+               ["vim", "git", "git", "gcc", "vim-gtk3", "vim"]
+
+    def test_duplicates_are_reported(self):
+        duplicates: dict[str, list[tuple[int, str | None]]] = {}
+        packages = OrgParser("distroB", "r").iter_packages_from(self.LINES, duplicates=duplicates)
+        assert [(nr, p.name) for nr, p in packages] == [(1, "vim"), (2, "git"), (5, "clang")]
+        assert duplicates == {"git": [(2, None), (4, None)], "vim": [(1, None), (6, None), (7, None)]}
+
+    def test_duplicates_are_reported_when_kept(self):
+        duplicates: dict[str, list[tuple[int, str | None]]] = {}
+        packages = OrgParser("distroA", "r", unique=False).iter_packages_from(self.LINES, duplicates=duplicates)
+        assert [p.name for _, p in packages] == ["vim", "git", "git", "gcc", "vim-gtk3", "vim"]
+        assert duplicates == {"git": [(2, None), (4, None)], "vim": [(1, None), (7, None)]}
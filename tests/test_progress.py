@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from deborg.orgparser import OrgParser, ParseCancelled
+from deborg.progress import (CANCELLED, COMPLETE, DEADLINE, CancelToken, Progress, ProgressMonitor,
+                             extract_monitored, format_progress)
+
+
+def package_lines(n: int) -> list[str]:
+    return [f"- pak{i}, pak{i}-a {{distroA}}\n" for i in range(n)]
+
+
+class TestProgress:
+    """Counting lines, bytes and packages, and reporting them."""
+
+    def test_counts(self):
+        lines = package_lines(3000) + ["* no package\n"]
+        result = extract_monitored(OrgParser("distroA", "r"), lines, ProgressMonitor())
+        assert result.complete
+        assert result.packages == [f"pak{i}-a" for i in range(3000)]
+        assert (result.progress.lines, result.progress.bytes, result.progress.packages) == \
+            (3001, sum([len(line) for line in lines]), 3000)
+
+    def test_reports_are_rate_limited(self):
+        reports: list[Progress] = []
+        extract_monitored(OrgParser("distroA", "r"), package_lines(5000), ProgressMonitor(reports.append, 3600))
+        # only the final report
+        assert len(reports) == 1
+        reports.clear()
+        extract_monitored(OrgParser("distroA", "r"), package_lines(5000), ProgressMonitor(reports.append, 0))
+        # once every CHECK_EVERY lines, plus the first check and the final report
+        assert len(reports) == 5000 // ProgressMonitor.CHECK_EVERY + 2
+        assert [r.lines for r in reports] == sorted([r.lines for r in reports])
+
+    def test_file_size_is_known(self, tmp_path: Path):
+        orgfile = tmp_path.joinpath("a.org")
+        orgfile.write_text("".join(package_lines(10)))
+        result = extract_monitored(OrgParser("distroA", "r"), orgfile, ProgressMonitor())
+        assert result.progress.fraction == 1.0
+        assert "(100%)" in format_progress(result.progress)
+
+    def test_included_files(self, tmp_path: Path):
+        tmp_path.joinpath("a.org").write_text('- a\n#+INCLUDE: "b.org"\n- c\n')
+        tmp_path.joinpath("b.org").write_text("- b\n")
+        result = extract_monitored(OrgParser("distroA", "r"), tmp_path.joinpath("a.org"), ProgressMonitor())
+        assert result.packages == ["a", "b", "c"]
+        # lines of the top-level file only
+        assert result.progress.lines == 3
+
+
+class TestCancellation:
+    """Stopping parsing early and returning what was found until then."""
+
+    def test_cancelled_in_included_file(self, tmp_path: Path):
+        tmp_path.joinpath("a.org").write_text('- a\n#+INCLUDE: "b.org"\n- c\n')
+        tmp_path.joinpath("b.org").write_text("".join(package_lines(5000)))
+        token = CancelToken()
+        seen: list[int] = []
+
+        def cancel(progress: Progress):
+            seen.append(progress.lines)
+            if len(seen) == 3:
+                token.cancel()
+
+        result = extract_monitored(OrgParser("distroA", "r"), tmp_path.joinpath("a.org"),
+                                   ProgressMonitor(cancel, 0, token))
+        assert result.status == CANCELLED
+        # checked at the start of both files, then after CHECK_EVERY lines of b.org
+        assert result.packages == ["a"] + [f"pak{i}-a" for i in range(2 * ProgressMonitor.CHECK_EVERY)]
+
+    def test_cancelled(self):
+        token = CancelToken()
+        lines = package_lines(10000)
+
+        def cancel(progress: Progress):
+            if progress.lines >= 2048:
+                token.cancel()
+
+        result = extract_monitored(OrgParser("distroA", "r"), lines, ProgressMonitor(cancel, 0, token))
+        assert result.status == CANCELLED
+        assert not result.complete
+        # stopped at the next check
+        assert len(result.packages) == 3072
+        assert result.packages == [f"pak{i}-a" for i in range(3072)]
+
+    def test_deadline(self):
+        result = extract_monitored(OrgParser("distroA", "r"), package_lines(5000),
+                                   ProgressMonitor(token=CancelToken(0)))
+        assert result.status == DEADLINE
+        assert result.packages == []
+
+    def test_no_deadline(self):
+        result = extract_monitored(OrgParser("distroA", "r"), package_lines(5000),
+                                   ProgressMonitor(token=CancelToken()))
+        assert result.status == COMPLETE
+
+    def test_iter_packages_raises(self):
+        parser = OrgParser("distroA", "r")
+        with pytest.raises(ParseCancelled, match="deadline after 0 lines"):
+            list(parser.iter_packages_from(package_lines(10), ProgressMonitor(token=CancelToken(0))))
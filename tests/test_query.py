@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import pytest
+
+from deborg.catalog import PackageCatalog, Target
+from deborg.families import DistroFamilies
+from deborg.orgparser import DebPakInfo
+from deborg.query import format_package, query_catalog
+
+
+@pytest.fixture
+def catalog() -> PackageCatalog:
+    return PackageCatalog.from_lines([
+        "* Server\n",
+        "+ nginx {::server}, nginx-light\n",
+        "+ apache2 {Debian}, nginx {Ubuntu}\n",
+        "+ nginx-full {Debian:12}, nginx-light {Debian}\n",
+        "+ vim, vim-nox {::server}, vim-tiny {::server}\n",
+    ])
+
+
+class TestNameIndex:
+    """Looking up the lines that list a package."""
+
+    def test_lines_with(self, catalog):
+        assert [line.nr for line in catalog.lines_with("nginx")] == [1, 2]
+        assert [line.nr for line in catalog.lines_with("nginx-light")] == [1, 3]
+        assert catalog.lines_with("emacs") == ()
+
+    def test_name_listed_twice_on_a_line(self):
+        catalog = PackageCatalog.from_lines(["+ pak {a}, pak {b}\n"])
+        assert len(catalog.lines_with("pak")) == 1
+
+    def test_index_matches_scan(self, generated_lines):
+        catalog = PackageCatalog.from_lines(generated_lines(200))
+        for name in ["pak7", "pak7-t", "only3", "missing"]:
+            expected = [line for line in catalog.lines if name in [p.name for p in line.packages]]
+            assert list(catalog.lines_with(name)) == expected
+
+
+class TestQuery:
+    """Explaining whether a package would be installed."""
+
+    def test_installed_with_tag(self, catalog):
+        results = query_catalog(catalog, "nginx", Target("Debian", "12", ("server",)))
+        assert [(r.nr, r.installed) for r in results] == [(1, True), (2, False)]
+        assert results[0].alternatives[0].reason == "most specific matching alternative (tags server)"
+        assert results[0].alternatives[1].reason == "less specific than nginx {::server}"
+        assert results[1].selected.name == "apache2"
+        assert results[1].alternatives[1].reason == "distro Ubuntu is not Debian"
+
+    def test_not_installed(self, catalog):
+        results = query_catalog(catalog, "nginx", Target("Debian", "12"))
+        assert not any([r.installed for r in results])
+        assert results[0].alternatives[0].reason == "none of the tags server is requested"
+        assert results[0].selected.name == "nginx-light"
+
+    def test_release(self, catalog):
+        results = query_catalog(catalog, "nginx-light", Target("Debian", "11"))
+        assert [r.installed for r in results] == [True, True]
+        assert results[1].alternatives[0].reason == "release 12 is not 11"
+        results = query_catalog(catalog, "nginx-full", Target("Debian", "12"))
+        assert results[0].alternatives[0].reason == "most specific matching alternative (release 12)"
+
+    def test_family_fallback(self, catalog):
+        families = PackageCatalog(catalog.lines, DistroFamilies({"Raspbian": "Debian"}))
+        results = query_catalog(families, "apache2", Target("Raspbian", "12"))
+        assert results[0].installed
+        assert results[0].alternatives[1].reason == "distro Ubuntu is not any of Raspbian, Debian"
+
+    def test_ambiguous_line(self, catalog):
+        results = query_catalog(catalog, "vim-nox", Target("Debian", "12", ("server",)))
+        assert results[0].selected is None
+        assert "vim-nox, vim-tiny" in results[0].error
+        assert results[0].alternatives[1].reason == "as specific as another matching alternative"
+
+    def test_unknown_package(self, catalog):
+        assert query_catalog(catalog, "emacs", Target("Debian", "12")) == []
+
+    @pytest.mark.parametrize("package,expected", [
+        (DebPakInfo("pak"), "pak"),
+        (DebPakInfo("pak", "Debian"), "pak {Debian}"),
+        (DebPakInfo("pak", None, "12"), "pak {:12}"),
+        (DebPakInfo("pak", tags=("a", "b")), "pak {::a,b}")])
+    def test_format_package(self, package, expected):
+        assert format_package(package) == expected
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import multiprocessing
+
+from pathlib import Path
+
+import pytest
+
+from deborg.catalog import CatalogLine, PackageCatalog, Target
+from deborg.families import DistroFamilies
+from deborg.orgparser import DebPakInfo, OrgParserError
+from deborg.sharedcatalog import SharedCatalog, pack_catalog
+
+
+TARGETS: list[Target] = [Target(f"distro{i % 3}", f"r{i % 5}", (f"tag{i % 4}",)) for i in range(12)] + \
+    [Target("distro0", "r0"), Target("other", "release")]
+
+
+def resolve_in_worker(name: str) -> list[tuple[int, str]]:
+    with SharedCatalog.attach(name) as catalog:
+        return [(nr, p.name) for nr, p in catalog.resolve(TARGETS[0])]
+
+
+@pytest.fixture
+def catalog(generated_lines) -> PackageCatalog:
+    return PackageCatalog.from_lines(generated_lines(300))
+
+
+class TestSharedCatalog:
+    """Resolving catalogs packed into a flat buffer."""
+
+    @pytest.mark.parametrize("target", TARGETS)
+    def test_resolve_matches_catalog(self, catalog, target):
+        shared = SharedCatalog(pack_catalog(catalog))
+        assert list(shared.resolve(target)) == list(catalog.resolve(target))
+
+    def test_round_trip(self, catalog):
+        shared = SharedCatalog(pack_catalog(catalog))
+        assert len(shared) == len(catalog)
+        assert shared.to_catalog().lines == catalog.lines
+
+    def test_sources_and_families_are_kept(self):
+        families = DistroFamilies({"Ubuntu": "Debian"})
+        catalog = PackageCatalog([
+            CatalogLine(0, (DebPakInfo("pak"), DebPakInfo("pak-d", "Debian"))),
+            CatalogLine(3, (DebPakInfo("a", tags=("t",)), DebPakInfo("b", tags=("t", "u"))), "inc.org (x)")],
+            families)
+        shared = SharedCatalog(pack_catalog(catalog))
+        assert shared.families == families
+        assert shared.to_catalog().lines == catalog.lines
+        assert [p.name for _, p in shared.resolve(Target("Ubuntu", "22.04"))] == ["pak-d"]
+        with pytest.raises(OrgParserError, match="Error in line 3 of inc.org"):
+            list(shared.resolve(Target("Ubuntu", "22.04", ("t",))))
+
+    def test_invalid_buffer(self):
+        with pytest.raises(ValueError):
+            SharedCatalog(b"no catalog")
+
+    def test_memory_mapped_file(self, catalog, tmp_path):
+        file: Path = tmp_path.joinpath("catalog.bin")
+        SharedCatalog.write(catalog, file)
+        with SharedCatalog.open(file) as shared:
+            assert list(shared.resolve(TARGETS[1])) == list(catalog.resolve(TARGETS[1]))
+
+    def test_shared_memory_between_processes(self, catalog):
+        shared = SharedCatalog.create(catalog)
+        try:
+            with multiprocessing.Pool(2) as pool:
+                results = pool.map(resolve_in_worker, [shared.name] * 4)
+        finally:
+            shared.close()
+            shared.unlink()
+        expected = [(nr, p.name) for nr, p in catalog.resolve(TARGETS[0])]
+        assert results == [expected] * 4
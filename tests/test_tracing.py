@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import json
+import pstats
+import time
+
+from pathlib import Path
+
+from deborg.orgparser import OrgParser
+from deborg.tracing import Tracer, format_trace, profile_extraction
+
+
+def slow_lines() -> list[str]:
+    """Cheap lines, and a line with many alternatives that is expensive to parse."""
+    lines: list[str] = [f"- pak{i}\n" for i in range(500)]
+    lines.insert(250, "- " + ", ".join([f"p{i} {{d{i}:r:t}}" for i in range(2000)]) + ", pak\n")
+    return lines
+
+
+class TestTracer:
+    """Timing package lines and keeping the slowest."""
+
+    def test_slowest_lines(self):
+        tracer = Tracer(slowest=3)
+        result = profile_extraction(OrgParser("distroA", "r"), slow_lines(), tracer)
+        assert result.complete
+        assert len(result.packages) == 501
+        assert tracer.n_traced == 501
+        slowest = tracer.slowest
+        assert len(slowest) == 3
+        assert slowest[0].nr == 250
+        assert slowest[0].alternatives == 2001
+        assert [t.total_ns for t in slowest] == sorted([t.total_ns for t in slowest], reverse=True)
+        assert format_trace(slowest[0]).startswith("line 250: ")
+
+    def test_resolve_time_excludes_the_caller(self):
+        tracer = Tracer(slowest=5)
+        for _ in OrgParser().iter_packages_from([f"- pak{i}\n" for i in range(5)], tracer):
+            # e.g. writing the package
+            time.sleep(0.05)
+        assert tracer.n_traced == 5
+        assert all([t.resolve_ns < 25_000_000 for t in tracer.slowest])
+
+    def test_included_lines(self, tmp_path: Path):
+        tmp_path.joinpath("a.org").write_text('- a\n#+INCLUDE: "b.org"\n')
+        tmp_path.joinpath("b.org").write_text("- b\n")
+        tracer = Tracer()
+        profile_extraction(OrgParser(), tmp_path.joinpath("a.org"), tracer)
+        traces = sorted(tracer.slowest, key=lambda t: t.source is not None)
+        assert [(t.nr, t.source is None) for t in traces] == [(0, True), (0, False)]
+        # only the resolve time is known for included lines
+        assert traces[1].parse_ns == 0
+
+    def test_chrome_trace(self, tmp_path: Path):
+        tracer = Tracer(slowest=2)
+        profile_extraction(OrgParser("distroA", "r"), slow_lines(), tracer, tmp_path.joinpath("trace.json"))
+        events = json.loads(tmp_path.joinpath("trace.json").read_text())["traceEvents"]
+        assert len(events) == 4
+        assert {e["cat"] for e in events} == {"parse", "resolve"}
+        assert all([e["ph"] == "X" and e["dur"] >= 0 for e in events])
+
+    def test_cprofile_stats(self, tmp_path: Path):
+        profile_extraction(OrgParser("distroA", "r"), slow_lines(), Tracer(), tmp_path.joinpath("run.prof"))
+        stats = pstats.Stats(str(tmp_path.joinpath("run.prof")))
+        assert any([function == "select" for _, _, function in stats.stats])